@@ -1,2 +1,3 @@
 # app/api/__init__.py
 from .chat import router as chat_router
+from .chat_socket import router as chat_socket_router
@@ -1,12 +1,28 @@
 # app/api/admin.py
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session, joinedload
 from ..database import get_db
 from ..models.user import User, Role, Task
-from ..schemas.admin import UserCreate, UserUpdate, UserResponse, RoleResponse, TaskResponse, PaginatedResponse
-from ..auth.utils import get_current_admin_user, get_password_hash
+from ..models.chat import Conversation
+from ..models.retention import RetentionPolicy, ArchivedConversation
+from ..models.quota import QuotaPolicy
+from ..models.token import RefreshToken
+from ..schemas.admin import (
+    UserCreate, UserUpdate, UserResponse, RoleResponse, TaskResponse, PaginatedResponse,
+    RetentionPolicyUpdate, RetentionPolicyResponse, BulkUserResponse,
+    QuotaPolicyUpdate, QuotaPolicyResponse
+)
+from ..auth.utils import get_current_admin_user, get_password_hash_async
+from ..auth.principal import Principal, principal_cache
+from ..auth.refresh import revoke_user_tokens
+from ..services.context_cache import context_cache
+from ..services.retention import apply_retention, delete_conversations
+from ..services import user_directory
+from ..services import usage as usage_stats
+from ..services.quota import quota_manager, LIMIT_FIELDS
+from ..services.user_import import BulkImportError, BulkImportTooLarge, parse_upload, import_users
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-from sqlalchemy import func
 from math import ceil
 import logging
 
@@ -15,35 +31,17 @@ logger = logging.getLogger(__name__)
 
 @router.get("/users", response_model=PaginatedResponse)
 async def list_users(
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Items per page"),
-    search: Optional[str] = Query(None, description="Search by username, email, or full name")
+    search: Optional[str] = Query(None, description="Search by username, email, or full name"),
+    cursor: Optional[str] = Query(None, description="next_cursor or prev_cursor of a previous page")
 ):
-    """List users with pagination and search"""
+    """List users with keyset pagination and search"""
     try:
-        # Base query
-        query = db.query(User).options(
-            joinedload(User.roles),
-            joinedload(User.tasks)
-        )
-
-        # Apply search if provided
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (User.username.ilike(search_term)) |
-                (User.email.ilike(search_term)) |
-                (User.full_name.ilike(search_term))
-            )
-
-        # Get total count
-        total = query.count()
-        total_pages = ceil(total / page_size)
-
-        # Apply pagination
-        users = query.offset((page - 1) * page_size).limit(page_size).all()
+        result = user_directory.list_users(db, search=search, cursor=cursor, page=page, page_size=page_size)
+        total = result["total"]
 
         # Convert to response model
         items = [
@@ -58,7 +56,7 @@ async def list_users(
                 last_login=user.last_login,
                 created_at=user.created_at
             ) 
-            for user in users
+            for user in result["users"]
         ]
 
         return {
@@ -66,9 +64,14 @@ async def list_users(
             "total": total,
             "page": page,
             "page_size": page_size,
-            "total_pages": total_pages
+            "total_pages": ceil(total / page_size),
+            "total_exact": result["total_exact"],
+            "next_cursor": result["next_cursor"],
+            "prev_cursor": result["prev_cursor"]
         }
 
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error listing users: {str(e)}")
         raise HTTPException(
@@ -79,7 +82,7 @@ async def list_users(
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: str,
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Get user details"""
@@ -112,7 +115,7 @@ async def get_user(
 @router.post("/users", response_model=UserResponse)
 async def create_user(
     user_data: UserCreate,
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Create new user"""
@@ -128,7 +131,7 @@ async def create_user(
             username=user_data.username,
             email=user_data.email,
             full_name=user_data.full_name,
-            hashed_password=get_password_hash(user_data.password),
+            hashed_password=await get_password_hash_async(user_data.password),
             is_active=user_data.is_active
         )
 
@@ -145,6 +148,7 @@ async def create_user(
         db.add(user)
         db.commit()
         db.refresh(user)
+        user_directory.user_count.invalidate()
 
         return UserResponse(
             id=user.id,
@@ -165,11 +169,37 @@ async def create_user(
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/users/bulk", response_model=BulkUserResponse)
+async def bulk_users(
+    request: Request,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create, update or deactivate many users from JSON or CSV (text/csv).
+
+    Each row has an ``action`` (create by default) and a ``username``; the
+    response reports the outcome of every row. Uploads over
+    BULK_USER_MAX_ROWS rows are refused with 413.
+    """
+    try:
+        rows = parse_upload(await request.body(), request.headers.get("content-type", ""))
+        return await import_users(db, rows, current_user.id)
+
+    except BulkImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing users: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.put("/users/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: str,
     user_data: UserUpdate,
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Update user"""
@@ -183,6 +213,8 @@ async def update_user(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        previous_username = user.username
+
         # Validate unique constraints
         if user_data.username and user_data.username != user.username:
             existing = db.query(User).filter(User.username == user_data.username).first()
@@ -200,10 +232,14 @@ async def update_user(
         if user_data.full_name is not None:
             user.full_name = user_data.full_name
         if user_data.password:
-            user.hashed_password = get_password_hash(user_data.password)
+            user.hashed_password = await get_password_hash_async(user_data.password)
         if user_data.is_active is not None:
             user.is_active = user_data.is_active
 
+        # End existing sessions when access is taken away or the password changes
+        if user_data.password or user_data.is_active is False:
+            revoke_user_tokens(db, user.id)
+
         # Update roles if provided
         if user_data.roles is not None:
             roles = db.query(Role).filter(Role.id.in_(user_data.roles)).all()
@@ -219,6 +255,8 @@ async def update_user(
         try:
             db.commit()
             db.refresh(user)
+            principal_cache.invalidate(previous_username)
+            principal_cache.invalidate(user.username)
             
             logger.info(f"Successfully updated user: {user.username}")
             
@@ -253,7 +291,7 @@ async def update_user(
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: str,
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """Delete user"""
@@ -269,8 +307,19 @@ async def delete_user(
         # Get username for logging before deletion
         username = user.username
         
+        # Set-based, so neither the conversations nor their messages are loaded
+        conversation_ids = [
+            conversation_id for (conversation_id,) in
+            db.query(Conversation.id).filter(Conversation.user_id == user.id)
+        ]
+        delete_conversations(db, conversation_ids)
+        for model in (ArchivedConversation, RetentionPolicy, QuotaPolicy, RefreshToken):
+            db.query(model).filter(model.user_id == user.id).delete(synchronize_session=False)
         db.delete(user)
         db.commit()
+        principal_cache.invalidate(username)
+        quota_manager.invalidate(user_id)
+        user_directory.user_count.invalidate()
         
         logger.info(f"Deleted user: {username}")
         return {"message": "User deleted successfully"}
@@ -284,7 +333,7 @@ async def delete_user(
 
 @router.get("/roles", response_model=List[RoleResponse])
 async def list_roles(
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """List all roles"""
@@ -307,7 +356,7 @@ async def list_roles(
 
 @router.get("/tasks", response_model=List[TaskResponse])
 async def list_tasks(
-    current_user: User = Depends(get_current_admin_user),
+    current_user: Principal = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
     """List all tasks"""
@@ -327,4 +376,257 @@ async def list_tasks(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error retrieving tasks"
-        )
\ No newline at end of file
+        )
+
+@router.get("/retention/policies", response_model=List[RetentionPolicyResponse])
+async def list_retention_policies(
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """List per-role and per-user retention policies"""
+    try:
+        policies = db.query(RetentionPolicy)\
+            .options(joinedload(RetentionPolicy.role), joinedload(RetentionPolicy.user))\
+            .all()
+        return [RetentionPolicyResponse.model_validate(policy) for policy in policies]
+    except Exception as e:
+        logger.error(f"Error listing retention policies: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving retention policies"
+        )
+
+@router.put("/retention/policies", response_model=RetentionPolicyResponse)
+async def set_retention_policy(
+    policy_data: RetentionPolicyUpdate,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Create or replace the retention policy of a role or a user"""
+    try:
+        if bool(policy_data.role_id) == bool(policy_data.user_id):
+            raise HTTPException(status_code=400, detail="Set exactly one of role_id and user_id")
+        if policy_data.role_id and not db.query(Role).filter(Role.id == policy_data.role_id).first():
+            raise HTTPException(status_code=404, detail="Role not found")
+        if policy_data.user_id and not db.query(User).filter(User.id == policy_data.user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+
+        policy = db.query(RetentionPolicy).filter(
+            RetentionPolicy.role_id == policy_data.role_id if policy_data.role_id
+            else RetentionPolicy.user_id == policy_data.user_id
+        ).first()
+        if not policy:
+            policy = RetentionPolicy(role_id=policy_data.role_id, user_id=policy_data.user_id)
+            db.add(policy)
+        policy.archive_after_days = policy_data.archive_after_days
+        policy.purge_after_days = policy_data.purge_after_days
+        db.commit()
+        db.refresh(policy)
+
+        logger.info(f"Retention policy {policy.id} set by {current_user.username}")
+        return RetentionPolicyResponse.model_validate(policy)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error setting retention policy: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/retention/policies/{policy_id}")
+async def delete_retention_policy(
+    policy_id: str,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a retention policy; affected users fall back to role or default limits"""
+    try:
+        policy = db.query(RetentionPolicy).filter(RetentionPolicy.id == policy_id).first()
+        if not policy:
+            raise HTTPException(status_code=404, detail="Retention policy not found")
+        db.delete(policy)
+        db.commit()
+        return {"message": "Retention policy deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting retention policy: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/retention/run")
+async def run_retention_now(
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Apply the retention policies now instead of waiting for the schedule"""
+    try:
+        return await run_in_threadpool(apply_retention, db)
+    except Exception as e:
+        logger.error(f"Error running retention: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Error running retention")
+
+@router.get("/quotas/policies", response_model=List[QuotaPolicyResponse])
+async def list_quota_policies(
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """List per-role and per-user generation quotas"""
+    try:
+        policies = db.query(QuotaPolicy)\
+            .options(joinedload(QuotaPolicy.role), joinedload(QuotaPolicy.user))\
+            .all()
+        return [QuotaPolicyResponse.model_validate(policy) for policy in policies]
+    except Exception as e:
+        logger.error(f"Error listing quota policies: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving quota policies"
+        )
+
+@router.put("/quotas/policies", response_model=QuotaPolicyResponse)
+async def set_quota_policy(
+    policy_data: QuotaPolicyUpdate,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Create or replace the quota policy of a role or a user"""
+    try:
+        if bool(policy_data.role_id) == bool(policy_data.user_id):
+            raise HTTPException(status_code=400, detail="Set exactly one of role_id and user_id")
+        if policy_data.role_id and not db.query(Role).filter(Role.id == policy_data.role_id).first():
+            raise HTTPException(status_code=404, detail="Role not found")
+        if policy_data.user_id and not db.query(User).filter(User.id == policy_data.user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+
+        policy = db.query(QuotaPolicy).filter(
+            QuotaPolicy.role_id == policy_data.role_id if policy_data.role_id
+            else QuotaPolicy.user_id == policy_data.user_id
+        ).first()
+        if not policy:
+            policy = QuotaPolicy(role_id=policy_data.role_id, user_id=policy_data.user_id)
+            db.add(policy)
+        for field in LIMIT_FIELDS:
+            setattr(policy, field, getattr(policy_data, field))
+        db.commit()
+        db.refresh(policy)
+        quota_manager.invalidate(policy.user_id)
+
+        logger.info(f"Quota policy {policy.id} set by {current_user.username}")
+        return QuotaPolicyResponse.model_validate(policy)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error setting quota policy: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/quotas/policies/{policy_id}")
+async def delete_quota_policy(
+    policy_id: str,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a quota policy; affected users fall back to role or default limits"""
+    try:
+        policy = db.query(QuotaPolicy).filter(QuotaPolicy.id == policy_id).first()
+        if not policy:
+            raise HTTPException(status_code=404, detail="Quota policy not found")
+        user_id = policy.user_id
+        db.delete(policy)
+        db.commit()
+        quota_manager.invalidate(user_id)
+        return {"message": "Quota policy deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting quota policy: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/quotas/users/{user_id}")
+async def get_user_quota(
+    user_id: str,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Show the limits that apply to a user"""
+    try:
+        return {"user_id": user_id, **quota_manager.limits_for(db, user_id).as_dict()}
+    except Exception as e:
+        logger.error(f"Error reading quota for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error reading quota")
+
+@router.get("/usage/top-users")
+async def usage_top_users(
+    period: str = Query("day", pattern="^(hour|day)$", description="Rollup granularity"),
+    periods: int = Query(7, ge=1, le=744, description="Number of hours or days, the current one included"),
+    order_by: str = Query(
+        "completion_tokens",
+        pattern="^(requests|errors|prompt_tokens|completion_tokens|duration_ms)$"
+    ),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Heaviest users over the last hours or days (from the usage rollups)"""
+    try:
+        return usage_stats.top_users(db, period=period, periods=periods, order_by=order_by, limit=limit)
+    except Exception as e:
+        logger.error(f"Error reading top users: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error reading usage")
+
+@router.get("/usage/latency")
+async def usage_latency(
+    period: str = Query("day", pattern="^(hour|day)$", description="Rollup granularity"),
+    periods: int = Query(7, ge=1, le=744, description="Number of hours or days, the current one included"),
+    user_id: Optional[str] = Query(None),
+    model: Optional[str] = Query(None),
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Time to first token and generation time percentiles (from the usage rollups)"""
+    try:
+        return usage_stats.latency_percentiles(db, period=period, periods=periods, user_id=user_id, model=model)
+    except Exception as e:
+        logger.error(f"Error reading latency percentiles: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error reading usage")
+
+@router.get("/usage/tasks")
+async def usage_tasks(
+    period: str = Query("day", pattern="^(hour|day)$", description="Rollup granularity"),
+    periods: int = Query(7, ge=1, le=744, description="Number of hours or days, the current one included"),
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Usage per task, counting each user towards the tasks assigned to them"""
+    try:
+        return usage_stats.usage_by_task(db, period=period, periods=periods)
+    except Exception as e:
+        logger.error(f"Error reading task usage: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error reading usage")
+
+@router.post("/usage/rollup")
+async def run_usage_rollup_now(
+    current_user: Principal = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Write buffered usage and update the rollups now instead of waiting for the schedule"""
+    try:
+        await run_in_threadpool(usage_stats.usage_recorder.flush)
+        rolled_up = await run_in_threadpool(usage_stats.rollup_usage, db)
+        return {"rolled_up": rolled_up, "recorder": usage_stats.usage_recorder.stats()}
+    except Exception as e:
+        logger.error(f"Error rolling up usage: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Error rolling up usage")
+
+@router.get("/cache-stats")
+async def cache_stats(
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    """Report in-memory cache sizes and hit rates for this worker"""
+    return {
+        "context_cache": context_cache.stats(),
+        "principal_cache": principal_cache.stats()
+    }
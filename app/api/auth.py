@@ -1,30 +1,87 @@
 # app/api/auth.py
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models.user import User
-from ..schemas.auth import LoginRequest, Token, UserResponse
+from ..schemas.auth import LoginRequest, RefreshRequest, Token, UserResponse
 from ..auth.utils import (
-    verify_password, create_access_token, 
-    get_current_user, get_current_active_user
+    verify_password_async, create_access_token,
+    get_current_user, get_current_active_user,
+    set_page_token, clear_page_token,
+    ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from ..auth.refresh import (
+    issue_refresh_token, rotate_refresh_token, revoke_refresh_token, RefreshTokenError
+)
+from ..auth.principal import Principal
+from ..auth.throttle import username_throttle, ip_throttle, client_ip as request_client_ip
+from ..services.fast_json import FastJSONResponse
 from datetime import timedelta, datetime
+from typing import Optional
+import math
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def token_response(username: str, refresh_token: str) -> dict:
+    """Access token plus the refresh token that renews it"""
+    access_token = create_access_token(
+        data={"sub": username},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+def user_info(db: Session, current_user: Principal) -> Optional[dict]:
+    """What /me returns; also embedded in the chat page"""
+    # Profile fields are not part of the cached principal
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if user is None:
+        return None
+    return {
+        "username": user.username,
+        "email": user.email,
+        "full_name": user.full_name,
+        "is_admin": current_user.is_admin,
+        "tasks": list(current_user.tasks),
+        "last_login": user.last_login.isoformat() if user.last_login else None
+    }
+
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     request: Request,
+    response: Response,
     login_data: LoginRequest,
     db: Session = Depends(get_db)
 ):
     """Login endpoint that creates and returns JWT token"""
     try:
-        # Find user
-        user = db.query(User).filter(User.username == login_data.username).first()
-        if not user or not verify_password(login_data.password, user.hashed_password):
+        # Limit attempts per username and per client before spending CPU on bcrypt
+        client_ip = request_client_ip(request)
+        retry_after = max(
+            username_throttle.hit(login_data.username.lower()),
+            ip_throttle.hit(client_ip)
+        )
+        if retry_after:
+            logger.warning(f"Throttled login attempt for username: {login_data.username} from {client_ip}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+        # Find user, then end the read transaction so the connection goes back
+        # to the pool while bcrypt runs
+        user = db.query(User.id, User.username, User.hashed_password, User.is_active)\
+            .filter(User.username == login_data.username)\
+            .first()
+        db.rollback()
+        if not user or not await verify_password_async(login_data.password, user.hashed_password):
             logger.warning(f"Failed login attempt for username: {login_data.username}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,20 +97,17 @@ async def login_for_access_token(
             )
 
         # Update last login time
-        user.last_login = datetime.utcnow()
-        db.commit()
-
-        # Create access token
-        access_token = create_access_token(
-            data={"sub": user.username},
-            expires_delta=timedelta(minutes=30)
+        db.query(User).filter(User.id == user.id).update(
+            {User.last_login: datetime.utcnow()}, synchronize_session=False
         )
+        refresh_token = issue_refresh_token(db, user.id)
+        db.commit()
+        username_throttle.reset(login_data.username.lower())
 
         logger.info(f"Successful login for user: {login_data.username}")
-        return {
-            "access_token": access_token,
-            "token_type": "bearer"
-        }
+        tokens = token_response(user.username, refresh_token)
+        set_page_token(request, response, tokens["access_token"])
+        return tokens
 
     except HTTPException:
         raise
@@ -65,16 +119,63 @@ async def login_for_access_token(
             detail="Internal server error during login"
         )
 
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    request: Request,
+    response: Response,
+    refresh_data: RefreshRequest,
+    db: Session = Depends(get_db)
+):
+    """Swap a refresh token for a new access token and refresh token, without a password"""
+    try:
+        user, refresh_token = rotate_refresh_token(db, refresh_data.refresh_token)
+        tokens = token_response(user.username, refresh_token)
+        set_page_token(request, response, tokens["access_token"])
+        return tokens
+
+    except RefreshTokenError as e:
+        logger.info(f"Refresh rejected: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session expired, please log in again",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except Exception as e:
+        logger.error(f"Refresh error: {str(e)}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during token refresh"
+        )
+
+@router.post("/logout")
+async def logout(
+    response: Response,
+    refresh_data: RefreshRequest,
+    db: Session = Depends(get_db)
+):
+    """End the session a refresh token belongs to"""
+    try:
+        revoke_refresh_token(db, refresh_data.refresh_token)
+        db.commit()
+        clear_page_token(response)
+        return {"status": "success"}
+    except Exception as e:
+        logger.error(f"Logout error: {str(e)}")
+        db.rollback()
+        # The page cookie goes even when revoking fails; an HTTPException
+        # would drop the headers set on ``response``
+        error = FastJSONResponse({"detail": "Error during logout"}, status_code=500)
+        clear_page_token(error)
+        return error
+
 @router.get("/me", response_model=dict)
 async def read_users_me(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Get current user info"""
-    return {
-        "username": current_user.username,
-        "email": current_user.email,
-        "full_name": current_user.full_name,
-        "is_admin": any(role.name == "admin" for role in current_user.roles) or current_user.is_superuser,
-        "tasks": [task.name for task in current_user.tasks],
-        "last_login": current_user.last_login.isoformat() if current_user.last_login else None
-    }
\ No newline at end of file
+    info = user_info(db, current_user)
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    return info
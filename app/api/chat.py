@@ -1,15 +1,30 @@
 # app/api/chat.py
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from ..database import get_db, SessionLocal
+from sqlalchemy import and_, desc, func, or_
+from ..config import settings
+from ..database import get_db, get_session_factory
 from ..models.chat import ChatMessage, Conversation
-from ..services.llm_service import LLMService
+from ..models.retention import ArchivedConversation
+from ..services.llm_service import LLMService, ModelNotAvailable, SYSTEM_PROMPT
+from ..services.context_cache import context_cache
+from ..services.http_cache import make_etag, etag_matches, revalidate_headers
+from ..services.fast_json import FastJSONResponse, dumps_str
+from ..services.usage import usage_recorder
+from ..services.quota import quota_manager, QuotaExceeded, retry_after_header
+from ..services.search import search_conversations
+from ..services.retention import delete_conversations, restore_conversation
+from ..services.sync import record_changes, changes_since, current_cursor
+from ..services.transfer import (
+    export_ndjson, gzip_chunks, LineDecoder, ConversationImporter, ImportFormatError
+)
 from ..auth.utils import get_current_user
-from ..models.user import User
+from ..auth.principal import Principal
 import uuid
-import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
 from datetime import datetime
 import logging
 
@@ -18,29 +33,103 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Messages of the latest conversation embedded in the chat page; the
+# MESSAGE_PAGE_SIZE of chat.js
+BOOTSTRAP_MESSAGE_LIMIT = 30
+
+def conversation_list(db: Session, user_id: str) -> list:
+    """The conversation list as /api/conversations returns it, newest first"""
+    # Each conversation's newest message, joined in one query rather than
+    # loading every conversation's messages
+    last_ids = db.query(ChatMessage.conversation_id, func.max(ChatMessage.id).label("message_id"))\
+        .join(Conversation, Conversation.id == ChatMessage.conversation_id)\
+        .filter(Conversation.user_id == user_id)\
+        .group_by(ChatMessage.conversation_id)\
+        .subquery()
+    rows = db.query(
+        Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at,
+        ChatMessage.content, ChatMessage.response
+    )\
+        .outerjoin(last_ids, last_ids.c.conversation_id == Conversation.id)\
+        .outerjoin(ChatMessage, ChatMessage.id == last_ids.c.message_id)\
+        .filter(Conversation.user_id == user_id)\
+        .order_by(desc(Conversation.updated_at))\
+        .all()
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+            "last_message": row.content,
+            "last_response": row.response or None
+        }
+        for row in rows
+    ]
+
+def conversation_page(conversation: Conversation, messages: list, has_more: bool) -> dict:
+    """A conversation with some of its messages, as /api/conversations/{id} returns it"""
+    return {
+        "conversation": {
+            "id": conversation.id,
+            "title": conversation.title,
+            "created_at": conversation.created_at,
+            "updated_at": conversation.updated_at,
+        },
+        "messages": [
+            {
+                "id": msg.id,
+                "content": msg.content,
+                "response": msg.response,
+                "timestamp": msg.timestamp
+            }
+            for msg in messages
+        ],
+        "has_more": has_more
+    }
+
+def chat_bootstrap(db: Session, current_user: Principal) -> dict:
+    """
+    What the chat page loads before its first paint: the conversation list
+    and the newest messages of the latest conversation, plus a sync cursor
+    taken before reading them so no later change is missed.
+    """
+    cursor = current_cursor(db)
+    conversations = conversation_list(db, current_user.id)
+    latest = None
+    if conversations:
+        conversation = db.query(Conversation).filter(Conversation.id == conversations[0]["id"]).first()
+        messages, has_more = message_page(db, conversation.id, BOOTSTRAP_MESSAGE_LIMIT)
+        latest = conversation_page(conversation, messages, has_more)
+    return {"sync_cursor": str(cursor), "conversations": conversations, "conversation": latest}
+
 @router.get("/conversations")
 async def list_conversations(
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """List all conversations with their latest messages"""
+    """
+    List all conversations with their latest messages.
+
+    The ETag comes from the id and version of each conversation, read
+    without loading any messages; every change bumps a version, so an
+    unchanged list costs a 304.
+    """
     try:
-        conversations = db.query(Conversation)\
+        versions = db.query(Conversation.id, Conversation.version, Conversation.updated_at)\
             .filter(Conversation.user_id == current_user.id)\
             .order_by(desc(Conversation.updated_at))\
             .all()
-        
-        return [
-            {
-                "id": conv.id,
-                "title": conv.title,
-                "created_at": conv.created_at.isoformat() if conv.created_at else None,
-                "updated_at": conv.updated_at.isoformat() if conv.updated_at else None,
-                "last_message": conv.messages[-1].content if conv.messages else None,
-                "last_response": conv.messages[-1].response if conv.messages and conv.messages[-1].response else None
-            }
-            for conv in conversations
-        ]
+        etag = make_etag([[row.id, row.version] for row in versions])
+        headers = revalidate_headers(
+            etag,
+            max((row.updated_at for row in versions if row.updated_at), default=None)
+        )
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        return FastJSONResponse(conversation_list(db, current_user.id), headers=headers)
     except Exception as e:
         logger.error(f"Error listing conversations: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -48,7 +137,7 @@ async def list_conversations(
 @router.post("/conversations")
 async def create_conversation(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new conversation"""
     try:
@@ -58,27 +147,201 @@ async def create_conversation(
             user_id=current_user.id
         )
         db.add(conversation)
+        record_changes(db, current_user.id, conversation_ids=[conversation.id])
         db.commit()
         db.refresh(conversation)
         
-        return {
+        return FastJSONResponse({
             "id": conversation.id,
             "title": conversation.title,
-            "created_at": conversation.created_at.isoformat() if conversation.created_at else None,
-            "updated_at": conversation.updated_at.isoformat() if conversation.updated_at else None
-        }
+            "created_at": conversation.created_at,
+            "updated_at": conversation.updated_at
+        })
     except Exception as e:
         logger.error(f"Error creating conversation: {str(e)}")
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/conversations/search")
+async def search_conversation_history(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for"),
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(20, ge=1, le=100, description="Results per page"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Full-text search across the current user's messages and conversation titles"""
+    try:
+        results = search_conversations(db, current_user.id, q, page=page, page_size=page_size)
+        return FastJSONResponse({
+            "query": q,
+            "page": page,
+            "page_size": page_size,
+            "results": results
+        })
+    except Exception as e:
+        logger.error(f"Error searching conversations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error searching conversations")
+
+@router.get("/conversations/export")
+async def export_conversations(
+    gzip: bool = Query(False, description="Gzip the NDJSON stream"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Stream all of the current user's conversations and messages as NDJSON"""
+    user_id = current_user.id
+    username = current_user.username
+    bind = db.get_bind()
+
+    def generate():
+        # The request session is closed before streaming starts, so the export
+        # reads through its own session on the same engine
+        export_db = Session(bind=bind)
+        try:
+            yield from export_ndjson(export_db, user_id, username)
+        except Exception as e:
+            logger.error(f"Error exporting conversations for user {username}: {str(e)}")
+            raise
+        finally:
+            export_db.close()
+
+    filename = f"conversations-{username}-{datetime.utcnow():%Y%m%d}.ndjson"
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(generate()),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'}
+        )
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/conversations/import")
+async def import_conversations(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Import an NDJSON export (plain or gzipped) sent as the request body"""
+    importer = ConversationImporter(db, current_user.id)
+    decoder = LineDecoder()
+    try:
+        async for chunk in request.stream():
+            for line in decoder.feed(chunk):
+                importer.add_line(line)
+                if importer.needs_flush:
+                    await run_in_threadpool(importer.flush)
+        for line in decoder.close():
+            importer.add_line(line)
+        return await run_in_threadpool(importer.finish)
+    except ImportFormatError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{str(e)} ({importer.stats['messages']} messages already imported)"
+        )
+    except Exception as e:
+        logger.error(f"Error importing conversations for user {current_user.username}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error importing conversations")
+
+@router.get("/conversations/archived")
+async def list_archived_conversations(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """List conversations moved to the archive by the retention job"""
+    try:
+        archived = db.query(
+            ArchivedConversation.id, ArchivedConversation.title, ArchivedConversation.updated_at,
+            ArchivedConversation.archived_at, ArchivedConversation.message_count
+        ).filter(ArchivedConversation.user_id == current_user.id)\
+            .order_by(desc(ArchivedConversation.updated_at))\
+            .all()
+        return FastJSONResponse([
+            {
+                "id": conv.id,
+                "title": conv.title,
+                "updated_at": conv.updated_at,
+                "archived_at": conv.archived_at,
+                "message_count": conv.message_count
+            }
+            for conv in archived
+        ])
+    except Exception as e:
+        logger.error(f"Error listing archived conversations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error listing archived conversations")
+
+@router.post("/conversations/archived/{conversation_id}/restore")
+async def restore_archived_conversation(
+    conversation_id: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Move an archived conversation back into the conversation list"""
+    try:
+        archived = db.query(ArchivedConversation).filter(
+            ArchivedConversation.id == conversation_id,
+            ArchivedConversation.user_id == current_user.id
+        ).first()
+        if not archived:
+            raise HTTPException(status_code=404, detail="Archived conversation not found")
+
+        conversation = restore_conversation(db, archived)
+        return FastJSONResponse({
+            "id": conversation.id,
+            "title": conversation.title,
+            "created_at": conversation.created_at,
+            "updated_at": conversation.updated_at
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error restoring conversation {conversation_id}: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Error restoring conversation")
+
+def message_page(db: Session, conversation_id: str, limit: int, before: Optional[int] = None):
+    """
+    The ``limit`` newest messages older than message ``before``, oldest first.
+
+    Keyset pagination over (timestamp, id), so a page costs the same at any
+    depth of the history. Returns the messages and whether older ones exist;
+    raises ValueError if ``before`` is not a message of the conversation.
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id)
+    if before is not None:
+        anchor = db.query(ChatMessage.timestamp)\
+            .filter(ChatMessage.id == before, ChatMessage.conversation_id == conversation_id)
+        if anchor.first() is None:
+            raise ValueError("Invalid before cursor")
+        # Compared in SQL: SQLite keeps timestamps as text, which a bound
+        # datetime parameter would not compare equal to
+        anchor_timestamp = anchor.scalar_subquery()
+        query = query.filter(or_(
+            ChatMessage.timestamp < anchor_timestamp,
+            and_(ChatMessage.timestamp == anchor_timestamp, ChatMessage.id < before)
+        ))
+    rows = query.order_by(desc(ChatMessage.timestamp), desc(ChatMessage.id)).limit(limit + 1).all()
+    return list(reversed(rows[:limit])), len(rows) > limit
+
 @router.get("/conversations/{conversation_id}")
 async def get_conversation(
     conversation_id: str,
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    before: Optional[int] = Query(None),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all messages in a conversation"""
+    """
+    Get the messages of a conversation.
+
+    Without ``limit`` every message is returned. With it, only the newest
+    ``limit`` messages (older than message ``before``, if given), and
+    ``has_more`` tells whether there are older ones to load.
+    """
     try:
         # Get conversation with user check
         conversation = db.query(Conversation).filter(
@@ -89,31 +352,28 @@ async def get_conversation(
         if not conversation:
             logger.warning(f"Conversation {conversation_id} not found or unauthorized access attempt")
             raise HTTPException(status_code=404, detail="Conversation not found")
+
+        # Every change to the conversation bumps its version
+        etag = make_etag([conversation.id, conversation.version, limit, before])
+        headers = revalidate_headers(etag, conversation.updated_at)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
         # Get messages
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.conversation_id == conversation_id
-        ).order_by(ChatMessage.timestamp).all()
+        has_more = False
+        if limit is None:
+            messages = db.query(ChatMessage).filter(
+                ChatMessage.conversation_id == conversation_id
+            ).order_by(ChatMessage.timestamp).all()
+        else:
+            try:
+                messages, has_more = message_page(db, conversation_id, limit, before)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
         logger.debug(f"Retrieved {len(messages)} messages for conversation {conversation_id}")
         
-        return {
-            "conversation": {
-                "id": conversation.id,
-                "title": conversation.title,
-                "created_at": conversation.created_at.isoformat() if conversation.created_at else None,
-                "updated_at": conversation.updated_at.isoformat() if conversation.updated_at else None,
-            },
-            "messages": [
-                {
-                    "id": msg.id,
-                    "content": msg.content,
-                    "response": msg.response,
-                    "timestamp": msg.timestamp.isoformat() if msg.timestamp else None
-                }
-                for msg in messages
-            ]
-        }
+        return FastJSONResponse(conversation_page(conversation, messages, has_more), headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -127,7 +387,7 @@ async def get_conversation(
 async def delete_conversation(
     conversation_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a conversation"""
     try:
@@ -140,7 +400,7 @@ async def delete_conversation(
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        db.delete(conversation)
+        delete_conversations(db, [conversation_id])
         db.commit()
         
         return {"status": "success", "message": "Conversation deleted successfully"}
@@ -151,134 +411,292 @@ async def delete_conversation(
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/chat")
-async def create_chat(
-    request: Request,
+@router.get("/sync")
+async def sync_changes(
+    since: Optional[str] = Query(None, description="Cursor from the previous sync"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Create a new chat message and get streaming response with conversation context"""
+    """
+    Conversations and messages created, changed or deleted after ``since``.
+
+    Without a cursor (or with one that is too old) the response has
+    ``reset`` set: reload everything, then sync from the returned cursor.
+    While ``has_more`` is set, call again with the new cursor.
+    """
     try:
-        request_data = await request.json()
-        message = request_data.get('message')
-        conversation_id = request_data.get('conversation_id')
-        
-        if not message:
-            raise HTTPException(status_code=400, detail="Message is required")
-        
-        logger.debug(f"Processing chat request - Message: {message}, Conversation ID: {conversation_id}")
-        
-        # Get or create conversation
-        conversation = db.query(Conversation)\
-            .filter(Conversation.id == conversation_id, Conversation.user_id == current_user.id)\
-            .first()
-        if not conversation:
-            conversation = Conversation(
-                id=conversation_id,
-                user_id=current_user.id
+        try:
+            cursor = int(since) if since is not None else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sync cursor")
+        return FastJSONResponse(changes_since(db, current_user.id, cursor, settings.SYNC_PAGE_SIZE))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error syncing changes for user {current_user.username}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def save_response(
+    sessions: Callable[[], Session],
+    message_id: int,
+    conversation_id: str,
+    response: str,
+    user_id: str
+) -> None:
+    """Store a finished response and bump the conversation version to match the cache"""
+    db = sessions()
+    try:
+        # Set without loading the row, which would decompress its content
+        updated = db.query(ChatMessage)\
+            .filter(ChatMessage.id == message_id)\
+            .update({ChatMessage.response: response}, synchronize_session=False)
+        if not updated:
+            return
+        db.query(Conversation)\
+            .filter(Conversation.id == conversation_id)\
+            .update({Conversation.version: Conversation.version + 1}, synchronize_session=False)
+        record_changes(db, user_id, conversation_ids=[conversation_id], message_ids=[message_id])
+        db.commit()
+
+        new_version = db.query(Conversation.version)\
+            .filter(Conversation.id == conversation_id)\
+            .scalar()
+        if new_version is None:
+            context_cache.invalidate(conversation_id)
+        else:
+            context_cache.update_response(
+                conversation_id, message_id, response, new_version - 1, new_version
             )
-            db.add(conversation)
-            db.commit()
-            logger.debug(f"Created new conversation with ID: {conversation_id}")
+    finally:
+        db.close()
+
+async def start_chat_turn(
+    db: Session,
+    current_user: Principal,
+    request_data: dict,
+    should_stop: Callable[[], Awaitable[bool]],
+    sessions: Callable[[], Session]
+) -> AsyncIterator[dict]:
+    """
+    Store a chat message and return the events of its streamed response.
+
+    Raises HTTPException (400, 404, 409, 429) before anything is stored when the
+    message can't be served. Events are dicts: progress updates, the stored
+    message id, tokens, an error, and finally ``{"done": True}``.
+    ``should_stop`` is checked before each token; when it returns true the
+    partial response is saved and the stream ends. The response is saved
+    through a new session from ``sessions``, since ``db`` may be closed by
+    then. The transport (SSE or the chat socket) turns the events into frames.
+    """
+    message = request_data.get('message')
+    conversation_id = request_data.get('conversation_id')
+
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+
+    # Checked against the cached model catalog, without a request to LM Studio
+    try:
+        llm_service = LLMService(model=request_data.get('model'))
+    except ModelNotAvailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.debug(f"Processing chat request - Message: {message}, Conversation ID: {conversation_id}")
+
+    # Get or create conversation; an id taken by another user's conversation is refused
+    conversation = db.query(Conversation)\
+        .filter(Conversation.id == conversation_id)\
+        .first()
+    if conversation is not None and conversation.user_id != current_user.id:
+        logger.warning(f"Chat attempt on conversation {conversation_id} of another user by {current_user.username}")
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation is None:
+        # A client that still has an archived conversation open must not
+        # recreate it under the same id; it has to be restored first
+        archived_owner = db.query(ArchivedConversation.user_id)\
+            .filter(ArchivedConversation.id == conversation_id)\
+            .scalar()
+        if archived_owner == current_user.id:
+            raise HTTPException(status_code=409, detail="Conversation is archived, restore it to continue")
+        if archived_owner is not None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # Enforce quotas once the request is known to be valid, before anything
+    # is stored or sent to the backend
+    limits = quota_manager.limits_for(db, current_user.id)
+    try:
+        max_tokens = await quota_manager.acquire_async(current_user.id, limits)
+    except QuotaExceeded as e:
+        logger.info(f"Quota {e.limit} exceeded for user {current_user.username}")
+        raise HTTPException(
+            status_code=429,
+            detail="Usage limit reached, please try again later",
+            headers=retry_after_header(e.retry_after)
+        )
+
+    if not conversation:
+        conversation = Conversation(
+            id=conversation_id,
+            user_id=current_user.id,
+            version=1
+        )
+        db.add(conversation)
+        record_changes(db, current_user.id, conversation_ids=[conversation_id])
+        db.commit()
+        logger.debug(f"Created new conversation with ID: {conversation_id}")
 
-        # Get conversation history
-        history = db.query(ChatMessage)\
+    # Get conversation history, reusing the cached context when still current
+    context = context_cache.get(conversation_id, conversation.version)
+    if context is None:
+        history = db.query(ChatMessage.id, ChatMessage.content, ChatMessage.response)\
             .filter(ChatMessage.conversation_id == conversation_id)\
             .order_by(ChatMessage.timestamp)\
             .all()
-        
-        # Format history for context
-        conversation_history = [
-            {
-                "content": msg.content,
-                "response": msg.response,
-                "timestamp": msg.timestamp.isoformat() if msg.timestamp else None
-            }
-            for msg in history
-        ]
-
-        # Create chat message
-        chat_message = ChatMessage(
-            content=message,
-            conversation_id=conversation_id,
-            response=""
+        context = context_cache.put(
+            conversation_id,
+            conversation.version,
+            [{"id": msg.id, "content": msg.content, "response": msg.response} for msg in history]
         )
-        db.add(chat_message)
-        db.commit()
-        db.refresh(chat_message)
-        message_id = chat_message.id
+    is_first_message = not context.messages
+
+    # Snapshot the history for this turn; the cached list keeps growing
+    conversation_history = list(context.messages)
+    estimated_tokens = context.estimated_tokens + (len(SYSTEM_PROMPT) + len(message)) // 4
+
+    # Create chat message
+    chat_message = ChatMessage(
+        content=message,
+        conversation_id=conversation_id,
+        response=""
+    )
+    db.add(chat_message)
+    db.flush()
+    message_id = chat_message.id
+    
+    # Update conversation
+    conversation.updated_at = datetime.utcnow()
+    if is_first_message:
+        conversation.title = (message[:47] + "...") if len(message) > 50 else message
+    previous_version = conversation.version
+    new_version = previous_version + 1
+    conversation.version = new_version
+    record_changes(db, current_user.id, conversation_ids=[conversation_id], message_ids=[message_id])
+    db.commit()
+    # Not read back from the conversation: that would reload it and begin
+    # another transaction, keeping the connection checked out while the
+    # response streams
+    context_cache.append_message(
+        conversation_id,
+        {"id": message_id, "content": message, "response": ""},
+        previous_version,
+        new_version
+    )
+
+    user_id = current_user.id
+
+    async def generate_response():
+        full_response = ""
+        usage = {}
+        chunks = 0
+        first_token_at = None
+        outcome = None
+        started = time.perf_counter()
         
-        # Update conversation
-        conversation.updated_at = datetime.utcnow()
-        if len(conversation.messages) == 1:
-            conversation.title = (message[:47] + "...") if len(message) > 50 else message
-        db.commit()
+        try:
+            # Send initial context processing message
+            yield {'progress': 'Processing conversation context...'}
+
+            # Lets the client recognise this message when it comes back through /api/sync
+            yield {'messageId': message_id, 'conversationId': conversation_id}
+
+            # Send context size information
+            yield {'progress': f'Processing {estimated_tokens} estimated tokens...'}
 
-        async def generate_response():
-            llm_service = LLMService()
-            full_response = ""
+            async for token in llm_service.generate_stream(
+                message, 
+                conversation_history=conversation_history,
+                params={"max_tokens": max_tokens} if max_tokens else None,
+                usage=usage
+            ):
+                if await should_stop():
+                    logger.info(f"Stream closed or cancelled, stopping generation for message {message_id}")
+                    outcome = "cancelled"
+                    break
+
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks += 1
+                full_response += token
+                yield {'token': token, 'conversationId': conversation_id}
+            
+            logger.debug(f"Generated full response for message {message_id}")
+            
+            # Update the message with the complete response
+            try:
+                save_response(sessions, message_id, conversation_id, full_response, user_id)
+                logger.debug(f"Saved response to database for message {message_id}")
+            except Exception as db_error:
+                logger.error(f"Database error while saving response: {db_error}")
             
+            outcome = outcome or ("error" if usage.get("error") else "ok")
+            yield {'done': True}
+            
+        except Exception as e:
+            outcome = "error"
+            error_msg = str(e)
+            logger.error(f"Error generating response: {error_msg}")
+            yield {'error': error_msg}
+            
+            # Save error message as response
             try:
-                # Send initial context processing message
-                yield f"data: {json.dumps({'progress': 'Processing conversation context...'})}\n\n"
-
-                # Get token estimate for context
-                messages = llm_service.format_messages(conversation_history, message)
-                estimated_tokens = llm_service.estimate_token_length(messages)
-                
-                # Send context size information
-                yield f"data: {json.dumps({'progress': f'Processing {estimated_tokens} estimated tokens...'})}\n\n"
-
-                async for token in llm_service.generate_stream(
-                    message, 
-                    conversation_history=conversation_history
-                ):
-                    if await request.is_disconnected():
-                        logger.info(f"Client disconnected, stopping generation for message {message_id}")
-                        break
-
-                    full_response += token
-                    yield f"data: {json.dumps({'token': token, 'conversationId': conversation_id})}\n\n"
-                
-                logger.debug(f"Generated full response for message {message_id}")
-                
-                # Update the message with the complete response
-                db_for_update = SessionLocal()
-                try:
-                    msg = db_for_update.query(ChatMessage).get(message_id)
-                    if msg:
-                        msg.response = full_response
-                        db_for_update.commit()
-                        logger.debug(f"Saved response to database for message {message_id}")
-                except Exception as db_error:
-                    logger.error(f"Database error while saving response: {db_error}")
-                finally:
-                    db_for_update.close()
-                
-                yield "data: [DONE]\n\n"
-                
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Error generating response: {error_msg}")
-                yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                
-                # Save error message as response
-                db_for_update = SessionLocal()
-                try:
-                    msg = db_for_update.query(ChatMessage).get(message_id)
-                    if msg:
-                        msg.response = f"Error: {error_msg}"
-                        db_for_update.commit()
-                except Exception as db_error:
-                    logger.error(f"Database error while saving error response: {db_error}")
-                finally:
-                    db_for_update.close()
+                save_response(sessions, message_id, conversation_id, f"Error: {error_msg}", user_id)
+            except Exception as db_error:
+                logger.error(f"Database error while saving error response: {db_error}")
+
+        finally:
+            try:
+                await quota_manager.consume_async(user_id, limits, usage.get("completion_tokens", chunks))
+            except Exception as quota_error:
+                logger.error(f"Could not debit quota for user {user_id}: {quota_error}")
+            # Buffered in memory; written to the database in batches
+            usage_recorder.record(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                model=llm_service.model,
+                status=outcome or "cancelled",
+                prompt_tokens=usage.get("prompt_tokens", estimated_tokens),
+                completion_tokens=usage.get("completion_tokens", chunks),
+                ttft_ms=round((first_token_at - started) * 1000) if first_token_at else None,
+                duration_ms=round((time.perf_counter() - started) * 1000)
+            )
 
+    return generate_response()
+
+async def sse_frames(events: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Chat events as server-sent event frames; the last one is ``[DONE]``"""
+    async for event in events:
+        if event.get("done"):
+            yield "data: [DONE]\n\n"
+        else:
+            yield f"data: {dumps_str(event)}\n\n"
+
+@router.post("/chat")
+async def create_chat(
+    request: Request,
+    db: Session = Depends(get_db),
+    sessions: Callable[[], Session] = Depends(get_session_factory),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Create a new chat message and get streaming response with conversation context"""
+    try:
+        request_data = await request.json()
+        events = await start_chat_turn(db, current_user, request_data, request.is_disconnected, sessions)
         return StreamingResponse(
-            generate_response(),
+            sse_frames(events),
             media_type="text/event-stream"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -287,7 +705,7 @@ async def create_chat(
 async def update_conversation(
     conversation_id: str,
     request: Request,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update conversation title - verify user owns the conversation"""
@@ -306,17 +724,20 @@ async def update_conversation(
         if title := data.get("title"):
             conversation.title = title
             conversation.updated_at = datetime.utcnow()
+            conversation.version = Conversation.version + 1
+            record_changes(db, current_user.id, conversation_ids=[conversation_id])
             db.commit()
             db.refresh(conversation)
+            context_cache.invalidate(conversation_id)
             
             logger.info(f"Updated conversation {conversation_id} title for user {current_user.username}")
         
-        return {
+        return FastJSONResponse({
             "id": conversation.id,
             "title": conversation.title,
-            "created_at": conversation.created_at.isoformat() if conversation.created_at else None,
-            "updated_at": conversation.updated_at.isoformat() if conversation.updated_at else None
-        }
+            "created_at": conversation.created_at,
+            "updated_at": conversation.updated_at
+        })
     except HTTPException:
         raise
     except Exception as e:
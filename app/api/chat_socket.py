@@ -0,0 +1,229 @@
+# app/api/chat_socket.py
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from jose import JWTError
+from ..config import settings
+from ..database import get_session_factory
+from ..auth.utils import get_current_user
+from ..auth.keys import key_ring
+from ..auth.principal import Principal
+from ..services.fast_json import dumps_str
+from .chat import start_chat_turn
+import asyncio
+import json
+import time
+from typing import Callable, Dict, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# A client that stays silent for this many heartbeats is disconnected
+MISSED_HEARTBEATS = 3
+
+# Close codes sent to the client
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_GOING_AWAY = 1001
+
+class ChatSocket:
+    """
+    One WebSocket carrying any number of generation streams.
+
+    The client authenticates with its first frame, then starts streams with
+    ``{"type": "chat", "id": ..., "message": ..., "conversation_id": ...}``
+    where ``id`` is a message id the client picks. Every event of a stream
+    is sent as the same JSON the SSE endpoint sends, plus that ``id``; a
+    stream ends with ``done`` or ``error``. ``{"type": "cancel", "id": ...}``
+    stops a stream (its partial answer is kept, as when an SSE client
+    disconnects). The server pings while idle and drops clients that stop
+    answering.
+
+    All frames go out through one bounded queue with a single writer. When
+    the client reads slower than the model writes, the queue fills and the
+    streams wait before taking the next token, instead of buffering without
+    limit.
+
+    No database session is held for the life of the connection: each auth
+    frame and each chat turn opens its own and closes it before streaming,
+    so idle sockets don't keep pool connections checked out.
+    """
+
+    def __init__(self, websocket: WebSocket, sessions: Callable[[], Session]):
+        self.websocket = websocket
+        self.sessions = sessions
+        self.user: Optional[Principal] = None
+        self.token_expires = 0.0
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.CHAT_SOCKET_SEND_QUEUE)
+        self.streams: Dict[str, asyncio.Event] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.closed = False
+        self.last_seen = time.monotonic()
+        # Frames the client accepted also show it is alive while it streams
+        self.last_sent = self.last_seen
+
+    async def authenticate(self, token: str) -> bool:
+        """Check an access token; a connection stays bound to its first user"""
+        db = self.sessions()
+        try:
+            payload = key_ring.decode(token)
+            user = await get_current_user(token, db)
+        except (JWTError, HTTPException):
+            return False
+        finally:
+            db.close()
+        if not user.is_active or (self.user is not None and user.id != self.user.id):
+            return False
+        self.user = user
+        self.token_expires = float(payload.get("exp", 0))
+        return True
+
+    async def run(self) -> None:
+        await self.websocket.accept()
+        try:
+            first = json.loads(await asyncio.wait_for(
+                self.websocket.receive_text(), timeout=settings.CHAT_SOCKET_AUTH_SECONDS
+            ))
+            authenticated = first.get("type") == "auth" and await self.authenticate(str(first.get("token", "")))
+        except (asyncio.TimeoutError, ValueError, AttributeError):
+            authenticated = False
+        except WebSocketDisconnect:
+            return
+        if not authenticated:
+            await self.websocket.close(code=CLOSE_POLICY_VIOLATION, reason="Authentication required")
+            return
+
+        await self.websocket.send_text(dumps_str({"type": "ready"}))
+        writer = asyncio.create_task(self.write())
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                self.last_seen = time.monotonic()
+                try:
+                    frame = json.loads(text)
+                except ValueError:
+                    continue
+                if isinstance(frame, dict):
+                    await self.handle(frame)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            if self.closed:
+                # The heartbeat closed the socket while receive() was waiting
+                logger.debug(f"Chat socket for user {self.user.username} closed: {str(e)}")
+            else:
+                logger.error(f"Chat socket error for user {self.user.username}: {str(e)}")
+        finally:
+            self.closed = True
+            for stop in self.streams.values():
+                stop.set()
+            # The writer keeps draining the queue so no stream stays blocked on it
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            writer.cancel()
+            heartbeat.cancel()
+
+    async def handle(self, frame: dict) -> None:
+        kind = frame.get("type")
+        if kind == "chat":
+            await self.start_stream(frame)
+        elif kind == "cancel":
+            stop = self.streams.get(str(frame.get("id")))
+            if stop is not None:
+                stop.set()
+        elif kind == "auth":
+            # Clients send a renewed access token before it expires
+            if not await self.authenticate(str(frame.get("token", ""))):
+                await self.send({"type": "error", "error": "Could not validate credentials", "status": 401})
+
+    async def start_stream(self, frame: dict) -> None:
+        stream_id = frame.get("id")
+        if not isinstance(stream_id, str) or not stream_id or stream_id in self.streams:
+            await self.send({"id": stream_id, "error": "Each stream needs a new id", "status": 400})
+            return
+        if time.time() >= self.token_expires:
+            await self.send({"id": stream_id, "error": "Session expired", "status": 401})
+            return
+        if len(self.streams) >= settings.CHAT_SOCKET_MAX_STREAMS:
+            await self.send({"id": stream_id, "error": "Too many streams on this connection", "status": 429})
+            return
+
+        stop = asyncio.Event()
+
+        async def should_stop() -> bool:
+            return stop.is_set()
+
+        # The turn's writes are committed before streaming starts; the
+        # response is saved later through a session of its own
+        db = self.sessions()
+        try:
+            events = await start_chat_turn(db, self.user, frame, should_stop, self.sessions)
+        except HTTPException as e:
+            error = {"id": stream_id, "error": e.detail, "status": e.status_code}
+            if e.headers and "Retry-After" in e.headers:
+                error["retry_after"] = int(e.headers["Retry-After"])
+            await self.send(error)
+            return
+        except Exception as e:
+            logger.error(f"Error starting chat stream for user {self.user.username}: {str(e)}")
+            await self.send({"id": stream_id, "error": "Failed to start generation", "status": 500})
+            return
+        finally:
+            db.close()
+
+        self.streams[stream_id] = stop
+        task = asyncio.create_task(self.relay(stream_id, events))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def relay(self, stream_id: str, events) -> None:
+        try:
+            async for event in events:
+                event["id"] = stream_id
+                await self.send(event)
+        finally:
+            self.streams.pop(stream_id, None)
+
+    async def send(self, frame: dict) -> None:
+        """Queue a frame; waits while the client is behind"""
+        if not self.closed:
+            await self.outbox.put(dumps_str(frame))
+
+    async def write(self) -> None:
+        while True:
+            text = await self.outbox.get()
+            if self.closed:
+                continue
+            try:
+                await self.websocket.send_text(text)
+                self.last_sent = time.monotonic()
+            except Exception:
+                self.close_streams()
+
+    async def heartbeat(self) -> None:
+        interval = settings.CHAT_SOCKET_HEARTBEAT_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            # A client reading a long stream may not get to a ping (the queue
+            # is full of tokens), but the frames it takes show it is there
+            last_alive = max(self.last_seen, self.last_sent) if self.streams else self.last_seen
+            if time.monotonic() - last_alive > interval * MISSED_HEARTBEATS:
+                logger.info(f"Chat socket for user {self.user.username} stopped answering, closing")
+                self.close_streams()
+                await self.websocket.close(code=CLOSE_GOING_AWAY, reason="Heartbeat timeout")
+                return
+            try:
+                # A full queue means frames are flowing anyway
+                self.outbox.put_nowait('{"type": "ping"}')
+            except asyncio.QueueFull:
+                pass
+
+    def close_streams(self) -> None:
+        self.closed = True
+        for stop in self.streams.values():
+            stop.set()
+
+@router.websocket("/chat/ws")
+async def chat_socket(websocket: WebSocket, sessions: Callable[[], Session] = Depends(get_session_factory)):
+    """Multiplexed chat streams over one WebSocket; see ChatSocket"""
+    await ChatSocket(websocket, sessions).run()
@@ -1,11 +1,10 @@
 # app/api/settings.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models.user import User
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from ..auth.utils import get_current_user
-import aiohttp
-from ..config import settings
+from ..auth.principal import Principal
+from ..services.model_catalog import model_catalog, ModelCatalogUnavailable
+from ..services.http_cache import etag_matches
+from ..services.fast_json import FastJSONResponse
 import logging
 
 router = APIRouter()
@@ -13,25 +12,21 @@ logger = logging.getLogger(__name__)
 
 @router.get("/models")
 async def list_models(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Get available models from LM Studio"""
+    """Get available models from the cached model catalog, with an ETag for revalidation"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{settings.LM_STUDIO_URL}/models",
-                headers={"Authorization": f"Bearer {settings.LM_STUDIO_KEY}"}
-            ) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_502_BAD_GATEWAY,
-                        detail="Failed to fetch models from LM Studio"
-                    )
-                return await response.json()
-    except aiohttp.ClientError as e:
-        logger.error(f"Error connecting to LM Studio: {str(e)}")
+        models, etag = await model_catalog.get()
+    except ModelCatalogUnavailable as e:
+        logger.error(f"Error loading models from LM Studio: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Could not connect to LM Studio"
-        )
\ No newline at end of file
+        )
+
+    # no-cache: browsers keep the list but revalidate it, which costs a 304 at most
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FastJSONResponse(models, headers=headers)
@@ -0,0 +1,131 @@
+# app/auth/hashing.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from passlib.context import CryptContext
+from ..config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _hash_password(password: str) -> str:
+    # Module-level so it can be sent to the bulk process pool
+    return pwd_context.hash(password)
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+    pass
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification off the event loop.
+
+    A bcrypt round takes 100-300 ms of CPU. Run inline in an ``async def``
+    handler it stalls every other request on the worker, including token
+    streams. The bcrypt extension releases the GIL, so a small thread pool
+    is enough to keep the loop responsive. At most ``max_workers`` hashes
+    run at once and ``max_queue`` more may wait; anything beyond that is
+    rejected with ``PasswordHasherBusy`` instead of piling up.
+
+    With ``max_workers=0`` hashing runs inline (the old behaviour).
+
+    Bulk imports hash through ``hash_many`` instead, which uses a separate
+    process pool of ``bulk_processes`` so a large import neither waits in
+    nor starves the login queue. A batch may hold at most ``bulk_max_batch``
+    passwords; larger ones raise ``ValueError`` before anything is queued.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue: int = 32,
+        bulk_processes: int = 0,
+        bulk_max_batch: int = 5000
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.bulk_processes = bulk_processes or os.cpu_count() or 1
+        self.bulk_max_batch = bulk_max_batch
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._bulk_executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+    async def _run(self, fn: Callable, *args):
+        if self.max_workers <= 0:
+            return fn(*args)
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash a batch of passwords across the bulk process pool, in order."""
+        if not passwords:
+            return []
+        if len(passwords) > self.bulk_max_batch:
+            raise ValueError(f"At most {self.bulk_max_batch} passwords per batch")
+        if self._bulk_executor is None:
+            # spawn, not fork: the parent runs threads that a fork would copy mid-lock
+            self._bulk_executor = ProcessPoolExecutor(
+                max_workers=self.bulk_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(*[
+            loop.run_in_executor(self._bulk_executor, _hash_password, password)
+            for password in passwords
+        ])
+        self.completed += len(hashes)
+        return list(hashes)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._bulk_executor is not None:
+            self._bulk_executor.shutdown(wait=False, cancel_futures=True)
+            self._bulk_executor = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "bulk_processes": self.bulk_processes,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+# Shared per-process pool
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE,
+    bulk_processes=settings.PASSWORD_HASH_BULK_PROCESSES,
+    bulk_max_batch=settings.BULK_USER_MAX_ROWS
+)
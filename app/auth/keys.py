@@ -0,0 +1,256 @@
+# app/auth/keys.py
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, List, Optional
+from jose import JWTError, jwt
+from ..config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "HS256"
+
+class SigningKey:
+    """An HMAC key for access tokens, identified by its ``kid``."""
+    __slots__ = ("kid", "secret", "expires_at")
+
+    def __init__(self, kid: str, secret: str, expires_at: Optional[datetime] = None):
+        self.kid = kid
+        self.secret = secret
+        self.expires_at = expires_at
+
+    def is_expired(self, now: datetime) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+def generate_key(now: Optional[datetime] = None) -> dict:
+    """A new key file entry with a random 256-bit secret."""
+    now = now or datetime.now(timezone.utc)
+    return {
+        "kid": f"{now:%Y%m%d%H%M%S}-{secrets.token_hex(4)}",
+        "secret": secrets.token_hex(32),
+        "created_at": now.isoformat(),
+        "expires_at": None
+    }
+
+def read_key_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_temp_file(directory: str, data: dict) -> str:
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".jwt_keys.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.chmod(tmp_path, 0o600)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+def write_key_file(path: str, data: dict) -> None:
+    """Replace the key file atomically, readable by the owner only."""
+    tmp_path = _write_temp_file(os.path.dirname(os.path.abspath(path)), data)
+    try:
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def create_key_file(path: str) -> bool:
+    """
+    Create a key file with one fresh key unless it already exists.
+
+    The complete file is linked into place, which fails if the path exists,
+    so when several workers start at once exactly one key wins and nobody
+    reads a half-written file. Returns whether this call created it.
+    """
+    if os.path.exists(path):
+        return False
+    key = generate_key()
+    tmp_path = _write_temp_file(
+        os.path.dirname(os.path.abspath(path)),
+        {"current": key["kid"], "keys": [key]}
+    )
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(tmp_path)
+
+def rotate_key_file(path: str, grace: timedelta, now: Optional[datetime] = None) -> dict:
+    """
+    Make a new key current and keep the previous ones for ``grace``.
+
+    Old keys still verify tokens they signed until their expiry, which
+    should be at least the access token lifetime. Keys already past their
+    expiry are dropped. Returns the new key entry.
+    """
+    now = now or datetime.now(timezone.utc)
+    data = read_key_file(path)
+    keys = []
+    for entry in data.get("keys", []):
+        expires_at = _parse_time(entry.get("expires_at"))
+        if expires_at is not None and expires_at <= now:
+            continue
+        if expires_at is None or expires_at > now + grace:
+            entry["expires_at"] = (now + grace).isoformat()
+        keys.append(entry)
+    key = generate_key(now)
+    write_key_file(path, {"current": key["kid"], "keys": [key] + keys})
+    return key
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def parse_inline_keys(value: str) -> List[SigningKey]:
+    """Parse ``kid:secret,kid:secret``; the first key signs, the rest only verify."""
+    keys = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kid, sep, secret = item.partition(":")
+        if not sep or not kid or not secret:
+            raise ValueError("JWT_KEYS entries must look like kid:secret")
+        keys.append(SigningKey(kid.strip(), secret.strip()))
+    return keys
+
+class KeyRing:
+    """
+    Signing keys shared by every worker, looked up by ``kid``.
+
+    Keys come from, in order of preference: JWT_KEYS (inline), the
+    JWT_KEYS_FILE key file if it exists, a legacy SECRET_KEY, or a key file
+    generated on first start. A key file is re-read when it changes, checked
+    at most every ``reload_seconds`` and immediately when a token names an
+    unknown ``kid`` (another worker may already have picked up a rotation).
+    """
+
+    def __init__(
+        self,
+        inline_keys: str = "",
+        key_file: str = "",
+        legacy_secret: str = "",
+        reload_seconds: float = 30.0
+    ):
+        self.inline_keys = inline_keys
+        self.key_file = key_file
+        self.legacy_secret = legacy_secret
+        self.reload_seconds = reload_seconds
+        self._keys: Dict[str, SigningKey] = {}
+        self._current: Optional[SigningKey] = None
+        self._file_version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+        self._loaded = False
+
+    def _use_file(self) -> bool:
+        return not self.inline_keys and bool(self.key_file) and (
+            os.path.exists(self.key_file) or not self.legacy_secret
+        )
+
+    def _load(self) -> None:
+        if self.inline_keys:
+            keys = parse_inline_keys(self.inline_keys)
+            if not keys:
+                raise ValueError("JWT_KEYS is set but contains no keys")
+            self._set_keys(keys, keys[0].kid)
+        elif self._use_file():
+            if create_key_file(self.key_file):
+                logger.info(f"Created signing key file {self.key_file}; share it between all workers and replicas")
+            self._load_file()
+        elif self.legacy_secret:
+            # Stable kid so every process using the same SECRET_KEY agrees
+            kid = hashlib.sha256(self.legacy_secret.encode("utf-8")).hexdigest()[:8]
+            self._set_keys([SigningKey(kid, self.legacy_secret)], kid)
+        else:
+            raise ValueError("No signing key configured: set JWT_KEYS, JWT_KEYS_FILE or SECRET_KEY")
+        self._loaded = True
+
+    def _load_file(self) -> None:
+        self._file_version = self._stat_key_file()
+        data = read_key_file(self.key_file)
+        keys = [
+            SigningKey(entry["kid"], entry["secret"], _parse_time(entry.get("expires_at")))
+            for entry in data.get("keys", [])
+        ]
+        current = data.get("current") or (keys[0].kid if keys else None)
+        if current not in {key.kid for key in keys}:
+            raise ValueError(f"Key file {self.key_file} has no current key")
+        self._set_keys(keys, current)
+        logger.info(f"Loaded {len(keys)} signing key(s), current kid {current}")
+
+    def _stat_key_file(self) -> tuple:
+        # Rotation replaces the file, so the inode changes even within one mtime tick
+        st = os.stat(self.key_file)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _set_keys(self, keys: List[SigningKey], current: str) -> None:
+        self._keys = {key.kid: key for key in keys}
+        self._current = self._keys[current]
+
+    def _refresh(self, force: bool = False) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                return
+            if self._file_version is None:
+                return
+            now = time.monotonic()
+            if not force and now - self._checked_at < self.reload_seconds:
+                return
+            self._checked_at = now
+            try:
+                if self._stat_key_file() != self._file_version:
+                    self._load_file()
+            except (OSError, ValueError, KeyError) as e:
+                # Keep the keys we have rather than locking everyone out
+                logger.error(f"Could not reload signing keys: {str(e)}")
+
+    def current_key(self) -> SigningKey:
+        self._refresh()
+        return self._current
+
+    def get_key(self, kid: Optional[str]) -> Optional[SigningKey]:
+        """Key for a token's ``kid``; tokens without one predate key IDs and use the current key."""
+        self._refresh()
+        if kid is None:
+            return self._current
+        key = self._keys.get(kid)
+        if key is None:
+            self._refresh(force=True)
+            key = self._keys.get(kid)
+        return key
+
+    def encode(self, claims: dict) -> str:
+        key = self.current_key()
+        return jwt.encode(claims, key.secret, algorithm=ALGORITHM, headers={"kid": key.kid})
+
+    def decode(self, token: str) -> dict:
+        """Verify a token with the key its header names; raises JWTError."""
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.get_key(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key {kid}")
+        if key.is_expired(datetime.now(timezone.utc)):
+            raise JWTError(f"Signing key {kid} has been retired")
+        return jwt.decode(token, key.secret, algorithms=[ALGORITHM])
+
+# Shared per-process key ring, loaded on first use
+key_ring = KeyRing(
+    inline_keys=settings.JWT_KEYS,
+    key_file=settings.JWT_KEYS_FILE,
+    legacy_secret=settings.SECRET_KEY,
+    reload_seconds=settings.JWT_KEYS_RELOAD_SECONDS
+)
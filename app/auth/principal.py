@@ -0,0 +1,124 @@
+# app/auth/principal.py
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+from ..config import settings
+from ..models.user import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Principal:
+    """
+    The authenticated user as seen by request handlers.
+
+    A read-only snapshot of the fields authorization needs, so it can be
+    cached and shared between requests. Load the ``User`` row when anything
+    else (email, last login, ...) is needed.
+    """
+    __slots__ = ("id", "username", "is_active", "is_superuser", "roles", "tasks")
+
+    def __init__(
+        self,
+        id: str,
+        username: str,
+        is_active: bool,
+        is_superuser: bool,
+        roles: Tuple[str, ...] = (),
+        tasks: Tuple[str, ...] = ()
+    ):
+        self.id = id
+        self.username = username
+        self.is_active = bool(is_active)
+        self.is_superuser = bool(is_superuser)
+        self.roles = tuple(roles)
+        self.tasks = tuple(tasks)
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            roles=tuple(role.name for role in user.roles),
+            tasks=tuple(task.name for task in user.tasks)
+        )
+
+    @property
+    def is_admin(self) -> bool:
+        return self.is_superuser or "admin" in self.roles
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of principals keyed by token subject (username).
+
+    Entries expire after ``ttl_seconds``. Admin changes to a user invalidate
+    the entry in this worker right away; other workers pick the change up
+    when their entry expires.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[Principal]:
+        """Return the cached principal if present and not expired."""
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, subject: str, principal: Principal) -> None:
+        """Store a freshly loaded principal, evicting the least recently used entry."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        """Drop a subject from the cache."""
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit rate figures for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0
+            }
+
+# Shared per-process cache used by get_current_user
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
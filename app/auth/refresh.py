@@ -0,0 +1,135 @@
+# app/auth/refresh.py
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.token import RefreshToken
+from ..models.user import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RefreshTokenError(Exception):
+    """Raised when a refresh token is unknown, expired, revoked or reused."""
+    pass
+
+def hash_refresh_token(token: str) -> str:
+    """
+    Hash a refresh token for storage and lookup.
+
+    Tokens are 256 random bits, so a plain SHA-256 is enough; unlike a
+    password they cannot be guessed, and no bcrypt round is needed.
+    """
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timezone-aware columns back as naive UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def issue_refresh_token(
+    db: Session,
+    user_id: str,
+    family_id: Optional[str] = None,
+    session_started_at: Optional[datetime] = None,
+    now: Optional[datetime] = None
+) -> str:
+    """
+    Create a refresh token and return it in plain text. Does not commit.
+
+    Without ``family_id`` a new session (family) is started. The expiry slides
+    forward with every refresh but never past REFRESH_TOKEN_MAX_SESSION_DAYS
+    after the original login.
+    """
+    now = now or datetime.now(timezone.utc)
+    session_started_at = session_started_at or now
+    expires_at = min(
+        now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        _as_utc(session_started_at) + timedelta(days=settings.REFRESH_TOKEN_MAX_SESSION_DAYS)
+    )
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or str(uuid.uuid4()),
+        session_started_at=session_started_at,
+        expires_at=expires_at
+    ))
+    return token
+
+def revoke_family(db: Session, family_id: str, now: Optional[datetime] = None) -> int:
+    """Revoke every token of a session. Does not commit."""
+    return db.query(RefreshToken)\
+        .filter(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))\
+        .update({RefreshToken.revoked_at: now or datetime.now(timezone.utc)}, synchronize_session=False)
+
+def revoke_user_tokens(db: Session, user_id: str) -> int:
+    """Revoke all sessions of a user (deactivation, password change). Does not commit."""
+    return db.query(RefreshToken)\
+        .filter(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))\
+        .update({RefreshToken.revoked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+
+def revoke_refresh_token(db: Session, token: str) -> bool:
+    """Revoke the session a token belongs to (logout). Does not commit."""
+    stored = db.query(RefreshToken)\
+        .filter(RefreshToken.token_hash == hash_refresh_token(token))\
+        .first()
+    if stored is None:
+        return False
+    revoke_family(db, stored.family_id)
+    return True
+
+def rotate_refresh_token(db: Session, token: str, now: Optional[datetime] = None) -> Tuple[User, str]:
+    """
+    Exchange a refresh token for a new one and return the user with it.
+
+    The presented token is marked replaced. Presenting it again within
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS (two tabs refreshing at once) gets
+    another token of the same session; later reuse is treated as theft and
+    revokes the whole session. Commits on success and on revocation.
+    """
+    now = now or datetime.now(timezone.utc)
+    stored = db.query(RefreshToken)\
+        .filter(RefreshToken.token_hash == hash_refresh_token(token))\
+        .with_for_update()\
+        .first()
+    if stored is None:
+        raise RefreshTokenError("Unknown refresh token")
+    if stored.revoked_at is not None:
+        raise RefreshTokenError("Refresh token revoked")
+    if _as_utc(stored.expires_at) <= now:
+        raise RefreshTokenError("Refresh token expired")
+    if stored.replaced_at is not None:
+        grace = timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+        if now - _as_utc(stored.replaced_at) > grace:
+            revoke_family(db, stored.family_id, now)
+            db.commit()
+            logger.warning(f"Refresh token reuse detected for user {stored.user_id}; session revoked")
+            raise RefreshTokenError("Refresh token reused")
+    else:
+        stored.replaced_at = now
+
+    user = db.query(User).filter(User.id == stored.user_id).first()
+    if user is None or not user.is_active:
+        revoke_family(db, stored.family_id, now)
+        db.commit()
+        raise RefreshTokenError("User inactive")
+
+    new_token = issue_refresh_token(
+        db, user.id,
+        family_id=stored.family_id,
+        session_started_at=stored.session_started_at,
+        now=now
+    )
+    db.commit()
+    return user, new_token
+
+def purge_expired_refresh_tokens(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete tokens past their expiry; revoked and replaced ones expire too. Commits."""
+    deleted = db.query(RefreshToken)\
+        .filter(RefreshToken.expires_at < (now or datetime.now(timezone.utc)))\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,148 @@
+# app/auth/throttle.py
+import ipaddress
+import time
+from collections import deque
+from threading import Lock
+from typing import Deque, Dict, List, Optional, Union
+from starlette.requests import HTTPConnection
+from ..config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+class LoginThrottle:
+    """
+    Sliding-window limit on login attempts per key (username or client IP).
+
+    Every attempt counts, successful or not, because each one costs a bcrypt
+    verification. A successful login clears the username's window so a user
+    who mistyped a few times is not locked out afterwards.
+    """
+
+    def __init__(self, max_attempts: int, window_seconds: float, max_keys: int = 10000):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._attempts: Dict[str, Deque[float]] = {}
+        self._lock = Lock()
+        self.throttled = 0
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        for key in [k for k, attempts in self._attempts.items() if attempts[-1] <= cutoff]:
+            del self._attempts[key]
+
+    def hit(self, key: str) -> float:
+        """
+        Record an attempt for ``key``.
+
+        Returns 0 if the attempt is allowed, otherwise the number of seconds
+        until the oldest attempt in the window expires (the attempt is then
+        not recorded).
+        """
+        if self.max_attempts <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts is None:
+                if len(self._attempts) >= self.max_keys:
+                    self._prune(now)
+                attempts = self._attempts[key] = deque()
+            cutoff = now - self.window_seconds
+            while attempts and attempts[0] <= cutoff:
+                attempts.popleft()
+            if len(attempts) >= self.max_attempts:
+                self.throttled += 1
+                return attempts[0] + self.window_seconds - now
+            attempts.append(now)
+            return 0.0
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._attempts.clear()
+            self.throttled = 0
+
+username_throttle = LoginThrottle(
+    settings.LOGIN_ATTEMPTS_PER_USERNAME,
+    settings.LOGIN_THROTTLE_WINDOW_SECONDS
+)
+ip_throttle = LoginThrottle(
+    settings.LOGIN_ATTEMPTS_PER_IP,
+    settings.LOGIN_THROTTLE_WINDOW_SECONDS
+)
+
+def parse_networks(value: str) -> List[Network]:
+    """Comma-separated addresses and CIDR ranges; invalid entries are logged and skipped"""
+    networks = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid TRUSTED_PROXIES entry: {entry}")
+    return networks
+
+trusted_proxies = parse_networks(settings.TRUSTED_PROXIES)
+
+def _parse_address(value: str) -> Optional[Address]:
+    """An address from a forwarding header, without quotes, brackets or port"""
+    value = value.strip().strip('"')
+    if value.startswith("["):
+        value = value[1:].split("]", 1)[0]
+    elif value.count(":") == 1:
+        value = value.split(":", 1)[0]
+    try:
+        return ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+def _forwarded_chain(conn: HTTPConnection) -> List[str]:
+    """Client addresses added by proxies, nearest proxy last"""
+    forwarded_for = conn.headers.get("x-forwarded-for")
+    if forwarded_for:
+        return [hop for hop in forwarded_for.split(",") if hop.strip()]
+    chain = []
+    for element in conn.headers.get("forwarded", "").split(","):
+        for pair in element.split(";"):
+            name, _, value = pair.partition("=")
+            if name.strip().lower() == "for":
+                chain.append(value)
+    return chain
+
+def client_ip(conn: HTTPConnection, proxies: Optional[List[Network]] = None) -> str:
+    """
+    The client address to throttle on.
+
+    The peer address, unless the peer is a trusted proxy: then the
+    X-Forwarded-For (or Forwarded) chain is walked from the nearest hop and
+    the first address not in ``TRUSTED_PROXIES`` is the client. Hops added
+    by the client itself are never reached, so they can't be spoofed.
+    """
+    proxies = trusted_proxies if proxies is None else proxies
+    peer = conn.client.host if conn.client else "unknown"
+
+    def trusted(address: Optional[Address]) -> bool:
+        return address is not None and any(address in network for network in proxies)
+
+    if not proxies or not trusted(_parse_address(peer)):
+        return peer
+    client = peer
+    for hop in reversed(_forwarded_chain(conn)):
+        address = _parse_address(hop)
+        if address is None:
+            # Garbage in the chain; don't look past it
+            break
+        client = str(address)
+        if not trusted(address):
+            break
+    return client
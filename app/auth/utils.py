@@ -1,32 +1,32 @@
 # app/auth/utils.py
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jose import JWTError
 from datetime import datetime, timedelta
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from ..config import settings
 from ..database import get_db
 from ..models.user import User
-import os
-from dotenv import load_dotenv
+from .principal import Principal, principal_cache
+from .hashing import pwd_context, password_hasher, PasswordHasherBusy
+from .keys import key_ring
 import logging
 
 logger = logging.getLogger(__name__)
-load_dotenv()
 
 # Security configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="api/auth/token",
     auto_error=True
 )
 
-# JWT configuration
-SECRET_KEY = os.getenv("SECRET_KEY", os.urandom(32).hex())
-ALGORITHM = "HS256"
+# JWT configuration; signing keys are managed by the key ring
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Copy of the access token sent with page loads, for the page bootstrap
+PAGE_TOKEN_COOKIE = "page_token"
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -35,18 +35,44 @@ def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please try again",
+        headers={"Retry-After": "1"}
+    )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool; use this from async handlers."""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate a password hash in the hashing pool; use this from async handlers."""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token."""
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return key_ring.encode(to_encode)
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
-    """Get current user from JWT token."""
+) -> Principal:
+    """
+    Get the current user from the JWT token.
+
+    The user is looked up through the principal cache, so most requests do
+    not touch the database at all.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,18 +80,29 @@ async def get_current_user(
     )
     try:
         # Decode JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = key_ring.decode(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-            
+
+        principal = principal_cache.get(username)
+        if principal is not None:
+            return principal
+
         # Get user from database
-        user = db.query(User).filter(User.username == username).first()
+        user = db.query(User).options(
+            selectinload(User.roles),
+            selectinload(User.tasks)
+        ).filter(User.username == username).first()
         if user is None:
             raise credentials_exception
-            
-        return user
-        
+
+        principal = Principal.from_user(user)
+        principal_cache.put(username, principal)
+        return principal
+
+    except HTTPException:
+        raise
     except JWTError as e:
         logger.error(f"JWT error: {str(e)}")
         raise credentials_exception
@@ -74,8 +111,8 @@ async def get_current_user(
         raise credentials_exception
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """Get current active user."""
     if not current_user.is_active:
         raise HTTPException(
@@ -85,12 +122,38 @@ async def get_current_active_user(
     return current_user
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """Get current admin user."""
-    if not (current_user.is_superuser or any(role.name == "admin" for role in current_user.roles)):
+    if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def set_page_token(request: Request, response: Response, access_token: str) -> None:
+    """Give page loads the access token; scripts can't read it and other sites can't send it"""
+    if settings.PAGE_BOOTSTRAP:
+        response.set_cookie(
+            PAGE_TOKEN_COOKIE,
+            access_token,
+            max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            httponly=True,
+            samesite="strict",
+            secure=request.url.scheme == "https"
+        )
+
+def clear_page_token(response: Response) -> None:
+    response.delete_cookie(PAGE_TOKEN_COOKIE, httponly=True, samesite="strict")
+
+async def get_page_user(request: Request, db: Session) -> Optional[Principal]:
+    """The active user a page load's cookie belongs to, or None"""
+    token = request.cookies.get(PAGE_TOKEN_COOKIE)
+    if not token:
+        return None
+    try:
+        user = await get_current_user(token, db)
+    except HTTPException:
+        return None
+    return user if user.is_active else None
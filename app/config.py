@@ -6,6 +6,133 @@ class Settings(BaseSettings):
     LM_STUDIO_URL: str = "http://localhost:1234/v1"
     LM_STUDIO_KEY: str = "dummy-key"
 
+    # Model list cache: served as is for MODEL_CATALOG_TTL_SECONDS, then served
+    # stale for up to MODEL_CATALOG_STALE_SECONDS more while it is refreshed
+    MODEL_CATALOG_TTL_SECONDS: float = 60.0
+    MODEL_CATALOG_STALE_SECONDS: float = 600.0
+
+    # Connection pool for server databases (ignored for SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+
+    # Number of assembled conversation contexts kept in memory per worker
+    CONTEXT_CACHE_SIZE: int = 256
+
+    # Compression of long message bodies at rest (SQLite only): "", "zlib" or "zstd"
+    MESSAGE_COMPRESSION: str = ""
+    MESSAGE_COMPRESSION_THRESHOLD: int = 1024
+    # Dictionary used for new values; other *.dict files in its directory stay readable
+    MESSAGE_COMPRESSION_DICTIONARY: str = ""
+
+    # Retention job: minutes between runs (0 disables the schedule) and the
+    # default limits for users without a policy (0 = never)
+    RETENTION_INTERVAL_MINUTES: int = 0
+    RETENTION_ARCHIVE_AFTER_DAYS: int = 0
+    RETENTION_PURGE_AFTER_DAYS: int = 0
+    RETENTION_CHUNK_SIZE: int = 200
+    RETENTION_VACUUM_PAGES: int = 1000
+
+    # Authenticated users cached per worker; admin changes apply in other
+    # workers after at most the TTL (0 disables the cache)
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+
+    # bcrypt runs in a thread pool of this size (0 runs it on the event loop);
+    # operations beyond workers + queue are rejected with 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 32
+    # Processes hashing passwords for bulk user imports (0 = one per CPU)
+    PASSWORD_HASH_BULK_PROCESSES: int = 0
+
+    # Login attempts allowed per username and per client IP within the
+    # window (0 disables that limit)
+    LOGIN_ATTEMPTS_PER_USERNAME: int = 10
+    LOGIN_ATTEMPTS_PER_IP: int = 50
+    LOGIN_THROTTLE_WINDOW_SECONDS: float = 60.0
+    # Reverse proxies whose X-Forwarded-For / Forwarded headers name the client
+    # IP, as comma-separated addresses or CIDR ranges (empty: use the peer)
+    TRUSTED_PROXIES: str = ""
+
+    # Refresh tokens: each refresh extends the session by REFRESH_TOKEN_EXPIRE_DAYS,
+    # up to REFRESH_TOKEN_MAX_SESSION_DAYS after the login. A rotated token may be
+    # presented again within the grace period (parallel tabs) before reuse
+    # revokes the session.
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    REFRESH_TOKEN_MAX_SESSION_DAYS: int = 90
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 30
+
+    # Seconds the admin user list may show a cached total user count
+    USER_COUNT_CACHE_SECONDS: float = 60.0
+
+    # Bulk user imports: rows accepted per request and rows per commit
+    BULK_USER_MAX_ROWS: int = 5000
+    BULK_USER_CHUNK_SIZE: int = 200
+
+    # Usage accounting: events are buffered per worker and written every
+    # USAGE_FLUSH_SECONDS or USAGE_FLUSH_BATCH events; the rollup job runs every
+    # USAGE_ROLLUP_INTERVAL_MINUTES (0 disables it) and then deletes raw events
+    # older than USAGE_EVENT_RETENTION_DAYS (0 keeps them). On server databases
+    # it leaves events written in the last USAGE_ROLLUP_SETTLE_SECONDS for the
+    # next run, so ids committed out of order aren't skipped
+    USAGE_FLUSH_SECONDS: float = 2.0
+    USAGE_FLUSH_BATCH: int = 200
+    USAGE_BUFFER_SIZE: int = 10000
+    USAGE_ROLLUP_INTERVAL_MINUTES: int = 5
+    USAGE_EVENT_RETENTION_DAYS: int = 30
+    USAGE_ROLLUP_SETTLE_SECONDS: float = 10.0
+
+    # Default generation quotas for users without a quota policy (0 = unlimited).
+    # QUOTA_MAX_TOKENS caps max_tokens of each generation. Bucket state is kept
+    # per worker, or in QUOTA_STATE_FILE (SQLite) to share it between workers
+    # and keep it across restarts.
+    QUOTA_REQUESTS_PER_MINUTE: int = 0
+    QUOTA_TOKENS_PER_HOUR: int = 0
+    QUOTA_TOKENS_PER_DAY: int = 0
+    QUOTA_MAX_TOKENS: int = 2000
+    QUOTA_STATE_FILE: str = ""
+    QUOTA_POLICY_CACHE_SECONDS: float = 30.0
+
+    # Sync feed: entries returned per /api/sync call, days entries are kept
+    # (clients with older cursors reload everything) and, on server databases,
+    # how long new entries wait so ids committed out of order aren't skipped
+    SYNC_PAGE_SIZE: int = 500
+    SYNC_CHANGE_RETENTION_DAYS: int = 30
+    SYNC_SETTLE_SECONDS: float = 2.0
+
+    # Chat WebSocket (/api/chat/ws): seconds between server pings (clients
+    # silent for three are dropped), seconds to send the auth frame, frames
+    # queued per connection before streams wait for the client, and
+    # concurrent streams per connection
+    CHAT_SOCKET_HEARTBEAT_SECONDS: float = 20.0
+    CHAT_SOCKET_AUTH_SECONDS: float = 10.0
+    CHAT_SOCKET_SEND_QUEUE: int = 256
+    CHAT_SOCKET_MAX_STREAMS: int = 8
+
+    # Response compression (gzip, or brotli when installed): bodies of these
+    # content types from COMPRESSION_MINIMUM_SIZE bytes. text/event-stream is
+    # never compressed, so streamed tokens aren't held back
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_CONTENT_TYPES: str = "application/json,text/html,text/css,text/javascript,application/javascript,text/plain"
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Page bootstrap: login and token refresh also set an HttpOnly,
+    # SameSite=Strict cookie with the access token, and the chat page is
+    # served with the user's info, conversations and latest messages embedded
+    PAGE_BOOTSTRAP: bool = True
+
+    # Access token signing keys, shared by all workers and replicas:
+    # JWT_KEYS="kid:secret,..." (first signs), else the JSON key file (created
+    # on first start if neither it nor the legacy SECRET_KEY exists)
+    JWT_KEYS: str = ""
+    JWT_KEYS_FILE: str = "jwt_keys.json"
+    JWT_KEYS_RELOAD_SECONDS: float = 30.0
+    SECRET_KEY: str = ""
+
     class Config:
         env_file = ".env"
 
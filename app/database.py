@@ -1,17 +1,68 @@
 # app/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .services.compression import decompress_text
+
+def sync_database_url(url: str) -> str:
+    """Normalize DATABASE_URL for the synchronous engine."""
+    if url.startswith("postgres://"):
+        # Heroku-style scheme, which SQLAlchemy no longer accepts
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql+asyncpg://"):
+        url = "postgresql://" + url[len("postgresql+asyncpg://"):]
+    return url
+
+def async_database_url(url: str) -> str:
+    """Map DATABASE_URL to the matching async driver."""
+    url = sync_database_url(url)
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Connection pool settings for a database URL.
+
+    SQLite keeps SQLAlchemy's defaults. Server databases get a bounded,
+    pre-pinged pool and a per-connection statement timeout.
+    """
+    if url.startswith("sqlite"):
+        return {}
+
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+DATABASE_URL = sync_database_url(settings.DATABASE_URL)
+ASYNC_DATABASE_URL = async_database_url(settings.DATABASE_URL)
 
 # Create regular synchronous engine and session for normal operations
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create async engine and session for streaming operations
 async_engine = create_async_engine(
-    settings.DATABASE_URL.replace('sqlite:///', 'sqlite+aiosqlite:///')
+    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True)
 )
 async_session = sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False
@@ -19,6 +70,48 @@ async_session = sessionmaker(
 
 Base = declarative_base()
 
+@event.listens_for(Engine, "connect")
+def register_sql_functions(dbapi_connection, connection_record):
+    """Let SQLite read compressed message bodies (used by the search triggers)."""
+    create_function = getattr(dbapi_connection, "create_function", None)
+    if create_function is not None:
+        create_function("decompress_text", 1, decompress_text, deterministic=True)
+
+def add_missing_columns(bind=engine):
+    """
+    Add columns that exist on the models but not yet in the database.
+
+    ``create_all`` only creates missing tables, so columns introduced after a
+    database was first created are added here with ``ALTER TABLE``.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+def add_missing_indexes(bind=engine):
+    """Create indexes that exist on the models but not yet in the database."""
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind)
+
+def dialect_insert(db):
+    """INSERT supporting ON CONFLICT for the database in use (SQLite or PostgreSQL)"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert
+    return postgresql_insert
+
 # Database Dependency for regular operations
 def get_db():
     db = SessionLocal()
@@ -27,6 +120,12 @@ def get_db():
     finally:
         db.close()
 
+# Session factory dependency for work that outlives a request (the chat
+# socket, saving a streamed response): it opens a short-lived session per unit
+# of work instead
+def get_session_factory():
+    return SessionLocal
+
 # Async Database Dependency for streaming operations
 async def get_async_db():
     async with async_session() as session:
@@ -1,16 +1,28 @@
 # app/main.py
 from fastapi import FastAPI, Request, Depends, HTTPException, status
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from fastapi.exception_handlers import http_exception_handler as default_http_exception_handler
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
+from sqlalchemy.orm import Session
 from .config import settings
-from .api import chat_router
-from .api.auth import router as auth_router
-from .database import engine, Base
-from .auth.utils import get_current_user, get_current_admin_user
+from .api import chat_router, chat_socket_router
+from .api.auth import router as auth_router, user_info
+from .api.chat import chat_bootstrap
+from .database import engine, Base, get_db, add_missing_columns, add_missing_indexes
+from .auth.utils import get_current_user, get_current_admin_user, get_page_user
+from .auth.hashing import password_hasher
+from .auth.keys import key_ring
 from .models.user import User
+from .services.search import ensure_search_index
+from .services.retention import enable_incremental_vacuum, retention_scheduler
+from .services.usage import usage_recorder, usage_rollup_scheduler
+from .services.model_catalog import model_catalog
+from .services.static_assets import AssetFiles, asset_manifest
+from .services.response_compression import CompressionMiddleware
+from .services.fast_json import FastJSONResponse
+from .services.page_shells import PageShells
 import logging
 from .api.admin import router as admin_router
 from .api.settings import router as settings_router
@@ -18,7 +30,8 @@ from .api.settings import router as settings_router
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.APP_NAME)
+# orjson-backed JSON for every route; see services/fast_json.py
+app = FastAPI(title=settings.APP_NAME, default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -29,15 +42,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON and HTML; chat event streams pass through unbuffered
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    content_types=settings.COMPRESSION_CONTENT_TYPES.split(","),
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY
+)
+
 # Create database tables
+enable_incremental_vacuum(engine)
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
+add_missing_indexes(engine)
+ensure_search_index(engine)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Load (or create) the signing keys now rather than on the first request
+key_ring.current_key()
+
+# Mount static files; fingerprinted copies from build_assets.py are served precompressed
+app.mount("/static", AssetFiles(directory="app/static"), name="static")
 
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(chat_router, prefix="/api", dependencies=[Depends(get_current_user)])
+# Authenticates with its first frame; browsers cannot set headers on a WebSocket
+app.include_router(chat_socket_router, prefix="/api")
 app.include_router(
     admin_router,
     prefix="/api/admin",
@@ -51,51 +82,60 @@ app.include_router(
     dependencies=[Depends(get_current_user)]
 )
 
+@app.on_event("startup")
+async def start_background_jobs():
+    retention_scheduler.start()
+    usage_recorder.start()
+    usage_rollup_scheduler.start()
+    model_catalog.warm()
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await retention_scheduler.stop()
+    await usage_rollup_scheduler.stop()
+    await usage_recorder.stop()
+    await model_catalog.close()
+    password_hasher.shutdown()
+
 templates = Jinja2Templates(directory="app/templates")
+# {{ asset_url('js/chat.js') }} resolves to the fingerprinted copy when built
+templates.env.globals["asset_url"] = asset_manifest.url
+
+page_shells = PageShells(templates, {"app_name": settings.APP_NAME})
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Show login page"""
-    return templates.TemplateResponse(
-        "login.html",
-        {
-            "request": request,
-            "app_name": settings.APP_NAME
-        }
-    )
+    return page_shells.response(request, "login.html")
 
 @app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    """Show chat page or redirect to login if not authenticated"""
-    return templates.TemplateResponse(
-        "chat.html",
-        {
-            "request": request,
-            "app_name": settings.APP_NAME
-        }
-    )
+async def root(request: Request, db: Session = Depends(get_db)):
+    """
+    Show chat page. When the page cookie names a signed-in user, their info,
+    conversations and latest messages come embedded in it.
+    """
+    bootstrap = None
+    if settings.PAGE_BOOTSTRAP:
+        try:
+            user = await get_page_user(request, db)
+            info = user_info(db, user) if user is not None else None
+            if info is not None:
+                bootstrap = {"user": info, **chat_bootstrap(db, user)}
+        except Exception as e:
+            # The page still works without it, loading the same data itself
+            logger.error(f"Error building the chat page bootstrap: {str(e)}")
+            db.rollback()
+    return page_shells.response(request, "chat.html", bootstrap)
 
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_page(request: Request):
     """Show admin page"""
-    return templates.TemplateResponse(
-        "admin.html",
-        {
-            "request": request,
-            "app_name": settings.APP_NAME
-        }
-    )
+    return page_shells.response(request, "admin.html")
 
 @app.get("/settings", response_class=HTMLResponse)
-async def admin_page(request: Request):
-    """Show admin page"""
-    return templates.TemplateResponse(
-        "settings.html",
-        {
-            "request": request,
-            "app_name": settings.APP_NAME
-        }
-    )
+async def settings_page(request: Request):
+    """Show settings page"""
+    return page_shells.response(request, "settings.html")
 
 # Add error handler for authentication errors
 @app.exception_handler(HTTPException)
@@ -103,4 +143,6 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
     if exc.status_code == 401 and not request.url.path.startswith('/api/'):
         return RedirectResponse(url="/login", status_code=303)
-    raise exc
\ No newline at end of file
+    # Everything else gets FastAPI's JSON error, keeping the exception's headers
+    # (Retry-After, WWW-Authenticate); re-raising would turn it into a 500
+    return await default_http_exception_handler(request, exc)
\ No newline at end of file
@@ -1,6 +1,15 @@
 # app/models/__init__.py
 from .user import User, Role, Task, user_roles, user_tasks
 from .chat import Conversation, ChatMessage
+from .retention import RetentionPolicy, ArchivedConversation, RetentionState
+from .token import RefreshToken
+from .usage import UsageEvent, UsageRollup, UsageRollupState
+from .quota import QuotaPolicy
+from .sync import SyncChange
 
 # This ensures all models are imported when importing from models
-__all__ = ['User', 'Role', 'Task', 'Conversation', 'ChatMessage', 'user_roles', 'user_tasks']
\ No newline at end of file
+__all__ = [
+    'User', 'Role', 'Task', 'Conversation', 'ChatMessage', 'user_roles', 'user_tasks',
+    'RetentionPolicy', 'ArchivedConversation', 'RetentionState', 'RefreshToken',
+    'UsageEvent', 'UsageRollup', 'UsageRollupState', 'QuotaPolicy', 'SyncChange'
+]
\ No newline at end of file
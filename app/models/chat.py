@@ -1,8 +1,9 @@
 # app/models/chat.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..database import Base
+from .types import CompressedText
 
 class Conversation(Base):
     __tablename__ = "conversations"
@@ -12,18 +13,30 @@ class Conversation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Bumped on every change so per-worker context caches can detect stale entries
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
     user = relationship("User", back_populates="conversations")
 
+    __table_args__ = (
+        # Conversation list and retention both scan a user's conversations by activity
+        Index("ix_conversations_user_updated", "user_id", "updated_at"),
+    )
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    content = Column(Text, nullable=False)
-    response = Column(Text)
+    content = Column(CompressedText, nullable=False)
+    response = Column(CompressedText)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
     
-    conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # Pages of a conversation's history are read newest first
+        Index("ix_chat_messages_conversation_timestamp", "conversation_id", "timestamp"),
+    )
\ No newline at end of file
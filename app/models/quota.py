@@ -0,0 +1,30 @@
+# app/models/quota.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from ..database import Base
+import uuid
+
+class QuotaPolicy(Base):
+    """
+    Generation limits for one role or one user.
+
+    A user's own policy wins over role policies; with several roles the most
+    generous one applies. None means unlimited for any limit.
+    """
+    __tablename__ = "quota_policies"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    role_id = Column(String, ForeignKey("roles.id", ondelete="CASCADE"), unique=True, nullable=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=True)
+    requests_per_minute = Column(Integer, nullable=True)
+    # Completion tokens, refilled continuously over the hour or day
+    tokens_per_hour = Column(Integer, nullable=True)
+    tokens_per_day = Column(Integer, nullable=True)
+    # Upper bound for max_tokens of a single generation
+    max_tokens = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+    role = relationship("Role")
+    user = relationship("User")
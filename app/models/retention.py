@@ -0,0 +1,50 @@
+# app/models/retention.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from ..database import Base
+import uuid
+
+class RetentionPolicy(Base):
+    """
+    How long conversations are kept, for one role or one user.
+
+    A user's own policy wins over role policies; with several roles the most
+    generous one applies. None means "never" for either limit.
+    """
+    __tablename__ = "retention_policies"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    role_id = Column(String, ForeignKey("roles.id", ondelete="CASCADE"), unique=True, nullable=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=True)
+    # Days without activity before a conversation is moved to the archive
+    archive_after_days = Column(Integer, nullable=True)
+    # Days without activity before a conversation is deleted for good
+    purge_after_days = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+    role = relationship("Role")
+    user = relationship("User")
+
+class ArchivedConversation(Base):
+    """A conversation moved out of the live tables, messages stored compressed"""
+    __tablename__ = "archived_conversations"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    title = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), index=True)
+    version = Column(Integer, nullable=False, default=1)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    message_count = Column(Integer, nullable=False, default=0)
+    # zlib-compressed JSON list of {"content", "response", "timestamp"}
+    messages = Column(LargeBinary, nullable=False)
+
+class RetentionState(Base):
+    """Row the retention job locks so only one worker archives or purges at a time."""
+    __tablename__ = "retention_state"
+
+    name = Column(String, primary_key=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,29 @@
+# app/models/sync.py
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+class SyncChange(Base):
+    """
+    One entry of a user's change feed, appended in the transaction that made
+    the change.
+
+    Clients sync by asking for the entries after the last id they saw. No
+    foreign key to users: deleting a user leaves entries behind until the
+    retention job drops them with the other old entries.
+    """
+    __tablename__ = "sync_changes"
+    __table_args__ = (
+        Index("ix_sync_changes_user_id_seq", "user_id", "id"),
+        # Ids must never be reused, or clients holding a cursor would miss changes
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    # "conversation" or "message"
+    kind = Column(String(16), nullable=False)
+    object_id = Column(String, nullable=False)
+    # Tombstone: the object was deleted
+    deleted = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,27 @@
+# app/models/token.py
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+import uuid
+
+class RefreshToken(Base):
+    """
+    A refresh token, stored only as its SHA-256 hash.
+
+    Every refresh replaces the token with a new one in the same family. A
+    family is one login session; presenting a token that was already
+    replaced revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String, nullable=False, index=True)
+    # When the login that started this family happened (caps sliding renewal)
+    session_started_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Set when the token is rotated or revoked; a used token is never valid again
+    replaced_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,23 @@
+# app/models/types.py
+from sqlalchemy.types import TypeDecorator, Text
+from ..services.compression import get_compressor
+
+class CompressedText(TypeDecorator):
+    """
+    Text column whose long values are stored compressed on SQLite.
+
+    Values are compressed on write only when MESSAGE_COMPRESSION is set, but
+    compressed values are always decompressed on read, so compression can be
+    switched off without rewriting rows. Other databases store plain text
+    (PostgreSQL already compresses large values itself).
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        return get_compressor().compress(value)
+
+    def process_result_value(self, value, dialect):
+        return get_compressor().decompress(value)
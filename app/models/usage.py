@@ -0,0 +1,65 @@
+# app/models/usage.py
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from ..database import Base
+
+class UsageEvent(Base):
+    """
+    One generation, appended by the usage recorder and never updated.
+
+    No foreign key to users: accounting outlives deleted users, and rows are
+    written in batches away from the request that produced them.
+    """
+    __tablename__ = "usage_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False, index=True)
+    conversation_id = Column(String, nullable=True)
+    model = Column(String, nullable=False)
+    # ok, error or cancelled (client went away)
+    status = Column(String(16), nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    # Milliseconds to the first token (None if there was none) and in total
+    ttft_ms = Column(Integer, nullable=True)
+    duration_ms = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # When the row was inserted (created_at is when the generation ended);
+    # the rollup waits for recent ids to settle by this. Set by the app, as
+    # SQLite can't add a column with a CURRENT_TIMESTAMP default
+    written_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=True)
+
+class UsageRollup(Base):
+    """
+    Usage summed per user and model over one hour or one day.
+
+    Latencies are kept as histograms (JSON lists of counts over
+    ``usage.LATENCY_BUCKETS_MS``) so percentiles can be computed across any
+    set of rollups without the raw events.
+    """
+    __tablename__ = "usage_rollups"
+    __table_args__ = (
+        UniqueConstraint("period", "bucket_start", "user_id", "model", name="uq_usage_rollup"),
+        Index("ix_usage_rollups_period_bucket", "period", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period = Column(String(8), nullable=False)  # hour or day
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    user_id = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    duration_ms = Column(Integer, nullable=False, default=0)
+    ttft_histogram = Column(Text, nullable=False, default="[]")
+    duration_histogram = Column(Text, nullable=False, default="[]")
+
+class UsageRollupState(Base):
+    """Highest usage event id already added to the rollups."""
+    __tablename__ = "usage_rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
@@ -1,6 +1,6 @@
 # app/schemas/admin.py
 from pydantic import BaseModel, EmailStr, conint
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class RoleResponse(BaseModel):
@@ -71,4 +71,99 @@ class PaginatedResponse(BaseModel):
     total: int
     page: conint(ge=1)  # greater than or equal to 1
     page_size: conint(ge=1)
-    total_pages: int
\ No newline at end of file
+    total_pages: int
+    total_exact: bool = True  # False when a search matched more than could be counted
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
+    prev_cursor: Optional[str] = None
+
+class BulkUserRow(BaseModel):
+    action: Literal["create", "update", "deactivate"] = "create"
+    username: str  # Identifies the user for update and deactivate
+    email: Optional[EmailStr] = None
+    full_name: Optional[str] = None
+    password: Optional[str] = None
+    is_active: Optional[bool] = None
+    roles: Optional[List[str]] = None  # Role IDs or names
+    tasks: Optional[List[str]] = None  # Task IDs or names
+
+class BulkUserResult(BaseModel):
+    row: int  # 1-based position in the upload
+    username: Optional[str] = None
+    action: Optional[str] = None
+    status: str  # created, updated, deactivated or error
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkUserResponse(BaseModel):
+    created: int
+    updated: int
+    deactivated: int
+    failed: int
+    results: List[BulkUserResult]
+
+
+class RetentionPolicyUpdate(BaseModel):
+    role_id: Optional[str] = None  # Set exactly one of role_id and user_id
+    user_id: Optional[str] = None
+    archive_after_days: Optional[conint(ge=1)] = None  # None = never
+    purge_after_days: Optional[conint(ge=1)] = None
+
+class RetentionPolicyResponse(BaseModel):
+    id: str
+    role_id: Optional[str] = None
+    role_name: Optional[str] = None
+    user_id: Optional[str] = None
+    username: Optional[str] = None
+    archive_after_days: Optional[int] = None
+    purge_after_days: Optional[int] = None
+
+    @classmethod
+    def model_validate(cls, policy):
+        return cls(
+            id=policy.id,
+            role_id=policy.role_id,
+            role_name=policy.role.name if policy.role else None,
+            user_id=policy.user_id,
+            username=policy.user.username if policy.user else None,
+            archive_after_days=policy.archive_after_days,
+            purge_after_days=policy.purge_after_days
+        )
+
+    class Config:
+        from_attributes = True
+
+class QuotaPolicyUpdate(BaseModel):
+    role_id: Optional[str] = None  # Set exactly one of role_id and user_id
+    user_id: Optional[str] = None
+    requests_per_minute: Optional[conint(ge=1)] = None  # None = unlimited
+    tokens_per_hour: Optional[conint(ge=1)] = None
+    tokens_per_day: Optional[conint(ge=1)] = None
+    max_tokens: Optional[conint(ge=1)] = None
+
+class QuotaPolicyResponse(BaseModel):
+    id: str
+    role_id: Optional[str] = None
+    role_name: Optional[str] = None
+    user_id: Optional[str] = None
+    username: Optional[str] = None
+    requests_per_minute: Optional[int] = None
+    tokens_per_hour: Optional[int] = None
+    tokens_per_day: Optional[int] = None
+    max_tokens: Optional[int] = None
+
+    @classmethod
+    def model_validate(cls, policy):
+        return cls(
+            id=policy.id,
+            role_id=policy.role_id,
+            role_name=policy.role.name if policy.role else None,
+            user_id=policy.user_id,
+            username=policy.user.username if policy.user else None,
+            requests_per_minute=policy.requests_per_minute,
+            tokens_per_hour=policy.tokens_per_hour,
+            tokens_per_day=policy.tokens_per_day,
+            max_tokens=policy.max_tokens
+        )
+
+    class Config:
+        from_attributes = True
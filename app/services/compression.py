@@ -0,0 +1,293 @@
+# app/services/compression.py
+import os
+import glob
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Union
+from sqlalchemy import text
+from ..config import settings
+import logging
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Compressed values are stored as BLOBs starting with this header:
+#   b"CZ" + codec byte + dictionary id (uint32, 0 = no dictionary)
+MAGIC = b"CZ"
+HEADER = struct.Struct(">2scI")
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+CODECS = {"zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+class CompressionError(Exception):
+    """Raised when a stored value cannot be decompressed"""
+    pass
+
+def dictionary_id(dictionary: bytes) -> int:
+    """Stable id for a dictionary, stored in the header of every value using it."""
+    return zlib.crc32(dictionary) or 1
+
+class TextCompressor:
+    """
+    Compresses long text values and decompresses any stored value.
+
+    Values shorter than ``threshold`` bytes, or that do not shrink, are
+    returned unchanged as ``str``. Decompression works for every codec and
+    known dictionary regardless of which one is configured for writing.
+    """
+
+    def __init__(
+        self,
+        codec: Optional[str] = None,
+        threshold: int = 1024,
+        dictionary: Optional[bytes] = None,
+        known_dictionaries: Optional[Dict[int, bytes]] = None,
+        level: int = 6
+    ):
+        if codec and codec not in CODECS:
+            raise ValueError(f"Unknown compression codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.dictionary = dictionary
+        self.dictionary_id = dictionary_id(dictionary) if dictionary else 0
+        self.dictionaries = dict(known_dictionaries or {})
+        if dictionary:
+            self.dictionaries[self.dictionary_id] = dictionary
+        # zstd contexts must not be used by two threads at once, and the
+        # sync routes run in a thread pool: each thread gets its own
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.codec)
+
+    def compress(self, value: str) -> Union[str, bytes]:
+        """Return ``value`` compressed with a header, or unchanged if not worth it."""
+        if not self.enabled or value is None:
+            return value
+        raw = value.encode("utf-8")
+        if len(raw) < self.threshold:
+            return value
+        if self.codec == "zstd":
+            payload = self._zstd().compress(raw)
+        else:
+            if self.dictionary:
+                compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+            else:
+                compressor = zlib.compressobj(self.level)
+            payload = compressor.compress(raw) + compressor.flush()
+        stored = HEADER.pack(MAGIC, CODECS[self.codec], self.dictionary_id) + payload
+        return stored if len(stored) < len(raw) else value
+
+    def decompress(self, value: Union[str, bytes, None]) -> Optional[str]:
+        """Return the text of a stored value, compressed or not."""
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if len(value) < HEADER.size or value[:2] != MAGIC:
+            # A BLOB written by something other than this module
+            return value.decode("utf-8")
+        _, codec, dict_id = HEADER.unpack_from(value)
+        payload = value[HEADER.size:]
+        dictionary = None
+        if dict_id:
+            dictionary = self.dictionaries.get(dict_id)
+            if dictionary is None:
+                raise CompressionError(f"Compression dictionary {dict_id:08x} is not available")
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise CompressionError("Value is zstd-compressed but 'zstandard' is not installed")
+            return self._zstd_decompressor(dict_id, dictionary).decompress(payload).decode("utf-8")
+        if codec == CODEC_ZLIB:
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+        raise CompressionError(f"Unknown compression codec {codec!r}")
+
+    def _zstd(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+        return compressor
+
+    def _zstd_decompressor(self, dict_id: int, dictionary: Optional[bytes]):
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        if dict_id not in decompressors:
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return decompressors[dict_id]
+
+def load_dictionaries(path: str) -> Dict[int, bytes]:
+    """Load every ``*.dict`` file next to the configured dictionary, keyed by id."""
+    dictionaries = {}
+    directory = os.path.dirname(os.path.abspath(path))
+    for dict_path in glob.glob(os.path.join(directory, "*.dict")):
+        with open(dict_path, "rb") as f:
+            data = f.read()
+        dictionaries[dictionary_id(data)] = data
+    return dictionaries
+
+_compressor: Optional[TextCompressor] = None
+
+def get_compressor() -> TextCompressor:
+    """Return the process-wide compressor built from settings."""
+    global _compressor
+    if _compressor is None:
+        dictionary = None
+        known = {}
+        if settings.MESSAGE_COMPRESSION_DICTIONARY:
+            known = load_dictionaries(settings.MESSAGE_COMPRESSION_DICTIONARY)
+            if os.path.exists(settings.MESSAGE_COMPRESSION_DICTIONARY):
+                with open(settings.MESSAGE_COMPRESSION_DICTIONARY, "rb") as f:
+                    dictionary = f.read()
+        _compressor = TextCompressor(
+            codec=settings.MESSAGE_COMPRESSION or None,
+            threshold=settings.MESSAGE_COMPRESSION_THRESHOLD,
+            dictionary=dictionary,
+            known_dictionaries=known
+        )
+    return _compressor
+
+def set_compressor(compressor: Optional[TextCompressor]) -> None:
+    """Replace the process-wide compressor (None rebuilds it from settings)."""
+    global _compressor
+    _compressor = compressor
+
+def decompress_text(value):
+    """SQL function used by the search index to read compressed columns."""
+    return get_compressor().decompress(value)
+
+def train_dictionary(samples: List[bytes], codec: str = "zlib", size: int = 16 * 1024) -> bytes:
+    """
+    Build a compression dictionary from sample messages.
+
+    zstd uses its own trainer. zlib has no trainer, so its dictionary is the
+    most valuable repeated word sequences, with the most valuable last where
+    zlib's back-references are cheapest.
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd dictionaries require the 'zstandard' package")
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+    counts = Counter()
+    for sample in samples:
+        words = sample.split(b" ")
+        for n in (1, 2, 3):
+            for i in range(len(words) - n + 1):
+                counts[b" ".join(words[i:i + n]) + b" "] += 1
+
+    scored = sorted(
+        (count * len(chunk), chunk) for chunk, count in counts.items()
+        if count > 1 and len(chunk) > 3
+    )
+    chosen, used = [], 0
+    for _, chunk in reversed(scored):
+        if used + len(chunk) > size:
+            continue
+        chosen.append(chunk)
+        used += len(chunk)
+    return b"".join(reversed(chosen))
+
+def sample_messages(bind, limit: int = 2000, min_length: int = 256) -> List[bytes]:
+    """Take recent long messages and responses as dictionary training samples."""
+    compressor = get_compressor()
+    samples = []
+    with bind.connect() as conn:
+        rows = conn.execute(
+            text("SELECT content, response FROM chat_messages ORDER BY id DESC LIMIT :limit"),
+            {"limit": limit}
+        )
+        for content, response in rows:
+            for value in (content, response):
+                value = compressor.decompress(value)
+                if value and len(value) >= min_length:
+                    samples.append(value.encode("utf-8"))
+    return samples
+
+def compress_existing_messages(bind, batch_size: int = 1000, compressor: Optional[TextCompressor] = None) -> Dict:
+    """
+    Compress already stored messages in batches, one transaction per batch.
+
+    Walks chat_messages in id order so it can be stopped and re-run. Only
+    SQLite is rewritten; PostgreSQL already compresses large values (TOAST).
+
+    Returns row and byte counts plus the average time to decompress a value.
+    """
+    compressor = compressor or get_compressor()
+    stats = {
+        "rows_scanned": 0,
+        "values_compressed": 0,
+        "bytes_before": 0,
+        "bytes_after": 0,
+        "decompress_us_per_value": 0.0
+    }
+    if bind.dialect.name != "sqlite":
+        logger.info("Skipping backfill: this database compresses large values itself")
+        return stats
+    if not compressor.enabled:
+        raise ValueError("Set MESSAGE_COMPRESSION before compressing existing messages")
+
+    decompress_seconds = 0.0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, content, response FROM chat_messages "
+                    "WHERE id > :last_id ORDER BY id LIMIT :batch_size"
+                ),
+                {"last_id": last_id, "batch_size": batch_size}
+            ).all()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                changed = {}
+                for column in ("content", "response"):
+                    stored = getattr(row, column)
+                    if stored is None:
+                        continue
+                    value = compressor.decompress(stored)
+                    new = compressor.compress(value) if isinstance(stored, str) else stored
+                    after = len(new.encode("utf-8")) if isinstance(new, str) else len(new)
+                    stats["bytes_before"] += len(value.encode("utf-8"))
+                    stats["bytes_after"] += after
+                    if isinstance(new, bytes) and isinstance(stored, str):
+                        changed[column] = new
+                        stats["values_compressed"] += 1
+                        started = time.perf_counter()
+                        compressor.decompress(new)
+                        decompress_seconds += time.perf_counter() - started
+                if changed:
+                    updates.append({
+                        "id": row.id,
+                        "content": changed.get("content", row.content),
+                        "response": changed.get("response", row.response)
+                    })
+
+            if updates:
+                conn.execute(
+                    text("UPDATE chat_messages SET content = :content, response = :response WHERE id = :id"),
+                    updates
+                )
+            stats["rows_scanned"] += len(rows)
+            last_id = rows[-1].id
+        logger.info(f"Compressed messages up to id {last_id} ({stats['values_compressed']} values so far)")
+
+    if stats["values_compressed"]:
+        stats["decompress_us_per_value"] = decompress_seconds / stats["values_compressed"] * 1e6
+    return stats
@@ -0,0 +1,147 @@
+# app/services/context_cache.py
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+from ..config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ConversationContext:
+    """
+    Assembled history of a single conversation.
+
+    Attributes:
+        version: Conversation.version the history was built from
+        messages: History entries as ``{"id", "content", "response"}`` dicts
+        char_count: Total characters of all contents and responses
+    """
+    __slots__ = ("version", "messages", "char_count")
+
+    def __init__(self, version: int, messages: List[dict]):
+        self.version = version
+        self.messages = messages
+        self.char_count = sum(self._entry_chars(msg) for msg in messages)
+
+    @staticmethod
+    def _entry_chars(entry: dict) -> int:
+        return len(entry.get("content") or "") + len(entry.get("response") or "")
+
+    @property
+    def estimated_tokens(self) -> int:
+        """Rough token estimate using the same ~4 chars per token rule as LLMService."""
+        return self.char_count // 4
+
+class ConversationContextCache:
+    """
+    Bounded LRU cache of conversation contexts keyed by conversation id.
+
+    Entries are tagged with the ``Conversation.version`` they were built from.
+    A lookup with a different version is a miss, so changes made by another
+    worker (which always bump the version) are picked up on the next turn.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: str, version: int) -> Optional[ConversationContext]:
+        """Return the cached context if it matches ``version``, otherwise None."""
+        with self._lock:
+            context = self._entries.get(conversation_id)
+            if context is None or context.version != version:
+                if context is not None:
+                    del self._entries[conversation_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            return context
+
+    def put(self, conversation_id: str, version: int, messages: List[dict]) -> ConversationContext:
+        """Store a freshly loaded history, evicting the least recently used entry."""
+        context = ConversationContext(version, messages)
+        with self._lock:
+            self._entries[conversation_id] = context
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return context
+
+    def append_message(
+        self,
+        conversation_id: str,
+        message: dict,
+        expected_version: int,
+        new_version: int
+    ) -> None:
+        """
+        Append a new exchange to a cached context.
+
+        The entry is dropped instead if it was not built from ``expected_version``,
+        since something else changed the conversation in between.
+        """
+        with self._lock:
+            context = self._entries.get(conversation_id)
+            if context is None:
+                return
+            if context.version != expected_version:
+                del self._entries[conversation_id]
+                return
+            context.messages.append(message)
+            context.char_count += ConversationContext._entry_chars(message)
+            context.version = new_version
+
+    def update_response(
+        self,
+        conversation_id: str,
+        message_id: int,
+        response: str,
+        expected_version: int,
+        new_version: int
+    ) -> None:
+        """Fill in the response of a cached message once generation has finished."""
+        with self._lock:
+            context = self._entries.get(conversation_id)
+            if context is None:
+                return
+            entry = next(
+                (msg for msg in reversed(context.messages) if msg.get("id") == message_id),
+                None
+            )
+            if context.version != expected_version or entry is None:
+                del self._entries[conversation_id]
+                return
+            context.char_count += len(response or "") - len(entry.get("response") or "")
+            entry["response"] = response
+            context.version = new_version
+
+    def invalidate(self, conversation_id: str) -> None:
+        """Drop a conversation from the cache."""
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit rate figures for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0
+            }
+
+# Shared per-process cache used by the chat API
+context_cache = ConversationContextCache(max_entries=settings.CONTEXT_CACHE_SIZE)
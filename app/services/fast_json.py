@@ -0,0 +1,53 @@
+# app/services/fast_json.py
+import datetime
+import decimal
+import enum
+import json
+import uuid
+from typing import Any
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is used instead
+    orjson = None
+
+def _default(value: Any) -> Any:
+    """Types neither encoder handles natively (the stdlib one: datetimes and UUIDs too)"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> bytes:
+    """
+    Compact UTF-8 JSON. Datetimes become ISO 8601 strings, exactly as
+    ``.isoformat()`` writes them, so handlers can return them as they are.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_str(value: Any) -> str:
+    """``dumps`` as text, for SSE and WebSocket frames"""
+    return dumps(value).decode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    The app's default response class: rendered with orjson when installed.
+
+    Returned directly from a handler it also skips FastAPI's
+    ``jsonable_encoder`` pass over the content, which walks every value in
+    Python; hot routes build their content from plain dicts, lists,
+    strings, numbers and datetimes and return this.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,66 @@
+# app/services/http_cache.py
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, List, Optional
+
+def make_etag(data: Any) -> str:
+    """Strong ETag for a JSON-serialisable value (the same value always gets the same tag)."""
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers ``etag`` (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == bare for tag in tags)
+
+def http_date(value: datetime) -> str:
+    """An HTTP date (Last-Modified); naive datetimes are taken as UTC, as stored."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def revalidate_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """
+    Headers for per-user data that clients may keep but must revalidate.
+
+    Revalidation goes by the ETag; Last-Modified only has one-second
+    resolution, too coarse to tell apart changes within the same second.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def accepted_encodings(accept_encoding: Optional[str], available: List[str]) -> List[str]:
+    """
+    The ``available`` content codings an Accept-Encoding header allows,
+    most preferred by the client first (ties keep the order of ``available``).
+    ``identity`` is never listed; it is always acceptable as a fallback.
+    """
+    weights: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    accepted = [
+        (weights.get(coding, weights.get("*", 0.0)), -index, coding)
+        for index, coding in enumerate(available)
+    ]
+    return [coding for weight, _, coding in sorted(accepted, reverse=True) if weight > 0]
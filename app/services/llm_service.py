@@ -3,16 +3,27 @@ import aiohttp
 import asyncio
 from typing import AsyncGenerator, Optional, List, Dict
 from ..config import settings
+from .model_catalog import model_catalog
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Instruction sent ahead of every conversation
+SYSTEM_PROMPT = "You are a helpful assistant. Please respond based on the entire conversation context."
+
+# Model name LM Studio maps to whichever model is loaded
+DEFAULT_MODEL = "local-model"
+
 class LMStudioConnectionError(Exception):
     """Raised when connection to LM Studio fails"""
     pass
 
+class ModelNotAvailable(ValueError):
+    """Raised when a requested model isn't in the model catalog"""
+    pass
+
 class LLMService:
-    def __init__(self):
+    def __init__(self, model: Optional[str] = None):
         self.base_url = settings.LM_STUDIO_URL
         self.api_key = settings.LM_STUDIO_KEY
         self.headers = {
@@ -21,6 +32,7 @@ class LLMService:
         }
         self.max_retries = 3
         self.retry_delay = 2  # seconds
+        self.model = self.validate_model(model) if model else DEFAULT_MODEL
         
         # LM Studio context parameters
         self.default_params = {
@@ -35,6 +47,18 @@ class LLMService:
             "presence_penalty": 0.0      # Penalty for token presence
         }
 
+    @staticmethod
+    def validate_model(model: str) -> str:
+        """
+        Check a requested model against the cached model catalog.
+
+        No request is made: before the catalog has been loaded any model is
+        accepted and LM Studio has the final word.
+        """
+        if model != DEFAULT_MODEL and model_catalog.loaded and model_catalog.peek(model) is None:
+            raise ModelNotAvailable(f"Model {model} is not available")
+        return model
+
     async def check_server_status(self) -> bool:
         """Check if LM Studio server is available"""
         try:
@@ -56,7 +80,7 @@ class LLMService:
         # Add system message to establish context
         messages.append({
             "role": "user",
-            "content": "You are a helpful assistant. Please respond based on the entire conversation context."
+            "content": SYSTEM_PROMPT
         })
         
         # Add conversation history
@@ -120,11 +144,16 @@ class LLMService:
         self, 
         prompt: str, 
         conversation_history: Optional[List[dict]] = None,
-        params: Optional[Dict] = None
+        params: Optional[Dict] = None,
+        usage: Optional[Dict] = None
     ) -> AsyncGenerator[str, None]:
         """
         Generates streaming response from LM Studio with conversation history context
         and configurable parameters.
+
+        If ``usage`` is given it is filled with ``prompt_tokens`` and
+        ``completion_tokens`` (from the server when it reports them, estimated
+        otherwise) and ``error`` when all attempts failed.
         """
         messages = self.format_messages(conversation_history or [], prompt)
         
@@ -133,6 +162,13 @@ class LLMService:
         if params:
             generation_params.update(params)
 
+        # Never assume more context than the model supports
+        catalog_entry = model_catalog.peek(self.model)
+        if catalog_entry and catalog_entry.get("context_length"):
+            generation_params["context_length"] = min(
+                generation_params["context_length"], catalog_entry["context_length"]
+            )
+
         # Adjust context if needed
         messages = self.adjust_context_for_length(
             messages, 
@@ -141,6 +177,8 @@ class LLMService:
         
         estimated_tokens = self.estimate_token_length(messages)
         logger.debug(f"Estimated context length: {estimated_tokens} tokens")
+        if usage is not None:
+            usage.update({"prompt_tokens": estimated_tokens, "completion_tokens": 0})
         
         for attempt in range(self.max_retries):
             try:
@@ -153,7 +191,7 @@ class LLMService:
                         headers=self.headers,
                         json={
                             "messages": messages,
-                            "model": "local-model",
+                            "model": self.model,
                             "stream": True,
                             **generation_params
                         },
@@ -172,7 +210,14 @@ class LLMService:
                                         break
                                     try:
                                         data = json.loads(text)
-                                        if content := data.get('choices', [{}])[0].get('delta', {}).get('content'):
+                                        if usage is not None and data.get('usage'):
+                                            usage["prompt_tokens"] = data['usage'].get('prompt_tokens', usage["prompt_tokens"])
+                                            usage["completion_tokens"] = data['usage'].get('completion_tokens', usage["completion_tokens"])
+                                            usage["reported"] = True
+                                        if content := (data.get('choices') or [{}])[0].get('delta', {}).get('content'):
+                                            if usage is not None and not usage.get("reported"):
+                                                # One streamed chunk is usually one token
+                                                usage["completion_tokens"] += 1
                                             yield content
                                     except json.JSONDecodeError:
                                         continue
@@ -183,5 +228,7 @@ class LLMService:
                 if attempt < self.max_retries - 1:
                     await asyncio.sleep(self.retry_delay * (attempt + 1))  # Exponential backoff
                 else:
+                    if usage is not None:
+                        usage["error"] = str(e)
                     yield f"\n\nError: Unable to connect to LM Studio after {self.max_retries} attempts. Please ensure the server is running and try again."
                     return
\ No newline at end of file
@@ -0,0 +1,192 @@
+# app/services/model_catalog.py
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+import aiohttp
+from ..config import settings
+from .http_cache import make_etag
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ModelCatalogUnavailable(Exception):
+    """Raised when the model list can't be loaded and nothing is cached."""
+    pass
+
+def _metadata_url(base_url: str) -> str:
+    """LM Studio's native /api/v0/models, which adds context length and load state."""
+    parts = urlsplit(base_url)
+    return urlunsplit((parts.scheme, parts.netloc, "/api/v0/models", "", ""))
+
+def normalize_models(listing: dict, metadata: Optional[Dict[str, dict]] = None) -> List[dict]:
+    """
+    Turn an OpenAI-style ``/models`` listing into the catalog format.
+
+    Capability fields are None when the backend doesn't report them.
+    """
+    metadata = metadata or {}
+    models = []
+    for entry in listing.get("data", []):
+        model_id = entry.get("id")
+        if not model_id:
+            continue
+        meta = metadata.get(model_id, {})
+        models.append({
+            "id": model_id,
+            "name": model_id,
+            "owned_by": entry.get("owned_by"),
+            "type": meta.get("type"),
+            "architecture": meta.get("arch"),
+            "quantization": meta.get("quantization"),
+            "context_length": meta.get("max_context_length"),
+            "loaded": meta["state"] == "loaded" if "state" in meta else None
+        })
+    models.sort(key=lambda model: model["id"])
+    return models
+
+class ModelCatalog:
+    """
+    The backend's model list, cached with a TTL and stale-while-revalidate.
+
+    Within ``ttl_seconds`` of a fetch the cached list is served as is. For
+    ``stale_seconds`` after that it is still served, while one background
+    fetch refreshes it. Later, callers wait for a fetch. If a fetch fails,
+    whatever is cached keeps being served (stale-if-error), so a backend
+    hiccup doesn't empty the settings page. Concurrent misses share a single
+    fetch, and one HTTP session is reused for all of them.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        ttl_seconds: float = 60.0,
+        stale_seconds: float = 600.0,
+        timeout_seconds: float = 5.0,
+        loader: Optional[Callable[[], Awaitable[List[dict]]]] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.timeout_seconds = timeout_seconds
+        self.loader = loader or self._fetch
+        self._models: Optional[List[dict]] = None
+        self._by_id: Dict[str, dict] = {}
+        self._etag: Optional[str] = None
+        self._fetched_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.fetches = 0
+        self.failures = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def _fetch(self) -> List[dict]:
+        session = self._get_session()
+        async with session.get(f"{self.base_url}/models") as response:
+            if response.status != 200:
+                raise ModelCatalogUnavailable(f"LM Studio returned status {response.status}")
+            listing = await response.json()
+
+        metadata = {}
+        try:
+            async with session.get(_metadata_url(self.base_url)) as response:
+                if response.status == 200:
+                    metadata = {entry["id"]: entry for entry in (await response.json()).get("data", [])}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            # Older LM Studio versions and other OpenAI-compatible servers lack this endpoint
+            logger.debug(f"No model metadata available: {str(e)}")
+        return normalize_models(listing, metadata)
+
+    async def _refresh(self) -> None:
+        self.fetches += 1
+        try:
+            models = await self.loader()
+        except Exception as e:
+            self.failures += 1
+            raise ModelCatalogUnavailable(f"Could not load models: {str(e)}") from e
+        self._models = models
+        self._by_id = {model["id"]: model for model in models}
+        self._etag = make_etag(models)
+        self._fetched_at = time.monotonic()
+
+    def _start_refresh(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        if self._inflight is None or self._inflight.done() or self._inflight.get_loop() is not loop:
+            self._inflight = loop.create_task(self._refresh())
+            self._inflight.add_done_callback(self._log_refresh_error)
+        return self._inflight
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(str(task.exception()))
+
+    async def get(self) -> Tuple[List[dict], str]:
+        """The model list and its ETag."""
+        age = time.monotonic() - self._fetched_at
+        if self._models is not None and age < self.ttl_seconds:
+            return self._models, self._etag
+        if self._models is not None and age < self.ttl_seconds + self.stale_seconds:
+            self._start_refresh()
+            return self._models, self._etag
+        try:
+            await asyncio.shield(self._start_refresh())
+        except ModelCatalogUnavailable:
+            if self._models is None:
+                raise
+            logger.warning("Serving the cached model list; LM Studio is unavailable")
+        return self._models, self._etag
+
+    def warm(self) -> None:
+        """Start loading the catalog in the background (at startup)."""
+        if self._models is None:
+            self._start_refresh()
+
+    def peek(self, model_id: str) -> Optional[dict]:
+        """Cached entry for a model, without any network access."""
+        return self._by_id.get(model_id)
+
+    @property
+    def loaded(self) -> bool:
+        return self._models is not None
+
+    def clear(self) -> None:
+        self._models = None
+        self._by_id = {}
+        self._etag = None
+        self._fetched_at = 0.0
+        self._inflight = None
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    def stats(self) -> Dict:
+        return {
+            "models": len(self._models) if self._models is not None else None,
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._models is not None else None,
+            "fetches": self.fetches,
+            "failures": self.failures
+        }
+
+# Shared per-process catalog
+model_catalog = ModelCatalog(
+    settings.LM_STUDIO_URL,
+    settings.LM_STUDIO_KEY,
+    ttl_seconds=settings.MODEL_CATALOG_TTL_SECONDS,
+    stale_seconds=settings.MODEL_CATALOG_STALE_SECONDS
+)
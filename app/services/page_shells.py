@@ -0,0 +1,77 @@
+# app/services/page_shells.py
+import hashlib
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+from starlette.responses import HTMLResponse, Response
+from .fast_json import dumps
+from .http_cache import etag_matches
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Inserted before </body>; chat.js reads and removes it
+BOOTSTRAP_ELEMENT_ID = "bootstrap-data"
+
+# Characters that could end the script element or break the JavaScript parser
+_SCRIPT_ESCAPES = {
+    b"<": b"\\u003c",
+    b">": b"\\u003e",
+    b"&": b"\\u0026",
+    "\u2028".encode(): b"\\u2028",
+    "\u2029".encode(): b"\\u2029"
+}
+
+def embed_json(data: Any) -> bytes:
+    """A JSON script element that is safe to place in HTML"""
+    payload = dumps(data)
+    for raw, escaped in _SCRIPT_ESCAPES.items():
+        payload = payload.replace(raw, escaped)
+    return (
+        f'<script id="{BOOTSTRAP_ELEMENT_ID}" type="application/json">'.encode()
+        + payload
+        + b"</script>"
+    )
+
+class PageShells:
+    """
+    Rendered page templates, kept in memory.
+
+    The pages depend only on ``context`` (the app name) and the asset
+    manifest, both fixed for the life of the process, so each template is
+    rendered once. Responses carry an ETag and are revalidated, so an
+    unchanged page costs a 304. A per-user bootstrap payload can be spliced
+    into a cached shell; such pages are never stored by caches.
+    """
+
+    def __init__(self, templates: Jinja2Templates, context: Dict[str, Any]):
+        self.templates = templates
+        self.context = context
+        self._pages: Dict[str, Tuple[bytes, str]] = {}
+        self._lock = Lock()
+
+    def get(self, name: str) -> Tuple[bytes, str]:
+        """The rendered template and its ETag"""
+        page = self._pages.get(name)
+        if page is None:
+            body = self.templates.get_template(name).render(**self.context).encode("utf-8")
+            page = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+            with self._lock:
+                self._pages[name] = page
+        return page
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+
+    def response(self, request: Request, name: str, bootstrap: Optional[Dict[str, Any]] = None) -> Response:
+        body, etag = self.get(name)
+        if bootstrap is not None:
+            body = body.replace(b"</body>", embed_json(bootstrap) + b"</body>", 1)
+            return HTMLResponse(body, headers={"Cache-Control": "private, no-store"})
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(body, headers=headers)
@@ -0,0 +1,314 @@
+# app/services/quota.py
+import math
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from ..config import settings
+from ..models.quota import QuotaPolicy
+from ..models.user import user_roles
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIMIT_FIELDS = ("requests_per_minute", "tokens_per_hour", "tokens_per_day", "max_tokens")
+
+# Bucket name, the limit that sets its capacity, and the seconds to refill it
+BUCKETS = (
+    ("requests", "requests_per_minute", 60.0),
+    ("tokens_hour", "tokens_per_hour", 3600.0),
+    ("tokens_day", "tokens_per_day", 86400.0),
+)
+
+class QuotaExceeded(Exception):
+    """Raised when a user has to wait before the next generation."""
+
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(f"Quota exceeded: {limit}")
+        self.limit = limit
+        self.retry_after = retry_after
+
+class QuotaLimits:
+    """Resolved limits for one user; None means unlimited."""
+    __slots__ = LIMIT_FIELDS
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_hour: Optional[int] = None,
+        tokens_per_day: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_hour = tokens_per_hour
+        self.tokens_per_day = tokens_per_day
+        self.max_tokens = max_tokens
+
+    def as_dict(self) -> Dict[str, Optional[int]]:
+        return {field: getattr(self, field) for field in LIMIT_FIELDS}
+
+def default_limits() -> QuotaLimits:
+    return QuotaLimits(
+        settings.QUOTA_REQUESTS_PER_MINUTE or None,
+        settings.QUOTA_TOKENS_PER_HOUR or None,
+        settings.QUOTA_TOKENS_PER_DAY or None,
+        settings.QUOTA_MAX_TOKENS or None
+    )
+
+def _most_generous(values: List[Optional[int]]) -> Optional[int]:
+    """Largest of several limits, where None (unlimited) beats any number."""
+    if not values or any(value is None for value in values):
+        return None
+    return max(values)
+
+def resolve_limits(db: Session, user_id: str) -> QuotaLimits:
+    """
+    The limits that apply to a user, in one query.
+
+    The user's own policy wins. Otherwise each limit is the most generous
+    across the user's role policies, and users without any get the QUOTA_*
+    settings.
+    """
+    role_ids = select(user_roles.c.role_id).where(user_roles.c.user_id == user_id)
+    policies = db.query(QuotaPolicy)\
+        .filter(or_(QuotaPolicy.user_id == user_id, QuotaPolicy.role_id.in_(role_ids)))\
+        .all()
+    own = [policy for policy in policies if policy.user_id == user_id]
+    if own:
+        return QuotaLimits(*(getattr(own[0], field) for field in LIMIT_FIELDS))
+    if policies:
+        return QuotaLimits(*(
+            _most_generous([getattr(policy, field) for policy in policies])
+            for field in LIMIT_FIELDS
+        ))
+    return default_limits()
+
+def _refill(state: Optional[Tuple[float, float]], capacity: float, period: float, now: float) -> float:
+    """Tokens in a bucket at ``now``; a bucket seen for the first time is full."""
+    if state is None:
+        return capacity
+    tokens, updated_at = state
+    return min(capacity, tokens + max(now - updated_at, 0.0) * capacity / period)
+
+class MemoryBucketStore:
+    """Token bucket state for this worker only."""
+
+    # Updates never wait on anything, so they can run on the event loop
+    blocking = False
+
+    def __init__(self):
+        self._state: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        self._lock = Lock()
+
+    def update(self, user_id: str, apply):
+        """
+        Run ``apply(state)`` on a user's buckets atomically.
+
+        ``state`` maps bucket names to ``(tokens, updated_at)``; ``apply``
+        returns its result and the buckets to store.
+        """
+        with self._lock:
+            result, new_state = apply(self._state.get(user_id, {}))
+            if new_state:
+                self._state.setdefault(user_id, {}).update(new_state)
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._state.clear()
+
+class SQLiteBucketStore:
+    """
+    Token bucket state in a SQLite file.
+
+    Every worker on the host opens the same file, so limits are shared
+    between workers and survive restarts. Each check is one short
+    ``BEGIN IMMEDIATE`` transaction, small next to a generation, but one
+    that may wait on another worker's lock, so the manager runs it in the
+    thread pool.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quota_buckets ("
+                "user_id TEXT NOT NULL, name TEXT NOT NULL, tokens REAL NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (user_id, name))"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def update(self, user_id: str, apply):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = {
+                name: (tokens, updated_at)
+                for name, tokens, updated_at in conn.execute(
+                    "SELECT name, tokens, updated_at FROM quota_buckets WHERE user_id = ?", (user_id,)
+                )
+            }
+            result, new_state = apply(state)
+            if new_state:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO quota_buckets (user_id, name, tokens, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(user_id, name, tokens, updated_at) for name, (tokens, updated_at) in new_state.items()]
+                )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM quota_buckets")
+        finally:
+            conn.close()
+
+class QuotaManager:
+    """
+    Per-user token buckets checked before every generation.
+
+    ``limits_for`` resolves a user's limits, cached per user for
+    ``cache_seconds``. ``acquire`` takes one request from the per-minute
+    bucket and requires completion tokens left in the hourly and daily
+    buckets. It returns the ``max_tokens`` to generate with, lowered to what
+    the token buckets still hold. ``consume`` debits the tokens a generation
+    actually produced; a long answer may take a bucket below zero, which
+    makes the next request wait longer.
+    """
+
+    def __init__(self, store, cache_seconds: float = 30.0):
+        self.store = store
+        self.cache_seconds = cache_seconds
+        self._limits: Dict[str, Tuple[float, QuotaLimits]] = {}
+        self._lock = Lock()
+        self.rejected = 0
+
+    def limits_for(self, db: Session, user_id: str) -> QuotaLimits:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._limits.get(user_id)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+        limits = resolve_limits(db, user_id)
+        with self._lock:
+            self._limits[user_id] = (now + self.cache_seconds, limits)
+        return limits
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Forget cached limits of one user, or of everyone after a role policy change."""
+        with self._lock:
+            if user_id is None:
+                self._limits.clear()
+            else:
+                self._limits.pop(user_id, None)
+
+    def acquire(self, user_id: str, limits: QuotaLimits, now: Optional[float] = None) -> Optional[int]:
+        """Admit one generation or raise QuotaExceeded; returns the max_tokens cap (None = no cap)."""
+        active = [
+            (name, float(getattr(limits, field)), period)
+            for name, field, period in BUCKETS
+            if getattr(limits, field) is not None
+        ]
+        if not active:
+            return limits.max_tokens
+        now = now if now is not None else time.time()
+
+        def apply(state):
+            levels = {name: _refill(state.get(name), capacity, period, now) for name, capacity, period in active}
+            waits = [
+                # Seconds until the bucket holds one whole unit again
+                (name, (1.0 - levels[name]) * period / capacity)
+                for name, capacity, period in active
+                if levels[name] < 1.0
+            ]
+            if waits:
+                return ("exceeded", max(waits, key=lambda wait: wait[1])), {}
+            if "requests" in levels:
+                levels["requests"] -= 1.0
+            return ("ok", levels), {name: (level, now) for name, level in levels.items()}
+
+        outcome, detail = self.store.update(user_id, apply)
+        if outcome == "exceeded":
+            self.rejected += 1
+            raise QuotaExceeded(*detail)
+
+        caps = [int(detail[name]) for name in ("tokens_hour", "tokens_day") if name in detail]
+        if limits.max_tokens is not None:
+            caps.append(limits.max_tokens)
+        return min(caps) if caps else None
+
+    def consume(self, user_id: str, limits: QuotaLimits, completion_tokens: int, now: Optional[float] = None) -> None:
+        """Debit generated tokens from the hourly and daily buckets."""
+        if completion_tokens <= 0:
+            return
+        active = [
+            (name, float(getattr(limits, field)), period)
+            for name, field, period in BUCKETS[1:]
+            if getattr(limits, field) is not None
+        ]
+        if not active:
+            return
+        now = now if now is not None else time.time()
+
+        def apply(state):
+            return None, {
+                # Never owe more than one full bucket
+                name: (max(_refill(state.get(name), capacity, period, now) - completion_tokens, -capacity), now)
+                for name, capacity, period in active
+            }
+
+        self.store.update(user_id, apply)
+
+    async def acquire_async(self, user_id: str, limits: QuotaLimits) -> Optional[int]:
+        """``acquire`` for async handlers; a store that may block runs in the thread pool"""
+        if self.store.blocking:
+            return await run_in_threadpool(self.acquire, user_id, limits)
+        return self.acquire(user_id, limits)
+
+    async def consume_async(self, user_id: str, limits: QuotaLimits, completion_tokens: int) -> None:
+        """``consume`` for async handlers; a store that may block runs in the thread pool"""
+        if self.store.blocking:
+            await run_in_threadpool(self.consume, user_id, limits, completion_tokens)
+        else:
+            self.consume(user_id, limits, completion_tokens)
+
+    def clear(self) -> None:
+        self.invalidate()
+        self.store.clear()
+
+def create_quota_manager() -> QuotaManager:
+    if settings.QUOTA_STATE_FILE:
+        directory = os.path.dirname(os.path.abspath(settings.QUOTA_STATE_FILE))
+        os.makedirs(directory, exist_ok=True)
+        store = SQLiteBucketStore(settings.QUOTA_STATE_FILE)
+    else:
+        store = MemoryBucketStore()
+    return QuotaManager(store, cache_seconds=settings.QUOTA_POLICY_CACHE_SECONDS)
+
+# Shared per-process manager; the SQLite store shares state between processes
+quota_manager = create_quota_manager()
+
+def retry_after_header(retry_after: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
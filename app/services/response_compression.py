@@ -0,0 +1,136 @@
+# app/services/response_compression.py
+import zlib
+from typing import Callable, Iterable, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .http_cache import accepted_encodings
+import logging
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Never compressed: gzip and brotli hold data back until enough has
+# accumulated, which would delay every streamed event
+EVENT_STREAM = "text/event-stream"
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with brotli or gzip, whichever the client
+    prefers (brotli only when the brotli package is installed).
+
+    Only bodies of an allowed content type are compressed, and complete
+    bodies only from ``minimum_size`` bytes. ``text/event-stream`` always
+    passes through untouched, so each event reaches the client as soon as
+    it is sent. Responses that are already encoded (precompressed static
+    files) or marked ``no-transform`` are left alone too.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        content_types: Iterable[str] = ("application/json", "text/html"),
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = {content_type.strip().lower() for content_type in content_types} - {EVENT_STREAM}
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding"), self.encodings)
+        if not accepted:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressionResponder(self, accepted[0], send).send)
+
+    def compressor(self, encoding: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+        """(compress, finish) functions of a new stream compressor"""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    def compressible(self, status: int, headers: Headers) -> bool:
+        if status in (204, 304) or "content-encoding" in headers:
+            return False
+        if "no-transform" in headers.get("cache-control", "").lower():
+            return False
+        content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        return content_type in self.content_types
+
+class CompressionResponder:
+    """Wraps ``send`` for one response; decides on its first body message"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.compress: Optional[Callable[[bytes], bytes]] = None
+        self.finish: Optional[Callable[[], bytes]] = None
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self._send(message)
+            return
+        if message["type"] == "http.response.start":
+            # Held back until the first body message shows how large the body is
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.start is None:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compress is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if not self.middleware.compressible(self.start["status"], headers):
+                await self.pass_through(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.middleware.minimum_size:
+                await self.pass_through(message)
+                return
+
+            self.compress, self.finish = self.middleware.compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            # The compressed body is another representation of the same data
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.compress(body) + self.finish()
+                headers["Content-Length"] = str(len(body))
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._send(self.start)
+
+        # A streamed body (not an event stream): compressed without per-chunk
+        # flushes, which would cost ratio; empty output isn't sent
+        output = self.compress(body)
+        if not more_body:
+            output += self.finish()
+        if output or not more_body:
+            await self._send({"type": "http.response.body", "body": output, "more_body": more_body})
+
+    async def pass_through(self, message: Message) -> None:
+        self.passthrough = True
+        await self._send(self.start)
+        await self._send(message)
@@ -0,0 +1,467 @@
+# app/services/retention.py
+import asyncio
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import and_, insert, select, text
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal, dialect_insert
+from ..models.chat import Conversation, ChatMessage
+from ..models.retention import RetentionPolicy, ArchivedConversation, RetentionState
+from ..models.user import user_roles
+from ..auth.refresh import purge_expired_refresh_tokens
+from .context_cache import context_cache
+from .search import merge_search_index
+from .sync import record_changes, record_conversation_deletes, purge_sync_changes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (archive_after_days, purge_after_days); None means never
+Policy = Tuple[Optional[int], Optional[int]]
+
+def _most_generous(days: List[Optional[int]]) -> Optional[int]:
+    """Longest of several limits, where None (never) beats any number."""
+    if not days or any(d is None for d in days):
+        return None
+    return max(days)
+
+def default_policy() -> Policy:
+    return (
+        settings.RETENTION_ARCHIVE_AFTER_DAYS or None,
+        settings.RETENTION_PURGE_AFTER_DAYS or None
+    )
+
+def resolve_policies(db: Session) -> Dict[Policy, List[str]]:
+    """
+    Group user ids by the retention policy that applies to them.
+
+    A user's own policy wins. Otherwise the most generous limit across the
+    user's role policies applies, and users without any fall back to the
+    RETENTION_* settings.
+    """
+    user_policies = {}
+    role_policies = {}
+    for policy in db.query(RetentionPolicy).all():
+        limits = (policy.archive_after_days, policy.purge_after_days)
+        if policy.user_id:
+            user_policies[policy.user_id] = limits
+        elif policy.role_id:
+            role_policies[policy.role_id] = limits
+
+    roles_by_user: Dict[str, List[str]] = {}
+    if role_policies:
+        for user_id, role_id in db.execute(user_roles.select()):
+            if role_id in role_policies:
+                roles_by_user.setdefault(user_id, []).append(role_id)
+
+    groups: Dict[Policy, List[str]] = {}
+    user_ids = [row[0] for row in db.query(Conversation.user_id).distinct()]
+    user_ids += [row[0] for row in db.query(ArchivedConversation.user_id).distinct()]
+    for user_id in set(user_ids):
+        if user_id in user_policies:
+            policy = user_policies[user_id]
+        elif user_id in roles_by_user:
+            limits = [role_policies[role_id] for role_id in roles_by_user[user_id]]
+            policy = (
+                _most_generous([archive for archive, _ in limits]),
+                _most_generous([purge for _, purge in limits])
+            )
+        else:
+            policy = default_policy()
+        if policy != (None, None):
+            groups.setdefault(policy, []).append(user_id)
+    return groups
+
+def delete_conversations(
+    db: Session, conversation_ids: List[str], updated_before: Optional[datetime] = None
+) -> int:
+    """
+    Delete conversations and their messages with two set-based statements.
+
+    Unlike ``db.delete(conversation)`` this never loads the messages. Messages
+    go first because the search triggers look up their conversation. Owners'
+    devices get tombstones through the sync feed. With ``updated_before``,
+    both DELETEs skip conversations active since then. Does not commit.
+    """
+    if not conversation_ids:
+        return 0
+    targets = Conversation.id.in_(conversation_ids)
+    if updated_before is not None:
+        targets = and_(targets, Conversation.updated_at < updated_before)
+    record_conversation_deletes(db, conversation_ids)
+    if updated_before is not None:
+        message_targets = ChatMessage.conversation_id.in_(select(Conversation.id).where(targets))
+    else:
+        message_targets = ChatMessage.conversation_id.in_(conversation_ids)
+    db.query(ChatMessage)\
+        .filter(message_targets)\
+        .delete(synchronize_session=False)
+    deleted = db.query(Conversation)\
+        .filter(targets)\
+        .delete(synchronize_session=False)
+    for conversation_id in conversation_ids:
+        context_cache.invalidate(conversation_id)
+    return deleted
+
+class ConversationChanged(Exception):
+    """Raised when a conversation selected for retention was written to meanwhile."""
+    pass
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timezone-aware columns back as naive UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _claim_retention_state(db: Session) -> RetentionState:
+    """
+    The job's state row, locked until the transaction ends.
+
+    Every worker runs the retention schedule; the lock makes their chunks
+    take turns instead of archiving the same conversations at once. On
+    SQLite the INSERT takes the database write lock, which does the same.
+    """
+    db.execute(
+        dialect_insert(db)(RetentionState)
+        .values(name="retention")
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    return db.query(RetentionState)\
+        .filter(RetentionState.name == "retention")\
+        .populate_existing()\
+        .with_for_update()\
+        .one()
+
+def _stale_conversation_ids(
+    db: Session,
+    user_ids: List[str],
+    cutoff: datetime,
+    limit: int,
+    skip: Set[str] = frozenset(),
+    within: Optional[List[str]] = None
+) -> List[str]:
+    """The oldest idle conversations, locked against new messages until the transaction ends."""
+    query = db.query(Conversation.id)\
+        .filter(Conversation.user_id.in_(user_ids), Conversation.updated_at < cutoff)
+    if skip:
+        query = query.filter(Conversation.id.notin_(skip))
+    if within is not None:
+        query = query.filter(Conversation.id.in_(within))
+    rows = query.order_by(Conversation.updated_at)\
+        .limit(limit)\
+        .with_for_update(skip_locked=True)\
+        .all()
+    return [row.id for row in rows]
+
+def _in_chunks(
+    db: Session,
+    user_ids: List[str],
+    cutoff: datetime,
+    chunk_size: int,
+    process: Callable[[List[str]], int]
+) -> int:
+    """
+    Run ``process(ids)`` over idle conversations, one locked chunk per transaction.
+
+    A chunk that fails is rolled back and retried one conversation at a
+    time, so a single bad row can't stall the job; conversations that still
+    fail are logged and skipped until the next run.
+    """
+    done = 0
+    skipped: Set[str] = set()
+    while True:
+        _claim_retention_state(db)
+        ids = _stale_conversation_ids(db, user_ids, cutoff, chunk_size, skipped)
+        if not ids:
+            db.commit()
+            return done
+        try:
+            done += process(ids)
+            db.commit()
+            continue
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Retention chunk failed, retrying one conversation at a time: {str(e)}")
+
+        for conversation_id in ids:
+            try:
+                _claim_retention_state(db)
+                # Selected again: it may have become active in the meantime
+                still_stale = _stale_conversation_ids(db, user_ids, cutoff, 1, within=[conversation_id])
+                if still_stale:
+                    done += process(still_stale)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                skipped.add(conversation_id)
+                logger.error(f"Retention skipped conversation {conversation_id}: {str(e)}")
+
+def _delete_stale(db: Session, ids: List[str], cutoff: datetime) -> int:
+    deleted = delete_conversations(db, ids, updated_before=cutoff)
+    if deleted != len(ids):
+        raise ConversationChanged(f"{len(ids) - deleted} of {len(ids)} conversations were written to")
+    return deleted
+
+def _archive_chunk(db: Session, ids: List[str], cutoff: datetime) -> int:
+    messages: Dict[str, List[dict]] = {conversation_id: [] for conversation_id in ids}
+    rows = db.query(
+        ChatMessage.conversation_id, ChatMessage.content, ChatMessage.response, ChatMessage.timestamp
+    ).filter(ChatMessage.conversation_id.in_(ids)).order_by(ChatMessage.id)
+    for row in rows:
+        messages[row.conversation_id].append({
+            "content": row.content,
+            "response": row.response,
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None
+        })
+
+    # An id archived before and then written to again is merged into its
+    # archive row, older messages first
+    previous = {
+        row.id: row
+        for row in db.query(
+            ArchivedConversation.id, ArchivedConversation.created_at,
+            ArchivedConversation.version, ArchivedConversation.messages
+        ).filter(ArchivedConversation.id.in_(ids)).with_for_update()
+    }
+    if previous:
+        db.query(ArchivedConversation)\
+            .filter(ArchivedConversation.id.in_(list(previous)))\
+            .delete(synchronize_session=False)
+
+    conversations = db.query(
+        Conversation.id, Conversation.user_id, Conversation.title,
+        Conversation.created_at, Conversation.updated_at, Conversation.version
+    ).filter(Conversation.id.in_(ids)).all()
+    archive_rows = []
+    for conv in conversations:
+        archived_messages = messages[conv.id]
+        created_at, version = conv.created_at, conv.version
+        earlier = previous.get(conv.id)
+        if earlier is not None:
+            archived_messages = json.loads(zlib.decompress(earlier.messages)) + archived_messages
+            created_at = earlier.created_at or created_at
+            version = max(version, earlier.version)
+        archive_rows.append({
+            "id": conv.id,
+            "user_id": conv.user_id,
+            "title": conv.title,
+            "created_at": created_at,
+            "updated_at": conv.updated_at,
+            "version": version,
+            "message_count": len(archived_messages),
+            "messages": zlib.compress(json.dumps(archived_messages).encode("utf-8"), 9)
+        })
+    db.execute(insert(ArchivedConversation), archive_rows)
+    return _delete_stale(db, ids, cutoff)
+
+def archive_conversations(db: Session, user_ids: List[str], cutoff: datetime, chunk_size: int) -> int:
+    """Move conversations idle since before ``cutoff`` to the archive, one chunk per transaction."""
+    return _in_chunks(db, user_ids, cutoff, chunk_size, lambda ids: _archive_chunk(db, ids, cutoff))
+
+def purge_conversations(db: Session, user_ids: List[str], cutoff: datetime, chunk_size: int) -> Tuple[int, int]:
+    """Delete live and archived conversations idle since before ``cutoff``, in chunks."""
+    purged = _in_chunks(db, user_ids, cutoff, chunk_size, lambda ids: _delete_stale(db, ids, cutoff))
+
+    purged_archived = 0
+    while True:
+        _claim_retention_state(db)
+        ids = [
+            row.id for row in db.query(ArchivedConversation.id)
+            .filter(ArchivedConversation.user_id.in_(user_ids), ArchivedConversation.updated_at < cutoff)
+            .limit(chunk_size)
+            .with_for_update(skip_locked=True)
+        ]
+        if not ids:
+            db.commit()
+            break
+        purged_archived += db.query(ArchivedConversation)\
+            .filter(ArchivedConversation.id.in_(ids))\
+            .delete(synchronize_session=False)
+        db.commit()
+    return purged, purged_archived
+
+def restore_conversation(db: Session, archived: ArchivedConversation) -> Conversation:
+    """Move an archived conversation back into the live tables and commit."""
+    conversation = Conversation(
+        id=archived.id,
+        user_id=archived.user_id,
+        title=archived.title,
+        created_at=archived.created_at,
+        updated_at=datetime.now(timezone.utc),
+        # Past any version another worker may still have cached
+        version=archived.version + 1
+    )
+    db.add(conversation)
+    db.flush()
+    messages = json.loads(zlib.decompress(archived.messages))
+    if messages:
+        db.execute(insert(ChatMessage), [
+            {
+                "conversation_id": archived.id,
+                "content": msg["content"],
+                "response": msg["response"],
+                "timestamp": datetime.fromisoformat(msg["timestamp"]) if msg["timestamp"] else None
+            }
+            for msg in messages
+        ])
+    record_changes(db, archived.user_id, conversation_ids=[archived.id])
+    db.delete(archived)
+    db.commit()
+    return conversation
+
+def enable_incremental_vacuum(bind, convert_existing: bool = False) -> bool:
+    """
+    Put a SQLite database into incremental auto-vacuum mode.
+
+    Switching rewrites the whole file with VACUUM, which is instant for a new
+    database but slow for a large one, so existing data is only converted
+    when ``convert_existing`` is set. Returns whether the database is (now)
+    in incremental mode.
+    """
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.connect() as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            return True
+        has_tables = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table'")).first()
+        if has_tables and not convert_existing:
+            logger.info(
+                "Database is not in incremental vacuum mode; run "
+                "'python create_tables.py --enable-incremental-vacuum' once to convert it"
+            )
+            return False
+        if has_tables:
+            logger.info("Rebuilding database for incremental vacuum, this may take a while")
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+        return conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+
+def incremental_vacuum(bind, pages: int) -> int:
+    """
+    Return free pages to the file system a few at a time.
+
+    Each step is its own short transaction so writers are never blocked for
+    long. PostgreSQL gets a plain (non-blocking) VACUUM ANALYZE instead.
+    Returns the number of pages freed.
+    """
+    if bind.dialect.name == "postgresql":
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in ("chat_messages", "conversations", "archived_conversations"):
+                conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+        return 0
+    if bind.dialect.name != "sqlite":
+        return 0
+
+    freed = 0
+    with bind.connect() as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            return 0
+        while True:
+            free = conn.execute(text("PRAGMA freelist_count")).scalar()
+            if not free:
+                break
+            # The pragma frees one page per step and the sqlite3 module steps a
+            # statement only once, so run it through executescript instead
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            freed += min(free, pages)
+    return freed
+
+def apply_retention(db: Session, now: Optional[datetime] = None) -> Dict:
+    """
+    Run every retention policy once, then compact the database.
+
+    Purging runs before archiving so conversations past both limits are
+    deleted instead of being archived first. Expired refresh tokens and old
+    sync feed entries are deleted as well.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc)
+    chunk_size = settings.RETENTION_CHUNK_SIZE
+    stats = {"archived": 0, "purged": 0, "purged_archived": 0, "vacuumed_pages": 0}
+    stats["refresh_tokens_purged"] = purge_expired_refresh_tokens(db, now)
+    stats["sync_changes_purged"] = purge_sync_changes(db, now)
+
+    for (archive_days, purge_days), user_ids in resolve_policies(db).items():
+        if purge_days:
+            purged, purged_archived = purge_conversations(
+                db, user_ids, now - timedelta(days=purge_days), chunk_size
+            )
+            stats["purged"] += purged
+            stats["purged_archived"] += purged_archived
+        if archive_days and (not purge_days or archive_days < purge_days):
+            stats["archived"] += archive_conversations(
+                db, user_ids, now - timedelta(days=archive_days), chunk_size
+            )
+
+    bind = db.get_bind()
+    if stats["archived"] or stats["purged"]:
+        merge_search_index(bind)
+    stats["vacuumed_pages"] = incremental_vacuum(bind, settings.RETENTION_VACUUM_PAGES)
+    _claim_retention_state(db).last_run_at = datetime.now(timezone.utc)
+    db.commit()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Retention run finished: {stats}")
+    return stats
+
+def run_retention(min_interval_seconds: float = 0) -> Optional[Dict]:
+    """
+    Apply retention with a session of its own (for the scheduler and CLI).
+
+    Returns None without doing anything when any worker finished a run
+    less than ``min_interval_seconds`` ago.
+    """
+    db = SessionLocal()
+    try:
+        if min_interval_seconds:
+            last_run_at = db.query(RetentionState.last_run_at)\
+                .filter(RetentionState.name == "retention")\
+                .scalar()
+            db.rollback()
+            if last_run_at is not None and \
+                    datetime.now(timezone.utc) - _as_utc(last_run_at) < timedelta(seconds=min_interval_seconds):
+                logger.debug("Retention run skipped, another worker ran it recently")
+                return None
+        return apply_retention(db)
+    finally:
+        db.close()
+
+class RetentionScheduler:
+    """
+    Runs retention every ``interval_minutes`` in a worker thread.
+
+    Every worker has a scheduler. A worker skips its turn when another one
+    finished a run within the last half interval, and the runs that do
+    overlap take turns chunk by chunk on the retention_state lock.
+    """
+
+    def __init__(self, interval_minutes: int):
+        self.interval_minutes = interval_minutes
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval_minutes <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Retention job scheduled every {self.interval_minutes} minutes")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_minutes * 60)
+            try:
+                await asyncio.to_thread(run_retention, self.interval_minutes * 30)
+            except Exception as e:
+                logger.error(f"Retention run failed: {str(e)}")
+
+retention_scheduler = RetentionScheduler(settings.RETENTION_INTERVAL_MINUTES)
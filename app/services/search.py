@@ -0,0 +1,515 @@
+# app/services/search.py
+import hashlib
+import html
+from typing import List, Dict, Tuple
+from sqlalchemy import text, bindparam, DateTime
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sentinels placed around matches by snippet()/highlight(); swapped for <mark>
+# after the surrounding text has been HTML-escaped
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+SNIPPET_TOKENS = 16
+# Only the most recent matches of each source are scored with bm25, which
+# bounds query cost for words that appear in a large share of a user's history
+SEARCH_CANDIDATES = 1000
+
+# FTS5 tables use the chat tables as external content, so the index stores
+# only the inverted lists and the triggers below keep it in sync. Each row also
+# indexes its owner's id so user scoping and ranking both happen inside FTS5
+# and only the requested page is joined back to the chat tables.
+#
+# Explicit prefix queries ("word*", at least three characters) read the prefix
+# indexes for three and four characters instead of merging the entries of
+# every matching word. Longer prefixes match few enough words to merge.
+#
+# Statements per full-text table; a table whose statements change is dropped,
+# recreated and rebuilt (see ensure_search_index).
+SQLITE_SEARCH_TABLES = {
+    "chat_messages_fts": [
+        """
+        CREATE VIRTUAL TABLE chat_messages_fts USING fts5(
+            content, response, owner,
+            content='chat_messages_search_source', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='3 4'
+        )
+        """,
+        # Rank on the text columns only; the owner column matches every row
+        "INSERT INTO chat_messages_fts(chat_messages_fts, rank) VALUES ('rank', 'bm25(1.0, 1.0, 0.0)')",
+    ],
+    "conversations_fts": [
+        """
+        CREATE VIRTUAL TABLE conversations_fts USING fts5(
+            title, user_id,
+            content='conversations', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='3 4'
+        )
+        """,
+        "INSERT INTO conversations_fts(conversations_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+    ],
+    # Admin user search matches word prefixes as the admin types
+    "users_fts": [
+        """
+        CREATE VIRTUAL TABLE users_fts USING fts5(
+            username, email, full_name,
+            content='users', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+    ],
+}
+
+# The view and triggers hold no data; they are recreated when their
+# definitions change (see SQLITE_SEARCH_VERSION). Message bodies may be stored
+# compressed, so they are read through the decompress_text() function
+# registered on each connection.
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE VIEW chat_messages_search_source AS
+    SELECT m.id AS id, decompress_text(m.content) AS content,
+           coalesce(decompress_text(m.response), '') AS response,
+           replace(c.user_id, '-', '') AS owner
+    FROM chat_messages m JOIN conversations c ON c.id = m.conversation_id
+    """,
+    """
+    CREATE TRIGGER chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(rowid, content, response, owner)
+        SELECT new.id, decompress_text(new.content), coalesce(decompress_text(new.response), ''),
+               replace(c.user_id, '-', '')
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content, response, owner)
+        SELECT 'delete', old.id, decompress_text(old.content), coalesce(decompress_text(old.response), ''),
+               replace(c.user_id, '-', '')
+        FROM conversations c WHERE c.id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER chat_messages_fts_update AFTER UPDATE OF content, response ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content, response, owner)
+        SELECT 'delete', old.id, decompress_text(old.content), coalesce(decompress_text(old.response), ''),
+               replace(c.user_id, '-', '')
+        FROM conversations c WHERE c.id = old.conversation_id;
+        INSERT INTO chat_messages_fts(rowid, content, response, owner)
+        SELECT new.id, decompress_text(new.content), coalesce(decompress_text(new.response), ''),
+               replace(c.user_id, '-', '')
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER conversations_fts_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts(rowid, title, user_id) VALUES (new.rowid, new.title, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER conversations_fts_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, title, user_id)
+        VALUES ('delete', old.rowid, old.title, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, title, user_id)
+        VALUES ('delete', old.rowid, old.title, old.user_id);
+        INSERT INTO conversations_fts(rowid, title, user_id) VALUES (new.rowid, new.title, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, email, full_name)
+        VALUES (new.rowid, new.username, new.email, new.full_name);
+    END
+    """,
+    """
+    CREATE TRIGGER users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, email, full_name)
+        VALUES ('delete', old.rowid, old.username, old.email, old.full_name);
+    END
+    """,
+    """
+    CREATE TRIGGER users_fts_update AFTER UPDATE OF username, email, full_name ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, email, full_name)
+        VALUES ('delete', old.rowid, old.username, old.email, old.full_name);
+        INSERT INTO users_fts(rowid, username, email, full_name)
+        VALUES (new.rowid, new.username, new.email, new.full_name);
+    END
+    """,
+]
+
+# Step one ranks without touching the chat tables: each source walks its newest
+# matches in rowid order (which FTS5 streams without sorting) and keeps the
+# best ``offset + limit`` by bm25, then both sources are merged into one page
+SQLITE_RANK_QUERY = """
+    SELECT source, rowid, rank FROM (
+        SELECT 'message' AS source, rowid, rank FROM (
+            SELECT rowid, rank FROM (
+                SELECT rowid, rank FROM chat_messages_fts
+                WHERE chat_messages_fts MATCH :message_query
+                ORDER BY rowid DESC LIMIT :candidates
+            )
+            ORDER BY rank LIMIT :window
+        )
+        UNION ALL
+        SELECT 'title', rowid, rank FROM (
+            SELECT rowid, rank FROM (
+                SELECT rowid, rank FROM conversations_fts
+                WHERE conversations_fts MATCH :title_query
+                ORDER BY rowid DESC LIMIT :candidates
+            )
+            ORDER BY rank LIMIT :window
+        )
+    )
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+"""
+
+# Step two builds snippets and joins back only for the rows on the page
+SQLITE_MESSAGE_HITS_QUERY = f"""
+    SELECT hits.rowid AS rowid, c.id AS conversation_id, c.title AS title,
+           m.timestamp AS timestamp,
+           CASE WHEN instr(hits.content_snippet, char(2)) > 0
+                THEN hits.content_snippet ELSE hits.response_snippet END AS snippet
+    FROM (
+        SELECT rowid,
+               snippet(chat_messages_fts, 0, char(2), char(3), '…', {SNIPPET_TOKENS}) AS content_snippet,
+               snippet(chat_messages_fts, 1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS response_snippet
+        FROM chat_messages_fts
+        WHERE chat_messages_fts MATCH :message_query AND rowid IN :rowids
+    ) AS hits
+    JOIN chat_messages m ON m.id = hits.rowid
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE c.user_id = :user_id
+"""
+
+SQLITE_TITLE_HITS_QUERY = """
+    SELECT hits.rowid AS rowid, c.id AS conversation_id, c.title AS title,
+           c.updated_at AS timestamp, hits.snippet AS snippet
+    FROM (
+        SELECT rowid, highlight(conversations_fts, 0, char(2), char(3)) AS snippet
+        FROM conversations_fts
+        WHERE conversations_fts MATCH :title_query AND rowid IN :rowids
+    ) AS hits
+    JOIN conversations c ON c.rowid = hits.rowid
+    WHERE c.user_id = :user_id
+"""
+
+# PostgreSQL keeps no separate index tables: GIN expression indexes over the
+# same documents are maintained by the database itself
+POSTGRES_MESSAGE_DOCUMENT = "to_tsvector('simple', content || ' ' || coalesce(response, ''))"
+POSTGRES_TITLE_DOCUMENT = "to_tsvector('simple', title)"
+POSTGRES_USER_DOCUMENT = "to_tsvector('simple', username || ' ' || email || ' ' || full_name)"
+
+POSTGRES_SEARCH_DDL = [
+    f"CREATE INDEX IF NOT EXISTS chat_messages_search_idx ON chat_messages USING GIN ({POSTGRES_MESSAGE_DOCUMENT})",
+    f"CREATE INDEX IF NOT EXISTS conversations_search_idx ON conversations USING GIN ({POSTGRES_TITLE_DOCUMENT})",
+    f"CREATE INDEX IF NOT EXISTS users_search_idx ON users USING GIN ({POSTGRES_USER_DOCUMENT})",
+]
+
+# Full-text tables, and the tables they index, on SQLite
+SQLITE_FTS_TABLES = ("chat_messages", "conversations", "users")
+
+def _fingerprint(statements: List[str]) -> str:
+    return hashlib.sha256("\n".join(statements).encode("utf-8")).hexdigest()[:16]
+
+# Fingerprints of the SQLite search definitions, stored in search_schema: the
+# view and triggers are rebuilt when SQLITE_SEARCH_VERSION changes, and each
+# full-text table when its own definition does
+SQLITE_SEARCH_VERSION = _fingerprint(SQLITE_SEARCH_TRIGGERS)
+SQLITE_TABLE_VERSIONS = {name: _fingerprint(statements) for name, statements in SQLITE_SEARCH_TABLES.items()}
+
+# Same shape as the SQLite search: newest candidates per source, best
+# ``offset + limit`` of each by ts_rank_cd, headlines only for the final page
+POSTGRES_SEARCH_QUERY = f"""
+    WITH search AS (SELECT to_tsquery('simple', :tsquery) AS query),
+    message_hits AS (
+        SELECT * FROM (
+            SELECT m.id AS message_id, m.conversation_id, m.timestamp,
+                   m.content || ' ' || coalesce(m.response, '') AS document,
+                   ts_rank_cd({POSTGRES_MESSAGE_DOCUMENT}, search.query) AS score
+            FROM chat_messages m
+            JOIN conversations c ON c.id = m.conversation_id
+            CROSS JOIN search
+            WHERE c.user_id = :user_id AND {POSTGRES_MESSAGE_DOCUMENT} @@ search.query
+            ORDER BY m.id DESC LIMIT :candidates
+        ) AS recent
+        ORDER BY score DESC LIMIT :window
+    ),
+    title_hits AS (
+        SELECT * FROM (
+            SELECT c.id AS conversation_id, c.title, c.updated_at,
+                   ts_rank_cd({POSTGRES_TITLE_DOCUMENT}, search.query) AS score
+            FROM conversations c
+            CROSS JOIN search
+            WHERE c.user_id = :user_id AND {POSTGRES_TITLE_DOCUMENT} @@ search.query
+            ORDER BY c.updated_at DESC LIMIT :candidates
+        ) AS recent
+        ORDER BY score DESC LIMIT :window
+    ),
+    page AS (
+        SELECT h.conversation_id, c.title, h.message_id, h.timestamp, h.document, h.score
+        FROM message_hits h JOIN conversations c ON c.id = h.conversation_id
+        UNION ALL
+        SELECT conversation_id, title, NULL, updated_at, title, score FROM title_hits
+        ORDER BY score DESC
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT conversation_id, title, message_id, timestamp,
+           ts_headline('simple', document, search.query, :headline_options) AS snippet,
+           -score AS rank
+    FROM page CROSS JOIN search
+    ORDER BY score DESC
+"""
+
+def ensure_search_index(bind) -> bool:
+    """
+    Create the full-text search indexes (and SQLite sync triggers) if missing.
+
+    On SQLite everything happens in one IMMEDIATE transaction, so workers
+    starting together take turns and no write lands while the triggers are
+    being replaced; they are only replaced when SQLITE_SEARCH_VERSION
+    changes. A full-text table that is missing or whose definition changed
+    is recreated and rebuilt from its chat table, which takes a while on a
+    large history. Returns False when the database has no supported
+    full-text search.
+    """
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            for statement in POSTGRES_SEARCH_DDL:
+                conn.execute(text(statement))
+        return True
+    if bind.dialect.name != "sqlite":
+        return False
+    with bind.connect() as conn:
+        # pysqlite doesn't begin transactions for DDL by itself
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            existing = {
+                row[0] for row in conn.execute(
+                    text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%\\_fts' ESCAPE '\\'")
+                )
+            }
+            conn.execute(text("CREATE TABLE IF NOT EXISTS search_schema (name TEXT PRIMARY KEY, version TEXT NOT NULL)"))
+            stored = dict(conn.execute(text("SELECT name, version FROM search_schema")).all())
+            versions = {"sqlite": SQLITE_SEARCH_VERSION, **SQLITE_TABLE_VERSIONS}
+            rebuild = [
+                name for name, version in SQLITE_TABLE_VERSIONS.items()
+                if name not in existing or stored.get(name) != version
+            ]
+            if rebuild or stored.get("sqlite") != SQLITE_SEARCH_VERSION:
+                _drop_sqlite_triggers(conn)
+                try:
+                    for name in rebuild:
+                        conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                        for statement in SQLITE_SEARCH_TABLES[name]:
+                            conn.execute(text(statement))
+                except OperationalError as e:
+                    if "fts5" not in str(e):
+                        raise
+                    logger.warning(f"Full-text search unavailable: {str(e)}")
+                    conn.rollback()
+                    return False
+                for statement in SQLITE_SEARCH_TRIGGERS:
+                    conn.execute(text(statement))
+                conn.execute(
+                    text("INSERT OR REPLACE INTO search_schema (name, version) VALUES (:name, :version)"),
+                    [{"name": name, "version": version} for name, version in versions.items()]
+                )
+                for name in rebuild:
+                    # Index the rows that predate the (new) search table
+                    logger.info(f"Rebuilding full-text index {name}")
+                    conn.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return True
+
+def merge_search_index(bind, pages: int = 500) -> None:
+    """
+    Merge FTS5 index segments after bulk deletes (SQLite only).
+
+    Deleted rows leave tombstones in the index until their segments are
+    merged; a bounded 'merge' does part of that work without a full rebuild.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        if not conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'")
+        ).first():
+            return
+        for table in ("chat_messages_fts", "conversations_fts"):
+            conn.execute(text(f"INSERT INTO {table}({table}, rank) VALUES ('merge', :pages)"), {"pages": pages})
+
+def drop_search_index(bind) -> None:
+    """Drop the full-text search indexes and any SQLite sync triggers."""
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS chat_messages_search_idx"))
+            conn.execute(text("DROP INDEX IF EXISTS conversations_search_idx"))
+            conn.execute(text("DROP INDEX IF EXISTS users_search_idx"))
+        return
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        _drop_sqlite_triggers(conn)
+        for name in SQLITE_FTS_TABLES:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}_fts"))
+        conn.execute(text("DROP TABLE IF EXISTS search_schema"))
+
+def _drop_sqlite_triggers(conn) -> None:
+    for name in SQLITE_FTS_TABLES:
+        for action in ("insert", "delete", "update"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}_fts_{action}"))
+    conn.execute(text("DROP VIEW IF EXISTS chat_messages_search_source"))
+
+def parse_search_terms(search: str) -> List[Tuple[str, bool]]:
+    """
+    Split free text into ``(word, is_prefix)`` pairs.
+
+    A trailing ``*`` on a word of at least three characters asks for a prefix
+    match. Prefixes are never added implicitly because prefix queries merge
+    the index entries of every matching word and get slow on large histories.
+    """
+    terms = []
+    for word in search.split():
+        prefix = word.endswith("*") and len(word.rstrip("*")) >= 3
+        word = word.rstrip("*")
+        if word:
+            terms.append((word, prefix))
+    return terms
+
+def build_match_query(search: str, prefix_all: bool = False) -> str:
+    """
+    Turn free text into a safe FTS5 query.
+
+    Every word is quoted so FTS5 operators in user input are matched literally.
+    ``prefix_all`` matches every word as a prefix (for small tables only).
+    """
+    phrases = []
+    for word, prefix in parse_search_terms(search):
+        word = word.replace('"', '""')
+        phrases.append(f'"{word}"*' if prefix or prefix_all else f'"{word}"')
+    return " ".join(phrases)
+
+def build_tsquery(search: str, prefix_all: bool = False) -> str:
+    """Turn free text into a PostgreSQL tsquery that ANDs quoted lexemes."""
+    lexemes = []
+    for word, prefix in parse_search_terms(search):
+        word = word.replace("\\", "\\\\").replace("'", "''")
+        lexemes.append(f"'{word}':*" if prefix or prefix_all else f"'{word}'")
+    return " & ".join(lexemes)
+
+def scoped_match_queries(user_id: str, match_query: str) -> Dict[str, str]:
+    """Restrict a match query to the text columns of one user's rows."""
+    user_id = user_id.replace('"', '""')
+    owner = user_id.replace("-", "")
+    return {
+        "message_query": f'owner : "{owner}" AND {{content response}} : ({match_query})',
+        "title_query": f'user_id : "{user_id}" AND title : ({match_query})'
+    }
+
+def render_snippet(snippet: str) -> str:
+    """HTML-escape a snippet and wrap the matched terms in <mark> tags."""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+def search_conversations(
+    db: Session,
+    user_id: str,
+    search: str,
+    page: int = 1,
+    page_size: int = 20
+) -> List[Dict]:
+    """
+    Rank a user's messages and conversation titles against a search string.
+
+    Relevance is bm25 (SQLite) or ts_rank_cd (PostgreSQL) over the newest
+    ``SEARCH_CANDIDATES`` matches of each source. Title hits are returned
+    with ``message_id`` set to None.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, user_id, search, page, page_size)
+    return _search_sqlite(db, user_id, search, page, page_size)
+
+def _search_sqlite(db: Session, user_id: str, search: str, page: int, page_size: int) -> List[Dict]:
+    match_query = build_match_query(search)
+    if not match_query:
+        return []
+    queries = scoped_match_queries(user_id, match_query)
+    ranked = db.execute(
+        text(SQLITE_RANK_QUERY),
+        {
+            **queries,
+            "candidates": max(SEARCH_CANDIDATES, page * page_size),
+            "window": page * page_size,
+            "limit": page_size,
+            "offset": (page - 1) * page_size
+        }
+    ).all()
+    if not ranked:
+        return []
+
+    details = {}
+    for source, sql in (("message", SQLITE_MESSAGE_HITS_QUERY), ("title", SQLITE_TITLE_HITS_QUERY)):
+        rowids = [row.rowid for row in ranked if row.source == source]
+        if not rowids:
+            continue
+        statement = text(sql).bindparams(bindparam("rowids", expanding=True)).columns(timestamp=DateTime)
+        for row in db.execute(statement, {**queries, "rowids": rowids, "user_id": user_id}):
+            details[(source, row.rowid)] = row
+
+    results = []
+    for hit in ranked:
+        row = details.get((hit.source, hit.rowid))
+        if row is None:
+            continue
+        results.append({
+            "conversation_id": row.conversation_id,
+            "title": row.title,
+            "message_id": hit.rowid if hit.source == "message" else None,
+            "timestamp": row.timestamp,
+            "snippet": render_snippet(row.snippet),
+            "rank": hit.rank
+        })
+    return results
+
+def _search_postgres(db: Session, user_id: str, search: str, page: int, page_size: int) -> List[Dict]:
+    tsquery = build_tsquery(search)
+    if not tsquery:
+        return []
+
+    rows = db.execute(
+        text(POSTGRES_SEARCH_QUERY).columns(timestamp=DateTime),
+        {
+            "tsquery": tsquery,
+            "user_id": user_id,
+            "candidates": max(SEARCH_CANDIDATES, page * page_size),
+            "window": page * page_size,
+            "limit": page_size,
+            "offset": (page - 1) * page_size,
+            "headline_options": (
+                f'StartSel="{MATCH_START}", StopSel="{MATCH_END}", '
+                f"MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}"
+            )
+        }
+    ).all()
+
+    return [
+        {
+            "conversation_id": row.conversation_id,
+            "title": row.title,
+            "message_id": row.message_id,
+            "timestamp": row.timestamp,
+            "snippet": render_snippet(row.snippet),
+            "rank": row.rank
+        }
+        for row in rows
+    ]
@@ -0,0 +1,165 @@
+# app/services/static_assets.py
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+from typing import Dict, Optional
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+from .http_cache import accepted_encodings
+import logging
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip copies are always built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "app/static"
+# Fingerprinted copies go here, inside the static directory
+BUILD_DIR = "build"
+MANIFEST_FILE = "manifest.json"
+# Smaller files are not worth a compressed copy
+MIN_COMPRESS_SIZE = 256
+# Suffixes of the precompressed copies, by content coding, most preferred first
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Fingerprinted files never change, so clients may keep them for a year unchecked
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def hashed_name(path: str, data: bytes) -> str:
+    """``js/chat.js`` becomes ``js/chat.<hash>.js``"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{fingerprint(data)}{ext}"
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def build_assets(static_dir: str = STATIC_DIR, clean: bool = False) -> Dict[str, str]:
+    """
+    Write a fingerprinted copy of every static file, plus gzip and (when the
+    brotli package is installed) brotli copies, under ``<static_dir>/build``.
+
+    The manifest mapping each source path to its copy is written last, so a
+    server never sees it point at files that aren't there yet. Copies from
+    earlier builds are kept for pages still referencing them, unless
+    ``clean`` is set. Returns the manifest.
+    """
+    build_dir = os.path.join(static_dir, BUILD_DIR)
+    manifest: Dict[str, str] = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and BUILD_DIR in dirs:
+            dirs.remove(BUILD_DIR)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            path = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            target = hashed_name(path, data)
+            manifest[path] = target
+            target_path = os.path.join(build_dir, target)
+            # Same name, same content: an unchanged file is already built
+            if os.path.exists(target_path):
+                continue
+
+            _write(target_path, data)
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            copies = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                copies["br"] = brotli.compress(data, quality=11)
+            for encoding, compressed in copies.items():
+                if len(compressed) < len(data):
+                    _write(target_path + ENCODING_SUFFIXES[encoding], compressed)
+            logger.info(f"Built {target} ({len(data)} bytes, " + ", ".join(
+                f"{encoding} {len(compressed)}" for encoding, compressed in copies.items()
+            ) + ")")
+
+    _write(os.path.join(build_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    if clean:
+        keep = {MANIFEST_FILE}
+        for target in manifest.values():
+            keep.add(target)
+            keep.update(target + suffix for suffix in ENCODING_SUFFIXES.values())
+        for root, _, files in os.walk(build_dir):
+            for name in files:
+                full_path = os.path.join(root, name)
+                if os.path.relpath(full_path, build_dir).replace(os.sep, "/") not in keep:
+                    os.remove(full_path)
+    return manifest
+
+class AssetManifest:
+    """
+    Resolves static paths to the URLs of their fingerprinted copies.
+
+    Reads the build manifest on first use; restart the server after a
+    build. Without a build (e.g. during development) the plain files are
+    served, as are files added since the last build.
+    """
+
+    def __init__(self, static_dir: str = STATIC_DIR, url_prefix: str = "/static"):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix
+        self._entries: Optional[Dict[str, str]] = None
+
+    @property
+    def entries(self) -> Dict[str, str]:
+        if self._entries is None:
+            try:
+                with open(os.path.join(self.static_dir, BUILD_DIR, MANIFEST_FILE), encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read the asset manifest, serving plain files: {e}")
+                self._entries = {}
+        return self._entries
+
+    def url(self, path: str) -> str:
+        path = path.lstrip("/")
+        target = self.entries.get(path)
+        if target is None:
+            return f"{self.url_prefix}/{path}"
+        return f"{self.url_prefix}/{BUILD_DIR}/{target}"
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles that serves fingerprinted copies as immutable, choosing a
+    precompressed copy by Accept-Encoding. Other files are served as usual,
+    revalidated by ETag and Last-Modified.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD") or not path.startswith(BUILD_DIR + os.sep):
+            return await super().get_response(path, scope)
+
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        media_type = mimetypes.guess_type(path)[0] or "text/plain"
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        for encoding in accepted_encodings(accept_encoding, list(ENCODING_SUFFIXES)):
+            full_path, stat_result = await anyio.to_thread.run_sync(
+                self.lookup_path, path + ENCODING_SUFFIXES[encoding]
+            )
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                headers["Content-Encoding"] = encoding
+                return FileResponse(full_path, stat_result=stat_result, media_type=media_type, headers=headers)
+
+        response = await super().get_response(path, scope)
+        response.headers.update(headers)
+        return response
+
+# Shared manifest used by the templates
+asset_manifest = AssetManifest()
@@ -0,0 +1,179 @@
+# app/services/sync.py
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models.chat import Conversation, ChatMessage
+from ..models.sync import SyncChange
+import logging
+
+logger = logging.getLogger(__name__)
+
+def record_changes(
+    db: Session,
+    user_id: str,
+    conversation_ids: Iterable[str] = (),
+    message_ids: Iterable[int] = (),
+    deleted_conversation_ids: Iterable[str] = ()
+) -> None:
+    """
+    Append entries to a user's change feed.
+
+    Runs in the caller's transaction so the entries commit (or roll back)
+    together with the change itself. Does not commit.
+    """
+    rows = [
+        {"user_id": user_id, "kind": "conversation", "object_id": conversation_id, "deleted": False}
+        for conversation_id in conversation_ids
+    ]
+    rows += [
+        {"user_id": user_id, "kind": "message", "object_id": str(message_id), "deleted": False}
+        for message_id in message_ids
+    ]
+    rows += [
+        {"user_id": user_id, "kind": "conversation", "object_id": conversation_id, "deleted": True}
+        for conversation_id in deleted_conversation_ids
+    ]
+    if rows:
+        db.execute(insert(SyncChange), rows)
+
+def record_conversation_deletes(db: Session, conversation_ids: List[str]) -> None:
+    """Tombstones for conversations about to be deleted, grouped by owner. Does not commit."""
+    owners: Dict[str, List[str]] = {}
+    for conversation_id, user_id in db.query(Conversation.id, Conversation.user_id)\
+            .filter(Conversation.id.in_(conversation_ids)):
+        owners.setdefault(user_id, []).append(conversation_id)
+    for user_id, ids in owners.items():
+        record_changes(db, user_id, deleted_conversation_ids=ids)
+
+def current_cursor(db: Session) -> int:
+    return db.query(func.max(SyncChange.id)).scalar() or 0
+
+def _conversation_payload(conversation: Conversation, last: Optional[ChatMessage]) -> dict:
+    return {
+        "id": conversation.id,
+        "title": conversation.title,
+        "created_at": conversation.created_at,
+        "updated_at": conversation.updated_at,
+        "last_message": last.content if last else None,
+        "last_response": last.response if last and last.response else None
+    }
+
+def _message_payload(message: ChatMessage) -> dict:
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "content": message.content,
+        "response": message.response,
+        "timestamp": message.timestamp
+    }
+
+def changes_since(db: Session, user_id: str, since: Optional[int], limit: int) -> dict:
+    """
+    What changed for a user after cursor ``since``.
+
+    Reads at most ``limit`` feed entries through the (user_id, id) index, so
+    the cost follows the number of changes rather than the size of the
+    history. Several entries for one object collapse into its current state:
+    objects that no longer exist come back as tombstones under ``deleted``.
+
+    ``reset`` is true, with no changes, when the client has no cursor or the
+    entries after its cursor were already purged; it should then reload
+    everything and continue from the returned cursor.
+    """
+    floor = db.query(func.min(SyncChange.id)).scalar()
+    latest = current_cursor(db)
+    # The newest entry is never purged, so ids below the oldest one may be gone
+    if since is None or since > latest or (floor is not None and since < floor - 1):
+        return {
+            "cursor": str(latest),
+            "reset": True,
+            "has_more": False,
+            "conversations": [],
+            "messages": [],
+            "deleted": {"conversations": [], "messages": []}
+        }
+
+    entries = db.query(SyncChange)\
+        .filter(SyncChange.user_id == user_id, SyncChange.id > since)\
+        .order_by(SyncChange.id)\
+        .limit(limit + 1)\
+        .all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    if settings.SYNC_SETTLE_SECONDS and db.get_bind().dialect.name != "sqlite":
+        # Ids are handed out before commit, so a lower id may still become
+        # visible shortly after a higher one. Stop before recent entries and
+        # pick them up on the next sync. (SQLite runs one writer at a time.)
+        settled_before = datetime.now(timezone.utc) - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        for index, entry in enumerate(entries):
+            if entry.created_at is not None and entry.created_at > settled_before:
+                entries = entries[:index]
+                has_more = True
+                break
+
+    conversation_ids = list(dict.fromkeys(e.object_id for e in entries if e.kind == "conversation"))
+    message_ids = list(dict.fromkeys(int(e.object_id) for e in entries if e.kind == "message"))
+
+    conversations = []
+    deleted_conversations = []
+    if conversation_ids:
+        found = {
+            conversation.id: conversation
+            for conversation in db.query(Conversation).filter(
+                Conversation.id.in_(conversation_ids), Conversation.user_id == user_id
+            )
+        }
+        last_ids = db.query(func.max(ChatMessage.id))\
+            .filter(ChatMessage.conversation_id.in_(list(found)))\
+            .group_by(ChatMessage.conversation_id)
+        last_messages = {
+            message.conversation_id: message
+            for message in db.query(ChatMessage).filter(ChatMessage.id.in_(last_ids))
+        }
+        for conversation_id in conversation_ids:
+            if conversation_id in found:
+                conversations.append(_conversation_payload(found[conversation_id], last_messages.get(conversation_id)))
+            else:
+                deleted_conversations.append(conversation_id)
+
+    messages = []
+    deleted_messages = []
+    if message_ids:
+        found_messages = {
+            message.id: message
+            for message in db.query(ChatMessage)
+            .join(Conversation, Conversation.id == ChatMessage.conversation_id)
+            .filter(ChatMessage.id.in_(message_ids), Conversation.user_id == user_id)
+        }
+        for message_id in message_ids:
+            if message_id in found_messages:
+                messages.append(_message_payload(found_messages[message_id]))
+            else:
+                deleted_messages.append(message_id)
+
+    return {
+        "cursor": str(entries[-1].id if entries else since),
+        "reset": False,
+        "has_more": has_more,
+        "conversations": conversations,
+        "messages": messages,
+        "deleted": {"conversations": deleted_conversations, "messages": deleted_messages}
+    }
+
+def purge_sync_changes(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete feed entries older than SYNC_CHANGE_RETENTION_DAYS, keeping the newest one, and commit."""
+    if not settings.SYNC_CHANGE_RETENTION_DAYS:
+        return 0
+    now = now or datetime.now(timezone.utc)
+    newest = current_cursor(db)
+    purged = db.query(SyncChange)\
+        .filter(
+            SyncChange.created_at < now - timedelta(days=settings.SYNC_CHANGE_RETENTION_DAYS),
+            SyncChange.id < newest
+        )\
+        .delete(synchronize_session=False)
+    db.commit()
+    return purged
@@ -0,0 +1,258 @@
+# app/services/transfer.py
+import json
+import uuid
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from ..models.chat import Conversation, ChatMessage
+from .sync import record_changes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Export files are NDJSON: a header line, then every conversation, then every
+# message in id order. Writing messages in primary key order lets the database
+# stream them without sorting, and importers can create all conversations
+# before the first message that refers to them.
+EXPORT_FORMAT_VERSION = 1
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 5000
+DECOMPRESS_PIECE_SIZE = 256 * 1024
+# Invalid lines are skipped; only the first few are reported back
+MAX_REPORTED_ERRORS = 20
+
+class ImportFormatError(Exception):
+    """Raised when an import file cannot be read at all"""
+    pass
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+def export_ndjson(db: Session, user_id: str, username: str) -> Iterator[bytes]:
+    """
+    Yield a user's conversations and messages as NDJSON, one batch at a time.
+
+    Rows are read with a server-side cursor, so memory use does not grow
+    with the size of the history.
+    """
+    header = {
+        "type": "export",
+        "version": EXPORT_FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "username": username
+    }
+    yield (json.dumps(header) + "\n").encode("utf-8")
+
+    conversations = db.query(
+        Conversation.id, Conversation.title, Conversation.created_at, Conversation.updated_at
+    ).filter(Conversation.user_id == user_id)\
+        .order_by(Conversation.created_at, Conversation.id)\
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    lines = []
+    for conv in conversations:
+        lines.append(json.dumps({
+            "type": "conversation",
+            "id": conv.id,
+            "title": conv.title,
+            "created_at": _isoformat(conv.created_at),
+            "updated_at": _isoformat(conv.updated_at)
+        }))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+
+    messages = db.query(
+        ChatMessage.conversation_id, ChatMessage.content, ChatMessage.response, ChatMessage.timestamp
+    ).join(Conversation, Conversation.id == ChatMessage.conversation_id)\
+        .filter(Conversation.user_id == user_id)\
+        .order_by(ChatMessage.id)\
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    for msg in messages:
+        lines.append(json.dumps({
+            "type": "message",
+            "conversation_id": msg.conversation_id,
+            "content": msg.content,
+            "response": msg.response,
+            "timestamp": _isoformat(msg.timestamp)
+        }))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of chunks without holding more than one chunk in memory."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+class LineDecoder:
+    """
+    Split uploaded chunks into lines, gunzipping them first if needed.
+
+    Gzip input is recognised by its magic bytes, so plain and gzipped NDJSON
+    can be sent to the same endpoint. Compressed chunks are inflated a piece
+    at a time, so a small, highly compressed chunk never expands in memory
+    all at once.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._decompressor = None
+        self._started = False
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        if not self._started:
+            self._buffer += chunk
+            if len(self._buffer) < 2:
+                return
+            self._started = True
+            chunk, self._buffer = self._buffer, b""
+            if chunk[:2] == b"\x1f\x8b":
+                self._decompressor = zlib.decompressobj(31)
+        if self._decompressor is None:
+            yield from self._split(chunk)
+            return
+        while chunk:
+            try:
+                data = self._decompressor.decompress(chunk, DECOMPRESS_PIECE_SIZE)
+            except zlib.error as e:
+                raise ImportFormatError(f"Invalid gzip data: {str(e)}")
+            chunk = self._decompressor.unconsumed_tail
+            yield from self._split(data)
+
+    def close(self) -> Iterator[bytes]:
+        if self._decompressor is not None and not self._decompressor.eof:
+            raise ImportFormatError("Truncated gzip data")
+        if self._buffer:
+            yield self._buffer
+        self._buffer = b""
+
+    def _split(self, data: bytes) -> List[bytes]:
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()
+        return lines
+
+class ConversationImporter:
+    """
+    Insert exported conversations for a user in batched transactions.
+
+    Conversations get new ids so an export can be imported next to the
+    original history or into another account. Only the old-to-new id map is
+    kept in memory; messages are written every ``batch_size`` rows.
+    """
+
+    def __init__(self, db: Session, user_id: str, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.line_number = 0
+        self.conversation_ids: Dict[str, str] = {}
+        # Stands in for timestamps missing from the file, so every row in a
+        # batch has the same columns and ids follow the file order
+        self.imported_at = datetime.utcnow()
+        self._conversations: List[dict] = []
+        self._messages: List[dict] = []
+        self.stats = {"conversations": 0, "messages": 0, "skipped": 0, "errors": []}
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self._conversations) + len(self._messages) >= self.batch_size
+
+    def add_line(self, line: bytes) -> None:
+        """Queue one NDJSON line; invalid records are skipped and reported."""
+        self.line_number += 1
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            self._add_record(record)
+        except (ValueError, TypeError) as e:
+            self.stats["skipped"] += 1
+            if len(self.stats["errors"]) < MAX_REPORTED_ERRORS:
+                self.stats["errors"].append(f"Line {self.line_number}: {str(e)}")
+
+    def _add_record(self, record: dict) -> None:
+        record_type = record.get("type")
+        if record_type == "export":
+            version = record.get("version", EXPORT_FORMAT_VERSION)
+            if not isinstance(version, int) or version > EXPORT_FORMAT_VERSION:
+                raise ImportFormatError(f"Unsupported export version: {version}")
+        elif record_type == "conversation":
+            old_id = record.get("id")
+            if not old_id:
+                raise ValueError("conversation without id")
+            new_id = str(uuid.uuid4())
+            self.conversation_ids[old_id] = new_id
+            self._conversations.append({
+                "id": new_id,
+                "title": record.get("title") or "Imported Conversation",
+                "user_id": self.user_id,
+                "version": 1,
+                "created_at": _parse_datetime(record.get("created_at")) or self.imported_at,
+                "updated_at": _parse_datetime(record.get("updated_at")) or self.imported_at
+            })
+        elif record_type == "message":
+            conversation_id = self.conversation_ids.get(record.get("conversation_id"))
+            if conversation_id is None:
+                raise ValueError("message for unknown conversation")
+            content = record.get("content")
+            if not isinstance(content, str):
+                raise ValueError("message without content")
+            response = record.get("response")
+            self._messages.append({
+                "conversation_id": conversation_id,
+                "content": content,
+                "response": response if isinstance(response, str) else None,
+                "timestamp": _parse_datetime(record.get("timestamp")) or self.imported_at
+            })
+        else:
+            raise ValueError(f"unknown record type {record_type!r}")
+
+    def flush(self) -> None:
+        """Write queued rows in one transaction, conversations first."""
+        if not self._conversations and not self._messages:
+            return
+        try:
+            if self._conversations:
+                self.db.execute(insert(Conversation), self._conversations)
+            if self._messages:
+                self.db.execute(insert(ChatMessage), self._messages)
+            # Other devices see the new conversations; messages load when opened
+            record_changes(self.db, self.user_id, conversation_ids=dict.fromkeys(
+                [row["id"] for row in self._conversations] + [row["conversation_id"] for row in self._messages]
+            ))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self.stats["conversations"] += len(self._conversations)
+        self.stats["messages"] += len(self._messages)
+        self._conversations = []
+        self._messages = []
+
+    def finish(self) -> Dict:
+        """Write any remaining rows and return the import summary."""
+        self.flush()
+        logger.info(
+            f"Imported {self.stats['conversations']} conversations and {self.stats['messages']} messages "
+            f"for user {self.user_id} ({self.stats['skipped']} lines skipped)"
+        )
+        return self.stats
@@ -0,0 +1,480 @@
+# app/services/usage.py
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal, dialect_insert
+from ..models.usage import UsageEvent, UsageRollup, UsageRollupState
+from ..models.user import User, Task, user_tasks
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets; one more bucket holds the rest
+LATENCY_BUCKETS_MS = [
+    50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000,
+    5000, 7500, 10000, 15000, 20000, 30000, 60000, 120000
+]
+PERIODS = ("hour", "day")
+COUNT_FIELDS = ("requests", "errors", "prompt_tokens", "completion_tokens", "duration_ms")
+ROLLUP_BATCH_SIZE = 5000
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timezone-aware columns back as naive UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def bucket_start(value: datetime, period: str) -> datetime:
+    value = _as_utc(value).replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if period == "day" else value
+
+def empty_histogram() -> List[int]:
+    return [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+def add_to_histogram(histogram: List[int], value_ms: Optional[int]) -> None:
+    if value_ms is not None:
+        histogram[bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+
+def merge_histograms(target: List[int], other: List[int]) -> None:
+    for i, count in enumerate(other):
+        target[i] += count
+
+def histogram_percentile(histogram: List[int], percentile: float) -> Optional[int]:
+    """Upper bound of the bucket holding the percentile; None without samples."""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = percentile / 100 * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if count and seen >= rank:
+            return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)]
+    return LATENCY_BUCKETS_MS[-1]
+
+def write_events(db: Session, events: List[dict]) -> None:
+    """Insert a batch of usage events in one statement. Commits."""
+    if events:
+        db.execute(insert(UsageEvent), events)
+        db.commit()
+
+class UsageRecorder:
+    """
+    Buffers usage events in memory and writes them in batches.
+
+    ``record`` only appends to a deque, so the chat stream never waits for
+    the database. A background task flushes every ``flush_seconds`` or as
+    soon as ``flush_batch`` events are waiting. If the database falls behind,
+    the buffer is capped at ``max_buffer`` events and the oldest are dropped
+    (and counted) rather than growing without bound.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_seconds: float = 2.0,
+        flush_batch: int = 200,
+        max_buffer: int = 10000
+    ):
+        self.session_factory = session_factory
+        self.flush_seconds = flush_seconds
+        self.flush_batch = flush_batch
+        self._buffer = deque(maxlen=max_buffer)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(
+        self,
+        user_id: str,
+        model: str,
+        status: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        ttft_ms: Optional[int] = None,
+        duration_ms: int = 0,
+        conversation_id: Optional[str] = None
+    ) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append({
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "model": model,
+            "status": status,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "ttft_ms": ttft_ms,
+            "duration_ms": duration_ms,
+            "created_at": datetime.now(timezone.utc)
+        })
+        if self._wakeup is not None and len(self._buffer) >= self.flush_batch:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of events written."""
+        events = []
+        while self._buffer:
+            events.append(self._buffer.popleft())
+        if not events:
+            return 0
+        db = self.session_factory()
+        try:
+            write_events(db, events)
+        except Exception:
+            db.rollback()
+            # Put them back for the next attempt, oldest first
+            self._buffer.extendleft(reversed(events))
+            raise
+        finally:
+            db.close()
+        self.written += len(events)
+        return len(events)
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wakeup = None
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            logger.error(f"Could not write {len(self._buffer)} usage events on shutdown: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Writing usage events failed: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"buffered": len(self._buffer), "written": self.written, "dropped": self.dropped}
+
+def _claim_rollup_state(db: Session) -> UsageRollupState:
+    """
+    The watermark row, locked until the transaction ends.
+
+    Every worker runs the rollup schedule; the lock makes them take turns,
+    so no event is counted twice. On SQLite the INSERT takes the database
+    write lock, which does the same.
+    """
+    db.execute(
+        dialect_insert(db)(UsageRollupState)
+        .values(name="usage", last_event_id=0)
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    return db.query(UsageRollupState)\
+        .filter(UsageRollupState.name == "usage")\
+        .populate_existing()\
+        .with_for_update()\
+        .one()
+
+def settled_events(
+    events: List[UsageEvent], settle_seconds: float, now: Optional[datetime] = None
+) -> Tuple[List[UsageEvent], bool]:
+    """
+    The events up to the first one written too recently to be sure no lower
+    id is still uncommitted, and whether any were held back.
+    """
+    if not settle_seconds:
+        return events, False
+    settled_before = (now or datetime.now(timezone.utc)) - timedelta(seconds=settle_seconds)
+    for index, event in enumerate(events):
+        if event.written_at is not None and _as_utc(event.written_at) > settled_before:
+            return events[:index], True
+    return events, False
+
+def rollup_usage(db: Session, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """
+    Add usage events not yet rolled up to the hourly and daily rollups.
+
+    Events are read by id after a stored watermark, so late writes from the
+    buffered recorder still land in the right hour. Each batch runs with the
+    watermark row locked and adds its counts in the database, so workers
+    rolling up at the same time neither double count nor lose updates.
+    Returns the number of events processed. Commits after every batch.
+    """
+    processed = 0
+    insert_rollup = dialect_insert(db)
+    # SQLite runs one writer at a time, so its ids become visible in order
+    settle_seconds = 0 if db.get_bind().dialect.name == "sqlite" else settings.USAGE_ROLLUP_SETTLE_SECONDS
+    while True:
+        state = _claim_rollup_state(db)
+        events = db.query(UsageEvent)\
+            .filter(UsageEvent.id > state.last_event_id)\
+            .order_by(UsageEvent.id)\
+            .limit(batch_size)\
+            .all()
+        events, held_back = settled_events(events, settle_seconds)
+        if not events:
+            db.commit()
+            break
+
+        totals: Dict[Tuple, dict] = {}
+        for event in events:
+            for period in PERIODS:
+                key = (period, bucket_start(event.created_at, period), event.user_id, event.model)
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = {
+                        "requests": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                        "duration_ms": 0, "ttft_histogram": empty_histogram(),
+                        "duration_histogram": empty_histogram()
+                    }
+                total["requests"] += 1
+                total["errors"] += event.status == "error"
+                total["prompt_tokens"] += event.prompt_tokens or 0
+                total["completion_tokens"] += event.completion_tokens or 0
+                total["duration_ms"] += event.duration_ms or 0
+                add_to_histogram(total["ttft_histogram"], event.ttft_ms)
+                add_to_histogram(total["duration_histogram"], event.duration_ms)
+
+        # Histograms are JSON text and merged here; the lock keeps that safe
+        existing = {
+            (row.period, bucket_start(row.bucket_start, row.period), row.user_id, row.model): row
+            for row in db.query(
+                UsageRollup.period, UsageRollup.bucket_start, UsageRollup.user_id, UsageRollup.model,
+                UsageRollup.ttft_histogram, UsageRollup.duration_histogram
+            ).filter(
+                UsageRollup.period.in_(PERIODS),
+                UsageRollup.bucket_start.in_({key[1] for key in totals}),
+                UsageRollup.user_id.in_({key[2] for key in totals})
+            )
+        }
+        rows = []
+        for key, total in totals.items():
+            period, start, user_id, model = key
+            row = {"period": period, "bucket_start": start, "user_id": user_id, "model": model}
+            row.update({field: total[field] for field in COUNT_FIELDS})
+            for field in ("ttft_histogram", "duration_histogram"):
+                histogram = total[field]
+                if key in existing:
+                    merge_histograms(histogram, json.loads(getattr(existing[key], field)) or empty_histogram())
+                row[field] = json.dumps(histogram)
+            rows.append(row)
+
+        statement = insert_rollup(UsageRollup)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["period", "bucket_start", "user_id", "model"],
+            set_={
+                **{field: getattr(UsageRollup, field) + getattr(statement.excluded, field) for field in COUNT_FIELDS},
+                "ttft_histogram": statement.excluded.ttft_histogram,
+                "duration_histogram": statement.excluded.duration_histogram
+            }
+        ), rows)
+
+        state.last_event_id = events[-1].id
+        db.commit()
+        processed += len(events)
+        if held_back:
+            break
+    return processed
+
+def purge_usage_events(db: Session, older_than_days: int, now: Optional[datetime] = None) -> int:
+    """Delete raw events that are both rolled up and older than the limit. Commits."""
+    if older_than_days <= 0:
+        return 0
+    state = db.query(UsageRollupState).filter(UsageRollupState.name == "usage").first()
+    if state is None:
+        return 0
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=older_than_days)
+    deleted = db.query(UsageEvent)\
+        .filter(UsageEvent.id <= state.last_event_id, UsageEvent.created_at < cutoff)\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def run_usage_rollup() -> Dict[str, int]:
+    """Roll up and trim usage with a session of its own (for the scheduler)."""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        stats = {
+            "rolled_up": rollup_usage(db),
+            "purged": purge_usage_events(db, settings.USAGE_EVENT_RETENTION_DAYS)
+        }
+    finally:
+        db.close()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Usage rollup finished: {stats}")
+    return stats
+
+class UsageRollupScheduler:
+    """Runs the usage rollup every ``interval_minutes`` in a worker thread."""
+
+    def __init__(self, interval_minutes: int):
+        self.interval_minutes = interval_minutes
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval_minutes <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Usage rollup scheduled every {self.interval_minutes} minutes")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_minutes * 60)
+            try:
+                await asyncio.to_thread(run_usage_rollup)
+            except Exception as e:
+                logger.error(f"Usage rollup failed: {str(e)}")
+
+def _rollup_window(period: str, periods: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest of the last ``periods`` buckets, the current one included."""
+    step = timedelta(days=1) if period == "day" else timedelta(hours=1)
+    return bucket_start(now or datetime.now(timezone.utc), period) - step * (periods - 1)
+
+def top_users(
+    db: Session,
+    period: str = "day",
+    periods: int = 7,
+    order_by: str = "completion_tokens",
+    limit: int = 10,
+    now: Optional[datetime] = None
+) -> List[dict]:
+    """Heaviest users over the window, read from the rollups only."""
+    sums = [
+        func.sum(UsageRollup.requests).label("requests"),
+        func.sum(UsageRollup.errors).label("errors"),
+        func.sum(UsageRollup.prompt_tokens).label("prompt_tokens"),
+        func.sum(UsageRollup.completion_tokens).label("completion_tokens"),
+        func.sum(UsageRollup.duration_ms).label("duration_ms")
+    ]
+    order_column = {column.name: column for column in sums}[order_by]
+    rows = db.query(UsageRollup.user_id, User.username, *sums)\
+        .outerjoin(User, User.id == UsageRollup.user_id)\
+        .filter(
+            UsageRollup.period == period,
+            UsageRollup.bucket_start >= _rollup_window(period, periods, now)
+        )\
+        .group_by(UsageRollup.user_id, User.username)\
+        .order_by(order_column.desc())\
+        .limit(limit)\
+        .all()
+    return [
+        {
+            "user_id": row.user_id,
+            "username": row.username,
+            "requests": row.requests or 0,
+            "errors": row.errors or 0,
+            "prompt_tokens": row.prompt_tokens or 0,
+            "completion_tokens": row.completion_tokens or 0,
+            "duration_ms": row.duration_ms or 0
+        }
+        for row in rows
+    ]
+
+def latency_percentiles(
+    db: Session,
+    period: str = "day",
+    periods: int = 7,
+    user_id: Optional[str] = None,
+    model: Optional[str] = None,
+    now: Optional[datetime] = None
+) -> dict:
+    """p50/p90/p99 time to first token and duration, merged from rollup histograms."""
+    query = db.query(UsageRollup.requests, UsageRollup.ttft_histogram, UsageRollup.duration_histogram)\
+        .filter(
+            UsageRollup.period == period,
+            UsageRollup.bucket_start >= _rollup_window(period, periods, now)
+        )
+    if user_id:
+        query = query.filter(UsageRollup.user_id == user_id)
+    if model:
+        query = query.filter(UsageRollup.model == model)
+
+    requests = 0
+    ttft = empty_histogram()
+    duration = empty_histogram()
+    for row in query:
+        requests += row.requests
+        merge_histograms(ttft, json.loads(row.ttft_histogram) or empty_histogram())
+        merge_histograms(duration, json.loads(row.duration_histogram) or empty_histogram())
+    return {
+        "requests": requests,
+        "ttft_ms": {f"p{p}": histogram_percentile(ttft, p) for p in (50, 90, 99)},
+        "duration_ms": {f"p{p}": histogram_percentile(duration, p) for p in (50, 90, 99)}
+    }
+
+def usage_by_task(
+    db: Session,
+    period: str = "day",
+    periods: int = 7,
+    now: Optional[datetime] = None
+) -> List[dict]:
+    """
+    Usage per Task, counting each user's usage towards every task they have.
+
+    Generations aren't tagged with a task, so a task's usage is that of the
+    users assigned to it.
+    """
+    rows = db.query(
+        Task.id, Task.name,
+        func.count(func.distinct(UsageRollup.user_id)).label("users"),
+        func.sum(UsageRollup.requests).label("requests"),
+        func.sum(UsageRollup.prompt_tokens).label("prompt_tokens"),
+        func.sum(UsageRollup.completion_tokens).label("completion_tokens")
+    ).join(user_tasks, user_tasks.c.task_id == Task.id)\
+        .join(UsageRollup, UsageRollup.user_id == user_tasks.c.user_id)\
+        .filter(
+            UsageRollup.period == period,
+            UsageRollup.bucket_start >= _rollup_window(period, periods, now)
+        )\
+        .group_by(Task.id, Task.name)\
+        .order_by(func.sum(UsageRollup.completion_tokens).desc())\
+        .all()
+    return [
+        {
+            "task_id": row.id,
+            "task": row.name,
+            "users": row.users,
+            "requests": row.requests or 0,
+            "prompt_tokens": row.prompt_tokens or 0,
+            "completion_tokens": row.completion_tokens or 0
+        }
+        for row in rows
+    ]
+
+# Shared per-process recorder and rollup schedule
+usage_recorder = UsageRecorder(
+    flush_seconds=settings.USAGE_FLUSH_SECONDS,
+    flush_batch=settings.USAGE_FLUSH_BATCH,
+    max_buffer=settings.USAGE_BUFFER_SIZE
+)
+usage_rollup_scheduler = UsageRollupScheduler(settings.USAGE_ROLLUP_INTERVAL_MINUTES)
@@ -0,0 +1,162 @@
+# app/services/user_directory.py
+import base64
+import json
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.orm import Session, selectinload
+from ..config import settings
+from ..models.user import User
+from .search import build_match_query, build_tsquery, POSTGRES_USER_DOCUMENT
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Search results are counted up to this many; beyond it the total is a lower bound
+SEARCH_COUNT_LIMIT = 1000
+
+class CachedCount:
+    """
+    A row count cached for ``ttl_seconds``.
+
+    Used for the unfiltered user total, which the admin list shows on every
+    page. Creating or deleting users invalidates it in this worker; other
+    workers catch up within the TTL.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._value: Optional[int] = None
+        self._expires_at = 0.0
+        self._lock = Lock()
+
+    def get(self, load: Callable[[], int]) -> int:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+        value = load()
+        with self._lock:
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+
+user_count = CachedCount(settings.USER_COUNT_CACHE_SECONDS)
+
+def encode_cursor(username: str, direction: str) -> str:
+    """Opaque keyset cursor: the username to continue from and which way."""
+    raw = json.dumps({"u": username, "d": direction}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        username, direction = data["u"], data["d"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(username, str) or direction not in ("next", "prev"):
+        raise ValueError("Invalid cursor")
+    return username, direction
+
+def _search_condition(db: Session, search: str):
+    """
+    WHERE clause for users matching every word of ``search`` as a prefix.
+
+    Uses the users_fts table on SQLite and the GIN index on PostgreSQL.
+    Falls back to substring ILIKE where neither exists.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+    ).first():
+        match_query = build_match_query(search, prefix_all=True)
+        if match_query:
+            return literal_column("users.rowid").in_(
+                select(literal_column("rowid"))
+                .select_from(text("users_fts"))
+                .where(text("users_fts MATCH :user_match"))
+            ), {"user_match": match_query}
+    elif dialect == "postgresql":
+        tsquery = build_tsquery(search, prefix_all=True)
+        if tsquery:
+            return text(f"{POSTGRES_USER_DOCUMENT} @@ to_tsquery('simple', :user_tsquery)"), \
+                {"user_tsquery": tsquery}
+
+    search_term = f"%{search}%"
+    return (
+        (User.username.ilike(search_term)) |
+        (User.email.ilike(search_term)) |
+        (User.full_name.ilike(search_term))
+    ), {}
+
+def list_users(
+    db: Session,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 10
+) -> Dict:
+    """
+    One page of users ordered by username, plus cursors for its neighbours.
+
+    With a cursor the page is found by keyset (``username > last seen``)
+    through the username index, so every page costs the same. Without one,
+    ``page`` is honoured with OFFSET for older clients. Roles and tasks are
+    loaded with one extra query each for the page only.
+
+    The total is cached when unfiltered and counted up to
+    ``SEARCH_COUNT_LIMIT`` when searching (``total_exact`` is then False).
+    """
+    query = db.query(User)
+    params = {}
+    if search:
+        condition, params = _search_condition(db, search)
+        query = query.filter(condition).params(**params)
+
+    direction = "next"
+    if cursor:
+        after, direction = decode_cursor(cursor)
+        if direction == "next":
+            query = query.filter(User.username > after).order_by(User.username)
+        else:
+            query = query.filter(User.username < after).order_by(User.username.desc())
+    else:
+        query = query.order_by(User.username).offset((page - 1) * page_size)
+
+    users: List[User] = query.options(
+        selectinload(User.roles),
+        selectinload(User.tasks)
+    ).limit(page_size + 1).all()
+    has_more = len(users) > page_size
+    users = users[:page_size]
+    if direction == "prev":
+        users.reverse()
+
+    if direction == "next":
+        has_next, has_prev = has_more, bool(cursor) or page > 1
+    else:
+        has_next, has_prev = True, has_more
+    next_cursor = encode_cursor(users[-1].username, "next") if users and has_next else None
+    prev_cursor = encode_cursor(users[0].username, "prev") if users and has_prev else None
+
+    if search:
+        matches = db.query(User.id).filter(condition).params(**params).limit(SEARCH_COUNT_LIMIT + 1).subquery()
+        total = db.query(func.count()).select_from(matches).scalar()
+        total_exact = total <= SEARCH_COUNT_LIMIT
+        total = min(total, SEARCH_COUNT_LIMIT)
+    else:
+        total = user_count.get(lambda: db.query(func.count(User.id)).scalar())
+        total_exact = True
+
+    return {
+        "users": users,
+        "total": total,
+        "total_exact": total_exact,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
+    }
@@ -0,0 +1,316 @@
+# app/services/user_import.py
+import csv
+import io
+import json
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, selectinload
+from ..auth.hashing import password_hasher
+from ..auth.principal import principal_cache
+from ..auth.refresh import revoke_user_tokens
+from ..config import settings
+from ..models.user import User, Role, Task
+from ..schemas.admin import BulkUserRow
+from .user_directory import user_count
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Separator for roles and tasks inside one CSV cell
+CSV_LIST_SEPARATOR = ";"
+# Keeps IN lists below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 400
+
+STATUS_BY_ACTION = {"create": "created", "update": "updated", "deactivate": "deactivated"}
+
+class BulkImportError(Exception):
+    """Raised when an upload cannot be read at all."""
+    pass
+
+class BulkImportTooLarge(BulkImportError):
+    """Raised when an upload has more rows than BULK_USER_MAX_ROWS."""
+    pass
+
+def parse_upload(body: bytes, content_type: str) -> List[dict]:
+    """
+    Raw rows from a JSON or CSV upload.
+
+    JSON is a list of row objects or ``{"users": [...]}``. CSV needs a header
+    with the BulkUserRow field names; roles and tasks are separated by
+    semicolons and empty cells count as missing.
+    """
+    try:
+        text_body = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise BulkImportError("Upload must be UTF-8")
+
+    if "csv" in (content_type or ""):
+        rows = []
+        for record in csv.DictReader(io.StringIO(text_body)):
+            row = {
+                key.strip(): value.strip()
+                for key, value in record.items()
+                if key and isinstance(value, str) and value.strip()
+            }
+            for field in ("roles", "tasks"):
+                if field in row:
+                    row[field] = [item.strip() for item in row[field].split(CSV_LIST_SEPARATOR) if item.strip()]
+            rows.append(row)
+    else:
+        try:
+            data = json.loads(text_body)
+        except ValueError as e:
+            raise BulkImportError(f"Invalid JSON: {str(e)}")
+        rows = data.get("users") if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise BulkImportError('Body must be a list of users or {"users": [...]}')
+
+    if len(rows) > settings.BULK_USER_MAX_ROWS:
+        raise BulkImportTooLarge(f"At most {settings.BULK_USER_MAX_ROWS} rows per upload")
+    return rows
+
+def _chunks(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _error(index: int, raw, message: str) -> dict:
+    raw = raw if isinstance(raw, dict) else {}
+    return {
+        "row": index + 1,
+        "username": raw.get("username") if isinstance(raw.get("username"), str) else None,
+        "action": raw.get("action") if isinstance(raw.get("action"), str) else None,
+        "status": "error",
+        "id": None,
+        "error": message
+    }
+
+def _describe(error: ValidationError) -> str:
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+def _existing_users(db: Session, usernames: Set[str], emails: Set[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Ids of the given usernames that exist, and the owners of the given emails, in a few IN queries."""
+    ids_by_username: Dict[str, str] = {}
+    owner_by_email: Dict[str, str] = {}
+    for chunk in _chunks(sorted(usernames), LOOKUP_CHUNK_SIZE):
+        for user_id, username in db.query(User.id, User.username).filter(User.username.in_(chunk)):
+            ids_by_username[username] = user_id
+    for chunk in _chunks(sorted(emails), LOOKUP_CHUNK_SIZE):
+        for username, email in db.query(User.username, User.email).filter(User.email.in_(chunk)):
+            owner_by_email[email] = username
+    return ids_by_username, owner_by_email
+
+def _name_index(db: Session, model) -> Dict[str, str]:
+    """Map both ids and names of roles or tasks to ids; both tables are small."""
+    index = {}
+    for item_id, name in db.query(model.id, model.name):
+        index[name] = item_id
+        index[item_id] = item_id
+    return index
+
+def _resolve(values: Optional[List[str]], index: Dict[str, str], kind: str) -> Optional[List[str]]:
+    if values is None:
+        return None
+    unknown = [value for value in values if value not in index]
+    if unknown:
+        raise ValueError(f"Unknown {kind}: {', '.join(unknown)}")
+    return list(dict.fromkeys(index[value] for value in values))
+
+def validate_rows(db: Session, raw_rows: List, current_user_id: str) -> Tuple[List[dict], List[dict]]:
+    """
+    Check every row against the database and the rest of the upload.
+
+    Existing usernames and emails are fetched for the whole upload at once
+    rather than queried row by row. Returns the plans for valid rows and
+    error results for the others.
+    """
+    parsed = []
+    errors = []
+    for index, raw in enumerate(raw_rows):
+        try:
+            parsed.append((index, raw, BulkUserRow.model_validate(raw)))
+        except ValidationError as e:
+            errors.append(_error(index, raw, _describe(e)))
+
+    ids_by_username, owner_by_email = _existing_users(
+        db,
+        {row.username for _, _, row in parsed},
+        {row.email for _, _, row in parsed if row.email}
+    )
+    role_index = _name_index(db, Role)
+    task_index = _name_index(db, Task)
+
+    plans = []
+    seen_usernames: Set[str] = set()
+    claimed_emails: Dict[str, str] = {}
+    for index, raw, row in parsed:
+        try:
+            if row.username in seen_usernames:
+                raise ValueError("Username appears more than once in the upload")
+            seen_usernames.add(row.username)
+
+            user_id = ids_by_username.get(row.username)
+            if row.action == "create":
+                if user_id:
+                    raise ValueError("Username already registered")
+                if not (row.email and row.full_name and row.password):
+                    raise ValueError("email, full_name and password are required to create a user")
+                user_id = str(uuid.uuid4())
+            elif not user_id:
+                raise ValueError("User not found")
+            elif row.action == "deactivate" and user_id == current_user_id:
+                raise ValueError("Cannot deactivate your own account")
+
+            if row.email and row.action != "deactivate":
+                owner = owner_by_email.get(row.email, claimed_emails.get(row.email))
+                if owner is not None and owner != row.username:
+                    raise ValueError("Email already registered")
+                claimed_emails[row.email] = row.username
+
+            plans.append({
+                "index": index,
+                "row": row,
+                "user_id": user_id,
+                "role_ids": _resolve(row.roles, role_index, "roles"),
+                "task_ids": _resolve(row.tasks, task_index, "tasks"),
+                "hashed_password": None
+            })
+        except ValueError as e:
+            errors.append(_error(index, raw, str(e)))
+    return plans, errors
+
+def _apply(db: Session, plans: List[dict]) -> None:
+    """Stage the changes for a group of plans in the session. Does not commit."""
+    existing_ids = [plan["user_id"] for plan in plans if plan["row"].action != "create"]
+    users = {}
+    if existing_ids:
+        users = {
+            user.id: user
+            for user in db.query(User).options(
+                selectinload(User.roles),
+                selectinload(User.tasks)
+            ).filter(User.id.in_(existing_ids))
+        }
+    roles = {role.id: role for role in db.query(Role)}
+    tasks = {task.id: task for task in db.query(Task)}
+
+    for plan in plans:
+        row = plan["row"]
+        if row.action == "create":
+            user = User(
+                id=plan["user_id"],
+                username=row.username,
+                email=row.email,
+                full_name=row.full_name,
+                hashed_password=plan["hashed_password"],
+                is_active=row.is_active if row.is_active is not None else True
+            )
+            db.add(user)
+        else:
+            user = users.get(plan["user_id"])
+            if user is None:
+                raise ValueError("User not found")
+            if row.action == "deactivate":
+                user.is_active = False
+                revoke_user_tokens(db, user.id)
+                continue
+            if row.email:
+                user.email = row.email
+            if row.full_name is not None:
+                user.full_name = row.full_name
+            if plan["hashed_password"]:
+                user.hashed_password = plan["hashed_password"]
+            if row.is_active is not None:
+                user.is_active = row.is_active
+            if plan["hashed_password"] or row.is_active is False:
+                revoke_user_tokens(db, user.id)
+
+        if plan["role_ids"] is not None:
+            user.roles = [roles[role_id] for role_id in plan["role_ids"]]
+        if plan["task_ids"] is not None:
+            user.tasks = [tasks[task_id] for task_id in plan["task_ids"]]
+
+def _result(plan: dict) -> dict:
+    row = plan["row"]
+    return {
+        "row": plan["index"] + 1,
+        "username": row.username,
+        "action": row.action,
+        "status": STATUS_BY_ACTION[row.action],
+        "id": plan["user_id"],
+        "error": None
+    }
+
+def write_plans(db: Session, plans: List[dict], chunk_size: int) -> List[dict]:
+    """
+    Apply the plans, committing every ``chunk_size`` rows.
+
+    If a chunk fails (for example a username taken since validation), it is
+    rolled back and retried one row at a time so only the offending rows
+    are reported as errors.
+    """
+    results = []
+    for chunk in _chunks(plans, max(chunk_size, 1)):
+        try:
+            _apply(db, chunk)
+            db.commit()
+            results.extend(_result(plan) for plan in chunk)
+            continue
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Bulk user chunk failed, retrying row by row: {str(e)}")
+
+        for plan in chunk:
+            try:
+                _apply(db, [plan])
+                db.commit()
+                results.append(_result(plan))
+            except Exception as e:
+                db.rollback()
+                results.append(_error(plan["index"], {
+                    "username": plan["row"].username,
+                    "action": plan["row"].action
+                }, str(e)))
+    return results
+
+async def import_users(db: Session, raw_rows: List, current_user_id: str) -> dict:
+    """
+    Create, update and deactivate users from parsed upload rows.
+
+    Rows are validated together, passwords are hashed in parallel in the
+    bulk process pool, and changes are committed in chunks of
+    BULK_USER_CHUNK_SIZE. Returns counts and one result per row.
+    """
+    plans, results = validate_rows(db, raw_rows, current_user_id)
+    # Don't hold a pooled connection while the passwords are hashed
+    db.rollback()
+
+    to_hash = [plan for plan in plans if plan["row"].password and plan["row"].action != "deactivate"]
+    hashes = await password_hasher.hash_many([plan["row"].password for plan in to_hash])
+    for plan, hashed_password in zip(to_hash, hashes):
+        plan["hashed_password"] = hashed_password
+
+    results.extend(write_plans(db, plans, settings.BULK_USER_CHUNK_SIZE))
+    results.sort(key=lambda result: result["row"])
+
+    counts = {status: 0 for status in ("created", "updated", "deactivated", "error")}
+    for result in results:
+        counts[result["status"]] += 1
+        if result["status"] in ("updated", "deactivated"):
+            principal_cache.invalidate(result["username"])
+    if counts["created"]:
+        user_count.invalidate()
+
+    logger.info(
+        f"Bulk user import: {counts['created']} created, {counts['updated']} updated, "
+        f"{counts['deactivated']} deactivated, {counts['error']} failed"
+    )
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "deactivated": counts["deactivated"],
+        "failed": counts["error"],
+        "results": results
+    }
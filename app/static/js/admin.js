@@ -2,8 +2,12 @@
 $(document).ready(function() {
         
     let currentPage = 1;
-    const pageSize = 10;
+    let pageSize = 10;
     let totalPages = 1;
+    let currentSearch = '';
+    // Keyset cursors returned with the current page
+    let nextCursor = null;
+    let prevCursor = null;
     const userModal = new bootstrap.Modal('#userModal');
     const token = sessionStorage.getItem('token');
     let editingUserId = null;
@@ -16,7 +20,7 @@ $(document).ready(function() {
     // Set up AJAX defaults with token
     $.ajaxSetup({
         beforeSend: function(xhr) {
-            xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+            xhr.setRequestHeader('Authorization', `Bearer ${sessionStorage.getItem('token')}`);
         }
     });
 
@@ -73,10 +77,13 @@ $(document).ready(function() {
     // Initialize by loading user info and data
     async function initialize() {
         try {
+            // Renew the access token first if it expired while the page was closed
+            await authUtils.ensureFreshToken();
+
             // Check auth and admin status
             const response = await fetch('/api/auth/me', {
                 headers: {
-                    'Authorization': `Bearer ${token}`
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`
                 }
             });
 
@@ -106,7 +113,7 @@ $(document).ready(function() {
         } catch (error) {
             console.error('Initialization error:', error);
             if (error.message === 'Authentication expired') {
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification('Error initializing admin panel', 'error');
@@ -120,12 +127,12 @@ $(document).ready(function() {
             const [rolesResponse, tasksResponse] = await Promise.all([
                 fetch('/api/admin/roles', {
                     headers: {
-                        'Authorization': `Bearer ${token}`
+                        'Authorization': `Bearer ${sessionStorage.getItem('token')}`
                     }
                 }),
                 fetch('/api/admin/tasks', {
                     headers: {
-                        'Authorization': `Bearer ${token}`
+                        'Authorization': `Bearer ${sessionStorage.getItem('token')}`
                     }
                 })
             ]);
@@ -173,17 +180,18 @@ $(document).ready(function() {
     }
 
     // Load users table with error handling
-    async function loadUsers(page = 1, pageSize = 10, search = '') {
+    async function loadUsers(page = 1, size = pageSize, search = currentSearch, cursor = null) {
         try {
             const queryParams = new URLSearchParams({
                 page: page,
-                page_size: pageSize,
-                ...(search && { search: search })
+                page_size: size,
+                ...(search && { search: search }),
+                ...(cursor && { cursor: cursor })
             });
 
             const response = await fetch(`/api/admin/users?${queryParams}`, {
                 headers: {
-                    'Authorization': `Bearer ${token}`
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`
                 }
             });
 
@@ -194,12 +202,15 @@ $(document).ready(function() {
             const data = await response.json();
             currentPage = data.page;
             totalPages = data.total_pages;
+            currentSearch = search;
+            nextCursor = data.next_cursor;
+            prevCursor = data.prev_cursor;
 
-            // Update pagination UI
+            // Update pagination UI (large searches are only counted up to a limit)
             $('#current-page').text(currentPage);
-            $('#total-pages').text(totalPages);
-            $('#prev-page').prop('disabled', currentPage <= 1);
-            $('#next-page').prop('disabled', currentPage >= totalPages);
+            $('#total-pages').text(data.total_exact ? totalPages : `${totalPages}+`);
+            $('#prev-page').prop('disabled', !prevCursor);
+            $('#next-page').prop('disabled', !nextCursor);
 
             const tbody = $('#users-table tbody');
             tbody.empty();
@@ -244,21 +255,21 @@ $(document).ready(function() {
 
     // Add pagination event handlers
     $('#prev-page').on('click', function() {
-        if (currentPage > 1) {
-            loadUsers(currentPage - 1, pageSize);
+        if (prevCursor) {
+            loadUsers(Math.max(currentPage - 1, 1), pageSize, currentSearch, prevCursor);
         }
     });
 
     $('#next-page').on('click', function() {
-        if (currentPage < totalPages) {
-            loadUsers(currentPage + 1, pageSize);
+        if (nextCursor) {
+            loadUsers(currentPage + 1, pageSize, currentSearch, nextCursor);
         }
     });
 
     $('#page-size').on('change', function() {
         pageSize = parseInt($(this).val());
         currentPage = 1;  // Reset to first page when changing page size
-        loadUsers(currentPage, pageSize);
+        loadUsers(currentPage, pageSize, currentSearch);
     });
 
     // Add search functionality
@@ -312,7 +323,7 @@ $(document).ready(function() {
                 method: method,
                 headers: {
                     'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`  // Add token to request
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`  // Add token to request
                 },
                 body: JSON.stringify(userData)
             });
@@ -334,7 +345,7 @@ $(document).ready(function() {
         } catch (error) {
             console.error('Error saving user:', error);
             if (error.message === 'Authentication expired') {
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification(error.message || 'Failed to save user', 'error');
@@ -359,7 +370,7 @@ $(document).ready(function() {
         try {
             const response = await fetch(`/api/admin/users/${editingUserId}`, {
                 headers: {
-                    'Authorization': `Bearer ${token}`  // Add token to request
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`  // Add token to request
                 }
             });
     
@@ -410,7 +421,7 @@ $(document).ready(function() {
         } catch (error) {
             console.error('Error loading user:', error);
             if (error.message === 'Authentication expired') {
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification('Failed to load user details', 'error');
@@ -480,7 +491,7 @@ $(document).ready(function() {
     // Logout button
     $('#logout-button').on('click', function() {
         if (confirm('Are you sure you want to logout?')) {
-            sessionStorage.removeItem('token');
+            authUtils.logout();
             showNotification('Logged out successfully', 'success');
             setTimeout(() => {
                 window.location.href = '/login';
@@ -493,7 +504,7 @@ $(document).ready(function() {
         console.error('Error:', error);
         if (error.status === 401) {
             showNotification('Session expired. Please login again.', 'error');
-            sessionStorage.removeItem('token');
+            authUtils.clearTokens();
             setTimeout(() => {
                 window.location.href = '/login';
             }, 1000);
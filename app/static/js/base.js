@@ -1,4 +1,139 @@
 // app/static/js/base.js
+
+// Session handling shared by all pages. The access token lives for 30
+// minutes; shortly before it expires it is swapped for a new one using the
+// refresh token, so active users are not sent back to the login page.
+window.authUtils = (function() {
+    // Refresh this many seconds before the access token expires
+    const REFRESH_MARGIN_SECONDS = 60;
+    let refreshTimer = null;
+    let refreshPromise = null;
+
+    function tokenPayload(token) {
+        try {
+            return JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+        } catch (e) {
+            return {};
+        }
+    }
+
+    function tokenExpiry(token) {
+        return (tokenPayload(token).exp || 0) * 1000;
+    }
+
+    // Username the stored access token was issued to
+    function currentUser() {
+        const token = sessionStorage.getItem('token');
+        return token ? tokenPayload(token).sub || null : null;
+    }
+
+    function storeTokens(data) {
+        sessionStorage.setItem('token', data.access_token);
+        if (data.refresh_token) {
+            sessionStorage.setItem('refreshToken', data.refresh_token);
+        }
+        scheduleRefresh();
+    }
+
+    function clearTokens() {
+        clearTimeout(refreshTimer);
+        sessionStorage.removeItem('token');
+        sessionStorage.removeItem('refreshToken');
+    }
+
+    // Exchange the refresh token for new tokens; concurrent callers share one request
+    function refreshAccessToken() {
+        if (refreshPromise) {
+            return refreshPromise;
+        }
+        const refreshToken = sessionStorage.getItem('refreshToken');
+        if (!refreshToken) {
+            return Promise.resolve(false);
+        }
+        refreshPromise = fetch('/api/auth/refresh', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        })
+            .then(async response => {
+                if (!response.ok) {
+                    if (response.status === 401) {
+                        clearTokens();
+                    }
+                    return false;
+                }
+                storeTokens(await response.json());
+                return true;
+            })
+            .catch(error => {
+                console.error('Token refresh failed:', error);
+                return false;
+            })
+            .finally(() => {
+                refreshPromise = null;
+            });
+        return refreshPromise;
+    }
+
+    function secondsLeft() {
+        const token = sessionStorage.getItem('token');
+        return token ? (tokenExpiry(token) - Date.now()) / 1000 : 0;
+    }
+
+    function scheduleRefresh() {
+        clearTimeout(refreshTimer);
+        if (!sessionStorage.getItem('refreshToken')) {
+            return;
+        }
+        const delay = Math.max(secondsLeft() - REFRESH_MARGIN_SECONDS, 0);
+        refreshTimer = setTimeout(refreshAccessToken, delay * 1000);
+    }
+
+    // Resolve once the access token is usable, refreshing it first if needed
+    async function ensureFreshToken() {
+        if (secondsLeft() > REFRESH_MARGIN_SECONDS) {
+            return true;
+        }
+        return refreshAccessToken();
+    }
+
+    // Revoke the session on the server and forget the tokens
+    function logout() {
+        const refreshToken = sessionStorage.getItem('refreshToken');
+        clearTokens();
+        // Conversations cached by conversation_cache.js stay on this device otherwise
+        if (window.indexedDB) {
+            indexedDB.deleteDatabase('family-chat-cache');
+        }
+        if (refreshToken) {
+            fetch('/api/auth/logout', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken }),
+                keepalive: true
+            }).catch(() => {});
+        }
+    }
+
+    // Timers are throttled in background tabs; catch up when the tab is shown again
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'visible' && sessionStorage.getItem('refreshToken')) {
+            ensureFreshToken().then(scheduleRefresh);
+        }
+    });
+
+    scheduleRefresh();
+
+    return {
+        storeTokens: storeTokens,
+        clearTokens: clearTokens,
+        refreshAccessToken: refreshAccessToken,
+        ensureFreshToken: ensureFreshToken,
+        currentUser: currentUser,
+        logout: logout
+    };
+})();
+
 $(document).ready(function() {
     // Initialize theme based on localStorage
     function initializeTheme() {
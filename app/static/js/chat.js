@@ -9,6 +9,18 @@ $(document).ready(function() {
     let currentConversationId = null;
     let eventSource = null;
     let currentResponseController = null;
+    // History is loaded a page of messages at a time, newest first
+    const MESSAGE_PAGE_SIZE = 30;
+    let oldestMessageId = null;
+    // Changes made elsewhere are picked up from /api/sync, starting at this cursor
+    const SYNC_INTERVAL_MS = 30000;
+    let syncCursor = null;
+    let syncInFlight = null;
+    let conversationList = [];
+    // Messages this tab streamed itself; their sync entries need no reload
+    const ownMessageIds = new Set();
+    let conversationStale = false;
+    const messageView = new messageList.MessageList(chatMessages[0], { loadOlder: loadOlderMessages });
 
     
     // Check authentication first
@@ -21,26 +33,35 @@ $(document).ready(function() {
     // Set up AJAX defaults with token
     $.ajaxSetup({
         beforeSend: function(xhr) {
-            xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+            xhr.setRequestHeader('Authorization', `Bearer ${sessionStorage.getItem('token')}`);
         }
     });
 
     // Initialize application
     async function initializeApp() {
         try {
+            // Renew the access token first if it expired while the page was closed
+            await authUtils.ensureFreshToken();
+
+            // Data the server embedded in the page saves the requests below
+            const bootstrap = readBootstrap();
+
             // Fetch user info
-            const userResponse = await fetch('/api/auth/me', {
-                headers: {
-                    'Authorization': `Bearer ${token}`
+            let userData = bootstrap ? bootstrap.user : null;
+            if (!userData) {
+                const userResponse = await fetch('/api/auth/me', {
+                    headers: {
+                        'Authorization': `Bearer ${sessionStorage.getItem('token')}`
+                    }
+                });
+
+                if (!userResponse.ok) {
+                    throw new Error('Failed to fetch user info');
                 }
-            });
-            
-            if (!userResponse.ok) {
-                throw new Error('Failed to fetch user info');
+
+                userData = await userResponse.json();
             }
             
-            const userData = await userResponse.json();
-            
             // Update UI with user info
             $('#username').text(userData.username);
             
@@ -62,15 +83,26 @@ $(document).ready(function() {
             // Initialize theme
             initializeTheme();
             
+            if (bootstrap) {
+                // The server took the cursor before reading the embedded data
+                syncCursor = bootstrap.sync_cursor;
+                renderConversationList(bootstrap.conversations);
+                await loadLatestConversation(bootstrap.conversations, bootstrap.conversation);
+                return;
+            }
+
+            // Take a sync cursor before loading, so later changes aren't missed
+            await syncChanges();
+
             // Load conversations
-            await loadConversations();
-            await loadLatestConversation();
+            const conversations = await loadConversations();
+            await loadLatestConversation(conversations);
             
         } catch (error) {
             console.error('Initialization error:', error);
             if (error.message.includes('Failed to fetch user info')) {
                 showNotification('Session expired. Please login again.', 'error');
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification('Error initializing application', 'error');
@@ -78,6 +110,20 @@ $(document).ready(function() {
         }
     }
 
+    // The bootstrap payload of the page, if it was rendered for the user signed in here
+    function readBootstrap() {
+        const element = document.getElementById('bootstrap-data');
+        if (!element) return null;
+        element.remove();
+        try {
+            const data = JSON.parse(element.textContent);
+            return data.user && data.user.username === authUtils.currentUser() ? data : null;
+        } catch (error) {
+            console.error('Ignoring unreadable bootstrap data:', error);
+            return null;
+        }
+    }
+
     // Theme handling functions
     function initializeTheme() {
         const savedTheme = localStorage.getItem('theme') || 'light';
@@ -148,7 +194,7 @@ $(document).ready(function() {
             showNotification('Connection error. Please check your internet connection.', 'error');
         } else if (error.status === 401) {
             showNotification('Session expired. Please login again.', 'error');
-            sessionStorage.removeItem('token');
+            authUtils.clearTokens();
             window.location.href = '/login';
         } else {
             showNotification(customMessage, 'error');
@@ -160,7 +206,7 @@ $(document).ready(function() {
         console.error('AJAX error:', thrownError);
         if (jqXHR.status === 401) {
             showNotification('Session expired. Please login again.', 'error');
-            sessionStorage.removeItem('token');
+            authUtils.clearTokens();
             window.location.href = '/login';
         } else {
             showNotification('An error occurred. Please try again.', 'error');
@@ -170,55 +216,33 @@ $(document).ready(function() {
     // Check auth before proceeding
     if (!checkAuth()) return;
 
-    // Initialize by loading conversations and latest chat
-    loadConversations().then(() => {
-        loadLatestConversation();
-    });
-
-    // Load latest conversation with auth header
-    async function loadLatestConversation() {
+    // Open the most recent conversation; `conversations` is the list if already
+    // loaded, `page` its newest messages if embedded in the page
+    async function loadLatestConversation(conversations, page) {
         try {
-            const response = await fetch('/api/conversations', {
-                headers: {
-                    'Authorization': `Bearer ${token}`
-                }
-            });
-            
-            if (!response.ok) {
-                throw new Error('Failed to load conversations');
+            if (!Array.isArray(conversations)) {
+                conversations = await conversationCache.load('/api/conversations', renderConversationList);
             }
             
-            const conversations = await response.json();
-            
             if (conversations && conversations.length > 0) {
                 const latestConv = conversations[0];
                 currentConversationId = latestConv.id;
-                
-                const msgResponse = await fetch(`/api/conversations/${latestConv.id}`, {
-                    headers: {
-                        'Authorization': `Bearer ${token}`
-                    }
-                });
-                
-                if (!msgResponse.ok) {
-                    throw new Error('Failed to load conversation messages');
+
+                if (page && page.conversation && page.conversation.id === latestConv.id) {
+                    showConversation(page);
+                    return;
                 }
                 
-                const data = await msgResponse.json();
-                
-                if (data.messages && Array.isArray(data.messages)) {
-                    chatMessages.empty();
-                    data.messages.forEach(msg => {
-                        if (msg.content) appendMessage(msg.content, 'user');
-                        if (msg.response) appendMessage(msg.response, 'assistant');
-                    });
-                }
+                // Cached messages show at once; the server is asked only whether they changed
+                await conversationCache.load(`/api/conversations/${latestConv.id}?limit=${MESSAGE_PAGE_SIZE}`, data => {
+                    if (currentConversationId === latestConv.id) showConversation(data);
+                });
             }
         } catch (error) {
             console.error('Error loading latest conversation:', error);
             if (error.status === 401) {
                 showNotification('Session expired. Please login again.', 'error');
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification('Failed to load conversation', 'error');
@@ -226,56 +250,50 @@ $(document).ready(function() {
         }
     }
 
-    // Load conversations with auth header
-    async function loadConversations() {
-        try {
-            const response = await fetch('/api/conversations', {
-                headers: {
-                    'Authorization': `Bearer ${token}`
-                }
-            });
+    function renderConversationList(conversations) {
+        conversationList = conversations;
+        chatHistory.empty();
+        conversations.forEach(conv => {
+            const convDiv = $('<div>')
+                .addClass('conversation-item p-3 border-bottom cursor-pointer')
+                .attr('data-conversation-id', conv.id)
+                .html(`
+                    <div class="d-flex justify-content-between align-items-center">
+                        <div class="conversation-title text-truncate">${conv.title}</div>
+                        <div class="conversation-actions">
+                            <button class="btn btn-sm btn-outline-secondary rename-conv">
+                                <i class="bi bi-pencil"></i>
+                            </button>
+                            <button class="btn btn-sm btn-outline-danger delete-conv">
+                                <i class="bi bi-trash"></i>
+                            </button>
+                        </div>
+                    </div>
+                    <div class="text-muted small text-truncate">${conv.last_message || ''}</div>
+                `);
             
-            if (!response.ok) {
-                throw new Error('Failed to load conversations');
+            if (conv.id === currentConversationId) {
+                convDiv.addClass('active');
             }
             
-            const conversations = await response.json();
-            
-            chatHistory.empty();
-            conversations.forEach(conv => {
-                const convDiv = $('<div>')
-                    .addClass('conversation-item p-3 border-bottom cursor-pointer')
-                    .attr('data-conversation-id', conv.id)
-                    .html(`
-                        <div class="d-flex justify-content-between align-items-center">
-                            <div class="conversation-title text-truncate">${conv.title}</div>
-                            <div class="conversation-actions">
-                                <button class="btn btn-sm btn-outline-secondary rename-conv">
-                                    <i class="bi bi-pencil"></i>
-                                </button>
-                                <button class="btn btn-sm btn-outline-danger delete-conv">
-                                    <i class="bi bi-trash"></i>
-                                </button>
-                            </div>
-                        </div>
-                        <div class="text-muted small text-truncate">${conv.last_message || ''}</div>
-                    `);
-                
-                if (conv.id === currentConversationId) {
-                    convDiv.addClass('active');
-                }
-                
-                chatHistory.append(convDiv);
-            });
+            chatHistory.append(convDiv);
+        });
+    }
+
+    // Load conversations from the local cache, then revalidate with the server
+    async function loadConversations() {
+        try {
+            return await conversationCache.load('/api/conversations', renderConversationList);
         } catch (error) {
             console.error('Error loading conversations:', error);
             if (error.status === 401) {
                 showNotification('Session expired. Please login again.', 'error');
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification('Failed to load conversations', 'error');
             }
+            return null;
         }
     }
 
@@ -289,7 +307,7 @@ $(document).ready(function() {
             });
             const conversation = await response.json();
             currentConversationId = conversation.id;
-            chatMessages.empty();
+            messageView.clear();
             await loadConversations();
         } catch (error) {
             console.error('Error creating conversation:', error);
@@ -298,24 +316,118 @@ $(document).ready(function() {
         }
     }
 
-    // Append message
-    function appendMessage(content, role) {
-        const messageDiv = $('<div>')
-            .addClass('message')
-            .addClass(role + '-message');
-        
-        const contentDiv = $('<div>').addClass('message-content');
-        
-        if (role === 'assistant') {
-            contentDiv.html(marked.parse(content));
-        } else {
-            contentDiv.text(content);
+    // Fetch what changed since the last sync and apply it; overlapping calls share one run
+    function syncChanges() {
+        if (!syncInFlight) {
+            syncInFlight = runSync().finally(() => { syncInFlight = null; });
         }
-        
-        messageDiv.append(contentDiv);
-        chatMessages.append(messageDiv);
-        chatMessages.scrollTop(chatMessages[0].scrollHeight);
-        return messageDiv;
+        return syncInFlight;
+    }
+
+    async function runSync() {
+        try {
+            while (true) {
+                const since = syncCursor === null ? '' : `?since=${encodeURIComponent(syncCursor)}`;
+                const response = await fetch(`/api/sync${since}`, {
+                    headers: { 'Authorization': `Bearer ${sessionStorage.getItem('token')}` }
+                });
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                const changes = await response.json();
+                const hadCursor = syncCursor !== null;
+                syncCursor = changes.cursor;
+
+                if (changes.reset) {
+                    // Too far behind to catch up from the feed: load everything again
+                    if (hadCursor) {
+                        await loadConversations();
+                        conversationStale = true;
+                    }
+                } else {
+                    applyChanges(changes);
+                }
+                if (!changes.has_more) break;
+            }
+
+            if (conversationStale && !currentResponseController && currentConversationId) {
+                conversationStale = false;
+                const convId = currentConversationId;
+                await conversationCache.load(`/api/conversations/${convId}?limit=${MESSAGE_PAGE_SIZE}`, data => {
+                    if (currentConversationId === convId) showConversation(data);
+                });
+            }
+        } catch (error) {
+            // The next sync retries from the same cursor
+            console.error('Error syncing changes:', error);
+        }
+    }
+
+    function applyChanges(changes) {
+        const deleted = new Set(changes.deleted.conversations);
+        const updated = new Set(changes.conversations.map(conv => conv.id));
+        if (deleted.size || updated.size) {
+            const list = conversationList
+                .filter(conv => !deleted.has(conv.id) && !updated.has(conv.id))
+                .concat(changes.conversations);
+            list.sort((a, b) => (b.updated_at || '').localeCompare(a.updated_at || ''));
+            renderConversationList(list);
+        }
+
+        if (deleted.has(currentConversationId)) {
+            currentConversationId = null;
+            oldestMessageId = null;
+            messageView.clear();
+        }
+
+        // Messages from another device or tab: redraw the open conversation
+        changes.messages.forEach(message => {
+            if (ownMessageIds.delete(message.id)) return;
+            if (message.conversation_id === currentConversationId) conversationStale = true;
+        });
+    }
+
+    // Messages of an API page as list entries, oldest first
+    function toListMessages(messages) {
+        const items = [];
+        (messages || []).forEach(msg => {
+            if (msg.content) items.push({ content: msg.content, role: 'user' });
+            if (msg.response) items.push({ content: msg.response, role: 'assistant' });
+        });
+        return items;
+    }
+
+    // Show the newest page of a conversation; older pages load on scroll
+    function showConversation(data) {
+        const messages = Array.isArray(data.messages) ? data.messages : [];
+        oldestMessageId = messages.length ? messages[0].id : null;
+        messageView.setMessages(toListMessages(messages), Boolean(data.has_more));
+    }
+
+    async function loadOlderMessages() {
+        const conversationId = currentConversationId;
+        if (!conversationId || oldestMessageId === null) return;
+
+        const response = await fetch(
+            `/api/conversations/${conversationId}?limit=${MESSAGE_PAGE_SIZE}&before=${oldestMessageId}`,
+            { headers: { 'Authorization': `Bearer ${sessionStorage.getItem('token')}` } }
+        );
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        // The user may have opened another conversation in the meantime
+        if (conversationId !== currentConversationId) return;
+
+        if (data.messages.length) {
+            oldestMessageId = data.messages[0].id;
+        }
+        messageView.prepend(toListMessages(data.messages), Boolean(data.has_more));
+    }
+
+    // Append message
+    function appendMessage(content, role, live) {
+        return $(messageView.append(content, role, live));
     }
 
     // Keep your existing chat submission handler
@@ -334,7 +446,7 @@ $(document).ready(function() {
         messageInput.val('');
         stopButton.removeClass('d-none');
     
-        const responseDiv = appendMessage('', 'assistant');
+        const responseDiv = appendMessage('', 'assistant', true);
         const loadingIndicator = $('<div class="loading-indicator">').appendTo(responseDiv);
         loadingIndicator.html(`
             <div class="typing-indicator">
@@ -348,8 +460,25 @@ $(document).ready(function() {
             </div>
         `);
     
-        let fullResponse = '';
         let isFirstToken = true;
+        // Completed markdown blocks are rendered once; see markdown_stream.js
+        const responseContent = responseDiv.find('.message-content');
+        const renderer = new markdownStream.StreamRenderer(
+            responseContent[0],
+            () => messageView.followBottom()
+        );
+        // Render the complete answer once; later calls do nothing
+        function finishResponse() {
+            if (renderer.finished) return;
+            renderer.finish();
+            messageView.settle(responseDiv[0], renderer.text);
+        }
+        // Replace the streamed answer with a message, e.g. an error
+        function showResponseText(text) {
+            renderer.cancel();
+            responseContent.html(marked.parse(text));
+            messageView.settle(responseDiv[0], text);
+        }
     
         // If there's an ongoing request, cancel it
         if (currentResponseController) {
@@ -360,78 +489,105 @@ $(document).ready(function() {
         currentResponseController = new AbortController();
     
         try {
-            const response = await fetch('/api/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`
-                },
-                body: JSON.stringify({
-                    message: message,
-                    conversation_id: currentConversationId
-                }),
-                signal: currentResponseController.signal
+            let completed = false;
+            const payload = {
+                message: message,
+                conversation_id: currentConversationId,
+                ...(localStorage.getItem('selectedModel') && { model: localStorage.getItem('selectedModel') })
+            };
+            function showUsageLimit(retryAfter) {
+                const wait = retryAfter >= 120 ? `${Math.ceil(retryAfter / 60)} minutes` : `${retryAfter} seconds`;
+                showResponseText(`You have reached your usage limit. Please try again in ${wait}.`);
+            }
+            // One parsed event, from either transport; false ends the stream
+            function handleEvent(parsed) {
+                if (parsed.done) {
+                    finishResponse();
+                    completed = true;
+                    return false;
+                }
+
+                if (parsed.error) {
+                    if (parsed.status === 429) {
+                        showUsageLimit(parsed.retry_after || 60);
+                    } else {
+                        showResponseText('Error: ' + parsed.error);
+                    }
+                    return false;
+                }
+
+                if (parsed.messageId) {
+                    ownMessageIds.add(parsed.messageId);
+                }
+
+                if (parsed.token) {
+                    if (isFirstToken) {
+                        // Remove the loading indicator when first token arrives
+                        loadingIndicator.remove();
+                        isFirstToken = false;
+                    }
+                    renderer.append(parsed.token);
+                }
+
+                // Handle progress updates
+                if (parsed.progress) {
+                    loadingIndicator.find('.context-info span').text(parsed.progress);
+                }
+                return true;
+            }
+
+            // Shared WebSocket first; a POST with an SSE response when it can't be opened
+            const streamed = await chatSocket.stream(payload, {
+                signal: currentResponseController.signal,
+                onEvent: handleEvent
             });
-    
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-    
-            while (true) {
-                const {value, done} = await reader.read();
-                if (done) break;
-    
-                const text = decoder.decode(value);
-                const lines = text.split('\n');
-    
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const data = line.slice(5).trim();
-    
-                        if (data === '[DONE]') {
-                            loadingIndicator.remove();
-                            stopButton.addClass('d-none');
-                            await loadConversations(); // Refresh conversation list
-                            break;
+            if (!streamed) {
+                // A generation can't be resumed, so the stream is not reconnected
+                await sseClient.stream('/api/chat', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${sessionStorage.getItem('token')}`
+                    },
+                    body: JSON.stringify(payload),
+                    signal: currentResponseController.signal,
+                    onOpen: response => {
+                        if (response.status !== 429) return true;
+                        showUsageLimit(parseInt(response.headers.get('Retry-After') || '60', 10));
+                        return false;
+                    },
+                    onEvent: event => {
+                        if (event.data === '[DONE]') {
+                            return handleEvent({ done: true });
                         }
-    
+                        let parsed;
                         try {
-                            const parsed = JSON.parse(data);
-                            if (parsed.error) {
-                                responseDiv.html(marked.parse('Error: ' + parsed.error));
-                                loadingIndicator.remove();
-                                stopButton.addClass('d-none');
-                                currentResponseController = null;
-                                break;
-                            }
-    
-                            if (parsed.token) {
-                                if (isFirstToken) {
-                                    // Remove the loading indicator when first token arrives
-                                    loadingIndicator.remove();
-                                    isFirstToken = false;
-                                }
-                                fullResponse += parsed.token;
-                                responseDiv.html(marked.parse(fullResponse));
-                                chatMessages.scrollTop(chatMessages[0].scrollHeight);
-                            }
-    
-                            // Handle progress updates
-                            if (parsed.progress) {
-                                loadingIndicator.find('.context-info span').text(parsed.progress);
-                            }
+                            parsed = JSON.parse(event.data);
                         } catch (error) {
                             console.error('Error parsing SSE data:', error);
+                            return true;
                         }
+                        return handleEvent(parsed);
                     }
-                }
+                });
+            }
+
+            // The stream may end without [DONE]
+            finishResponse();
+            loadingIndicator.remove();
+            stopButton.addClass('d-none');
+            currentResponseController = null;
+            if (completed) {
+                await syncChanges(); // Refresh conversation list
             }
         } catch (error) {
             if (error.name === 'AbortError') {
                 console.log('Response generation stopped by user');
+                finishResponse();
                 responseDiv.append('<br><em>Generation stopped by user</em>');
             } else {
                 console.error('Request error:', error);
-                responseDiv.html(marked.parse('Error: Failed to generate response'));
+                showResponseText('Error: Failed to generate response');
             }
             loadingIndicator.remove();
             stopButton.addClass('d-none');
@@ -451,7 +607,7 @@ $(document).ready(function() {
     // Add logout handler
     $('#logout-button').on('click', function() {
         if (confirm('Are you sure you want to logout?')) {
-            sessionStorage.removeItem('token');
+            authUtils.logout();
             showNotification('Logged out successfully', 'success');
             setTimeout(() => {
                 window.location.href = '/login';
@@ -463,7 +619,7 @@ $(document).ready(function() {
     $('#new-chat').on('click', async function() {
         try {
             await createNewConversation();
-            chatMessages.empty();  // Clear the chat area
+            messageView.clear();  // Clear the chat area
             messageInput.focus();  // Focus on input for better UX
         } catch (error) {
             console.error('Error creating new conversation:', error);
@@ -477,26 +633,9 @@ $(document).ready(function() {
             currentConversationId = convId;
             
             try {
-                const response = await fetch(`/api/conversations/${convId}`, {
-                    headers: {
-                        'Authorization': `Bearer ${sessionStorage.getItem('token')}`
-                    }
+                await conversationCache.load(`/api/conversations/${convId}?limit=${MESSAGE_PAGE_SIZE}`, data => {
+                    if (currentConversationId === convId) showConversation(data);
                 });
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-                const data = await response.json();
-                
-                // Clear existing messages
-                chatMessages.empty();
-                
-                // Check if we have messages and they're in an array
-                if (data.messages && Array.isArray(data.messages)) {
-                    data.messages.forEach(msg => {
-                        if (msg.content) appendMessage(msg.content, 'user');
-                        if (msg.response) appendMessage(msg.response, 'assistant');
-                    });
-                }
                 
                 $('.conversation-item').removeClass('active');
                 $(this).addClass('active');
@@ -592,16 +731,65 @@ $(document).ready(function() {
     });
 
     // Add search functionality
+    let searchTimer = null;
     $('#search-conversations').on('input', function() {
         const searchTerm = $(this).val().toLowerCase();
+        $('.search-snippet').remove();
         $('.conversation-item').each(function() {
             const title = $(this).find('.conversation-title').text().toLowerCase();
             const lastMessage = $(this).find('.text-muted').text().toLowerCase();
             const matches = title.includes(searchTerm) || lastMessage.includes(searchTerm);
             $(this).toggle(matches);
         });
+
+        // Also search full message history once typing pauses
+        clearTimeout(searchTimer);
+        if (searchTerm.trim().length >= 2) {
+            searchTimer = setTimeout(() => searchHistory(searchTerm), 300);
+        }
     });
 
+    // Show conversations whose messages match, with a highlighted snippet
+    async function searchHistory(searchTerm) {
+        try {
+            const response = await fetch(`/api/conversations/search?q=${encodeURIComponent(searchTerm)}`, {
+                headers: {
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`
+                }
+            });
+
+            if (!response.ok) {
+                throw new Error('Search failed');
+            }
+
+            const data = await response.json();
+
+            // Ignore results for a search the user has already changed
+            if ($('#search-conversations').val().toLowerCase() !== searchTerm) return;
+
+            // Best hit per conversation; snippets arrive HTML-escaped with <mark> highlights
+            const snippets = {};
+            data.results.forEach(result => {
+                if (!(result.conversation_id in snippets)) {
+                    snippets[result.conversation_id] = result.snippet;
+                }
+            });
+
+            $('.conversation-item').each(function() {
+                const convId = $(this).attr('data-conversation-id');
+                if (convId in snippets) {
+                    $(this).show();
+                    $('<div>')
+                        .addClass('search-snippet small text-truncate')
+                        .html(snippets[convId])
+                        .appendTo(this);
+                }
+            });
+        } catch (error) {
+            console.error('Error searching conversations:', error);
+        }
+    }
+
     //Copy conversation to clipboard handler
     async function copyConversation() {
         if (!currentConversationId) {
@@ -789,9 +977,13 @@ $(document).ready(function() {
     });
     
 
-    // Initialize
-    //createNewConversation();
-    loadConversations();
+    // Pick up changes from other devices while the page is open
+    setInterval(() => {
+        if (syncCursor !== null && document.visibilityState === 'visible') syncChanges();
+    }, SYNC_INTERVAL_MS);
+    document.addEventListener('visibilitychange', () => {
+        if (syncCursor !== null && document.visibilityState === 'visible') syncChanges();
+    });
 
     // Notification helper
     function showNotification(message, type = 'info') {
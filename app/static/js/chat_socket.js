@@ -0,0 +1,133 @@
+// app/static/js/chat_socket.js
+
+// Chat streams over one WebSocket (/api/chat/ws) instead of a POST per
+// message. Each stream is tagged with an id picked here; frames carry the
+// same JSON as the SSE endpoint. The socket is opened on first use and
+// reopened after it drops; if it can't be opened callers fall back to SSE.
+window.chatSocket = (function() {
+    // Don't retry a socket that failed to open for this long
+    const RETRY_AFTER_MS = 30000;
+
+    let socket = null;
+    let opening = null;
+    let failedAt = 0;
+    let authToken = null;
+    const streams = new Map();
+
+    function socketUrl() {
+        const scheme = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        return `${scheme}//${location.host}/api/chat/ws`;
+    }
+
+    // Resolve with an authenticated socket, or null when none can be opened
+    function connect() {
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            return Promise.resolve(socket);
+        }
+        if (opening) {
+            return opening;
+        }
+        if (!window.WebSocket || Date.now() - failedAt < RETRY_AFTER_MS) {
+            return Promise.resolve(null);
+        }
+
+        opening = new Promise(resolve => {
+            const ws = new WebSocket(socketUrl());
+            let ready = false;
+
+            ws.onopen = () => {
+                authToken = sessionStorage.getItem('token');
+                ws.send(JSON.stringify({ type: 'auth', token: authToken }));
+            };
+            ws.onmessage = event => {
+                const frame = JSON.parse(event.data);
+                if (frame.type === 'ready') {
+                    ready = true;
+                    socket = ws;
+                    resolve(ws);
+                } else if (frame.type === 'ping') {
+                    ws.send('{"type": "pong"}');
+                } else if (frame.id !== undefined && streams.has(frame.id)) {
+                    streams.get(frame.id).onFrame(frame);
+                }
+            };
+            ws.onclose = () => {
+                if (socket === ws) socket = null;
+                if (!ready) {
+                    failedAt = Date.now();
+                    resolve(null);
+                }
+                // Streams can't continue on a new socket; fail the open ones
+                streams.forEach(stream => stream.fail(new Error('Chat connection lost')));
+                streams.clear();
+            };
+        }).finally(() => { opening = null; });
+        return opening;
+    }
+
+    /*
+     * Stream one message. `payload` is the /api/chat request body. Options:
+     *   onEvent(frame) - called per frame, as parsed SSE data; {done: true} ends it
+     *   signal - aborting sends a cancel and rejects with an AbortError
+     * Resolves with false, without sending, when no socket is available.
+     */
+    async function stream(payload, options) {
+        const ws = await connect();
+        if (!ws) return false;
+
+        // The socket keeps its first token; send the renewed one before it expires
+        await authUtils.ensureFreshToken();
+        const token = sessionStorage.getItem('token');
+        if (token !== authToken) {
+            authToken = token;
+            ws.send(JSON.stringify({ type: 'auth', token: token }));
+        }
+
+        const id = crypto.randomUUID();
+        return new Promise((resolve, reject) => {
+            const signal = options.signal;
+            function onAbort() {
+                streams.delete(id);
+                if (ws.readyState === WebSocket.OPEN) {
+                    ws.send(JSON.stringify({ type: 'cancel', id: id }));
+                }
+                reject(new DOMException('Aborted', 'AbortError'));
+            }
+            function end() {
+                streams.delete(id);
+                if (signal) signal.removeEventListener('abort', onAbort);
+            }
+
+            streams.set(id, {
+                onFrame: frame => {
+                    delete frame.id;
+                    const more = options.onEvent(frame);
+                    if (frame.done || frame.error) {
+                        end();
+                        resolve(true);
+                    } else if (more === false) {
+                        end();
+                        ws.send(JSON.stringify({ type: 'cancel', id: id }));
+                        resolve(true);
+                    }
+                },
+                fail: error => {
+                    end();
+                    reject(error);
+                }
+            });
+            if (signal) {
+                if (signal.aborted) {
+                    onAbort();
+                    return;
+                }
+                signal.addEventListener('abort', onAbort, { once: true });
+            }
+            ws.send(JSON.stringify(Object.assign({ type: 'chat', id: id }, payload)));
+        });
+    }
+
+    return {
+        stream: stream
+    };
+})();
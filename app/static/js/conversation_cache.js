@@ -0,0 +1,139 @@
+// app/static/js/conversation_cache.js
+
+// Conversation data kept in IndexedDB between visits. load() renders the
+// stored copy right away, then revalidates it with If-None-Match; when
+// nothing changed the server answers 304 and nothing is downloaded or
+// parsed. Entries are per user; logout deletes the database (base.js).
+window.conversationCache = (function() {
+    const DB_NAME = 'family-chat-cache';
+    const STORE = 'responses';
+    // Oldest entries beyond this many are dropped
+    const MAX_ENTRIES = 200;
+
+    let dbPromise = null;
+
+    function openDatabase() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve) => {
+                if (!window.indexedDB) {
+                    resolve(null);
+                    return;
+                }
+                const request = indexedDB.open(DB_NAME, 1);
+                request.onupgradeneeded = () => {
+                    const store = request.result.createObjectStore(STORE, { keyPath: 'key' });
+                    store.createIndex('storedAt', 'storedAt');
+                };
+                request.onsuccess = () => {
+                    // Let logout delete the database while this page is still open
+                    request.result.onversionchange = () => request.result.close();
+                    resolve(request.result);
+                };
+                // Private browsing may refuse IndexedDB; work without a cache then
+                request.onerror = () => resolve(null);
+            });
+        }
+        return dbPromise;
+    }
+
+    function transaction(db, mode, work) {
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(STORE, mode);
+            const result = work(tx.objectStore(STORE));
+            tx.oncomplete = () => resolve(result.result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    // The signed-in user, so people sharing a browser never see each other's data
+    function currentUser() {
+        try {
+            const token = sessionStorage.getItem('token');
+            return JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/'))).sub;
+        } catch (e) {
+            return null;
+        }
+    }
+
+    async function get(key) {
+        const db = await openDatabase();
+        if (!db) return null;
+        try {
+            return await transaction(db, 'readonly', store => store.get(key)) || null;
+        } catch (error) {
+            console.warn('Conversation cache read failed:', error);
+            return null;
+        }
+    }
+
+    async function put(entry) {
+        const db = await openDatabase();
+        if (!db) return;
+        try {
+            await transaction(db, 'readwrite', store => store.put(entry));
+            await prune(db);
+        } catch (error) {
+            console.warn('Conversation cache write failed:', error);
+        }
+    }
+
+    function prune(db) {
+        return transaction(db, 'readwrite', store => {
+            const count = store.count();
+            count.onsuccess = () => {
+                let excess = count.result - MAX_ENTRIES;
+                if (excess <= 0) return;
+                store.index('storedAt').openCursor().onsuccess = event => {
+                    const cursor = event.target.result;
+                    if (cursor && excess-- > 0) {
+                        cursor.delete();
+                        cursor.continue();
+                    }
+                };
+            };
+            return count;
+        });
+    }
+
+    /*
+     * Fetch JSON from `url` through the cache. `render(data, fromCache)` runs
+     * with the stored copy first, if there is one, and again only if the
+     * server sends something newer. Resolves with the latest data.
+     */
+    async function load(url, render) {
+        const user = currentUser();
+        const key = `${user}:${url}`;
+        const cached = user ? await get(key) : null;
+        if (cached) {
+            render(cached.data, true);
+        }
+
+        const headers = { 'Authorization': `Bearer ${sessionStorage.getItem('token')}` };
+        if (cached && cached.etag) {
+            headers['If-None-Match'] = cached.etag;
+        }
+        // Revalidation is done here, so the HTTP cache shouldn't keep a second copy
+        const response = await fetch(url, { headers: headers, cache: 'no-store' });
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+        if (!response.ok) {
+            const error = new Error(`HTTP error! status: ${response.status}`);
+            error.status = response.status;
+            throw error;
+        }
+
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (user && etag) {
+            put({ key: key, etag: etag, data: data, storedAt: Date.now() });
+        }
+        render(data, false);
+        return data;
+    }
+
+    return {
+        load: load
+    };
+})();
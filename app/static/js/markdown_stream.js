@@ -0,0 +1,124 @@
+// app/static/js/markdown_stream.js
+
+// Incremental markdown rendering for streamed answers. Re-parsing the whole
+// answer on every token is quadratic; instead the text is cut into blocks at
+// blank lines outside code fences. Blocks that can no longer change are
+// parsed once and frozen, and only the trailing open block is re-parsed.
+// DOM writes happen at most once per animation frame.
+window.markdownStream = (function() {
+    const FENCE = /^ {0,3}(`{3,}|~{3,})/;
+
+    // Tracks block boundaries over a growing text, scanning each line once
+    function BlockScanner() {
+        this.position = 0;      // start of the first line not scanned yet
+        this.fence = null;      // marker of the open code fence, if any
+        this.pending = null;    // end of the last blank line outside a fence
+        this.boundary = 0;      // end of the last completed block
+    }
+
+    // Scan the complete lines of `text` and return the end of the completed blocks
+    BlockScanner.prototype.advance = function(text) {
+        let newline = text.indexOf('\n', this.position);
+        while (newline !== -1) {
+            const line = text.slice(this.position, newline);
+            const end = newline + 1;
+
+            if (this.fence) {
+                const match = line.match(FENCE);
+                if (match && match[1][0] === this.fence[0] && match[1].length >= this.fence.length
+                        && !line.slice(match[0].length).trim()) {
+                    this.fence = null;
+                }
+            } else if (!line.trim()) {
+                this.pending = end;
+            } else {
+                // An unindented line after a blank one starts a new block; an
+                // indented one may still continue a list item
+                if (this.pending !== null && !/^\s/.test(line)) {
+                    this.boundary = this.pending;
+                }
+                this.pending = null;
+                const match = line.match(FENCE);
+                if (match) {
+                    this.fence = match[1];
+                }
+            }
+
+            this.position = end;
+            newline = text.indexOf('\n', end);
+        }
+        return this.boundary;
+    };
+
+    // Renders a streamed answer into `element`. `onRender` runs after each
+    // DOM update, e.g. to keep the view scrolled to the bottom.
+    function StreamRenderer(element, onRender) {
+        this.element = element;
+        this.onRender = onRender || null;
+        this.text = '';
+        this.frozenLength = 0;
+        this.scanner = new BlockScanner();
+        this.tailNodes = [];
+        this.frame = null;
+        this.finished = false;
+    }
+
+    StreamRenderer.prototype.append = function(chunk) {
+        if (this.finished || !chunk) return;
+        this.text += chunk;
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.flush();
+            });
+        }
+    };
+
+    StreamRenderer.prototype.flush = function() {
+        const boundary = this.scanner.advance(this.text);
+        if (boundary > this.frozenLength) {
+            // Newly completed blocks go in front of the open block for good
+            const frozen = parseToFragment(this.text.slice(this.frozenLength, boundary));
+            this.element.insertBefore(frozen, this.tailNodes.length ? this.tailNodes[0] : null);
+            this.frozenLength = boundary;
+        }
+
+        const tail = parseToFragment(this.text.slice(this.frozenLength));
+        this.tailNodes.forEach(node => node.remove());
+        this.tailNodes = Array.from(tail.childNodes);
+        this.element.appendChild(tail);
+
+        if (this.onRender) this.onRender();
+    };
+
+    // Render whatever is pending right away and stop accepting text. The
+    // answer is parsed once more as a whole so it looks exactly like it will
+    // when the conversation is reopened (e.g. loose lists split by blank lines).
+    StreamRenderer.prototype.finish = function() {
+        if (this.finished) return;
+        this.cancel();
+        this.element.innerHTML = marked.parse(this.text);
+        this.tailNodes = [];
+        if (this.onRender) this.onRender();
+    };
+
+    // Stop rendering and drop any scheduled update, e.g. before showing an error instead
+    StreamRenderer.prototype.cancel = function() {
+        this.finished = true;
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+            this.frame = null;
+        }
+    };
+
+    function parseToFragment(markdown) {
+        const template = document.createElement('template');
+        template.innerHTML = markdown ? marked.parse(markdown) : '';
+        return template.content;
+    }
+
+    return {
+        BlockScanner: BlockScanner,
+        StreamRenderer: StreamRenderer
+    };
+})();
@@ -0,0 +1,182 @@
+// app/static/js/message_list.js
+
+// Virtualized chat pane. Every message keeps an element, but only messages
+// near the viewport hold rendered content; the others are empty placeholders
+// with their last measured (or an estimated) height, so long conversations
+// cost little DOM and memory. Assistant markdown is parsed the first time a
+// message comes into view. Scrolling near the top asks for older messages.
+window.messageList = (function() {
+    // Keep messages rendered within this distance of the viewport
+    const OVERSCAN_PX = 800;
+    // Ask for older messages when scrolled this close to the top
+    const LOAD_OLDER_PX = 300;
+    // Within this distance of the bottom the view follows new content
+    const PINNED_PX = 40;
+
+    // Rough height of an unrendered message: padding plus ~80 characters per line
+    function estimateHeight(content) {
+        const lines = content.split('\n').length + Math.floor(content.length / 80);
+        return 40 + lines * 24;
+    }
+
+    /*
+     * `container` is the scrolling element. Options:
+     *   loadOlder() - async; fetch the previous page and prepend() it
+     */
+    function MessageList(container, options) {
+        this.container = container;
+        this.loadOlder = (options || {}).loadOlder || null;
+        this.items = new WeakMap();
+        this.hasMore = false;
+        this.loading = false;
+        this.pinned = true;
+        this.observer = new IntersectionObserver(
+            entries => this.onIntersect(entries),
+            { root: container, rootMargin: `${OVERSCAN_PX}px 0px` }
+        );
+        container.addEventListener('scroll', () => this.onScroll(), { passive: true });
+    }
+
+    MessageList.prototype.createElement = function(message) {
+        const element = document.createElement('div');
+        element.className = `message ${message.role}-message`;
+        const content = document.createElement('div');
+        content.className = 'message-content';
+        element.appendChild(content);
+
+        const item = {
+            element: element,
+            content: message.content,
+            role: message.role,
+            html: null,
+            rendered: false,
+            live: false
+        };
+        element.style.height = `${estimateHeight(message.content)}px`;
+        this.items.set(element, item);
+        this.observer.observe(element);
+        return item;
+    };
+
+    MessageList.prototype.render = function(item) {
+        if (item.rendered) return;
+        const content = item.element.firstChild;
+        if (item.role === 'assistant') {
+            if (item.html === null) item.html = marked.parse(item.content);
+            content.innerHTML = item.html;
+        } else {
+            content.textContent = item.content;
+        }
+        item.element.style.height = '';
+        item.rendered = true;
+    };
+
+    MessageList.prototype.unload = function(item) {
+        if (!item.rendered || item.live) return;
+        item.element.style.height = `${item.element.offsetHeight}px`;
+        item.element.firstChild.textContent = '';
+        item.rendered = false;
+    };
+
+    MessageList.prototype.onIntersect = function(entries) {
+        // rootBounds includes the overscan margin; compare with the visible area
+        const viewportTop = this.container.getBoundingClientRect().top;
+        for (const entry of entries) {
+            const item = this.items.get(entry.target);
+            if (!item) continue;
+            if (!entry.isIntersecting) {
+                this.unload(item);
+                continue;
+            }
+            // A message growing above the viewport would push the visible
+            // ones down; scroll by the difference to keep them in place
+            const above = entry.boundingClientRect.bottom <= viewportTop;
+            const before = item.element.offsetHeight;
+            this.render(item);
+            if (above && !this.pinned) {
+                this.container.scrollTop += item.element.offsetHeight - before;
+            }
+        }
+        this.followBottom();
+    };
+
+    MessageList.prototype.onScroll = function() {
+        const container = this.container;
+        this.pinned = container.scrollHeight - container.scrollTop - container.clientHeight <= PINNED_PX;
+        if (container.scrollTop < LOAD_OLDER_PX && this.hasMore && !this.loading && this.loadOlder) {
+            this.loading = true;
+            Promise.resolve(this.loadOlder())
+                .catch(error => console.error('Error loading older messages:', error))
+                .finally(() => { this.loading = false; });
+        }
+    };
+
+    // Keep the newest content in view unless the user scrolled away from it
+    MessageList.prototype.followBottom = function() {
+        if (this.pinned) {
+            this.container.scrollTop = this.container.scrollHeight;
+        }
+    };
+
+    MessageList.prototype.clear = function() {
+        this.observer.disconnect();
+        this.items = new WeakMap();
+        this.container.textContent = '';
+        this.hasMore = false;
+        this.pinned = true;
+    };
+
+    // Show a conversation: `messages` are [{content, role}], oldest first
+    MessageList.prototype.setMessages = function(messages, hasMore) {
+        this.clear();
+        const fragment = document.createDocumentFragment();
+        const items = messages.map(message => this.createElement(message));
+        items.forEach(item => fragment.appendChild(item.element));
+        this.container.appendChild(fragment);
+
+        // Render the bottom screenful right away so the first paint isn't blank
+        let height = 0;
+        for (let i = items.length - 1; i >= 0 && height < this.container.clientHeight + OVERSCAN_PX; i--) {
+            this.render(items[i]);
+            height += items[i].element.offsetHeight;
+        }
+        this.hasMore = hasMore;
+        this.followBottom();
+    };
+
+    // Insert an older page above the current messages without moving the view
+    MessageList.prototype.prepend = function(messages, hasMore) {
+        const container = this.container;
+        const previousHeight = container.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        messages.forEach(message => fragment.appendChild(this.createElement(message).element));
+        container.insertBefore(fragment, container.firstChild);
+        container.scrollTop += container.scrollHeight - previousHeight;
+        this.hasMore = hasMore;
+    };
+
+    // Add a new message at the bottom. A `live` message is being streamed
+    // into and stays rendered until settle() is called.
+    MessageList.prototype.append = function(content, role, live) {
+        const item = this.createElement({ content: content, role: role });
+        item.live = Boolean(live);
+        this.container.appendChild(item.element);
+        this.render(item);
+        this.pinned = true;
+        this.followBottom();
+        return item.element;
+    };
+
+    // A live message is complete; it may be unloaded from now on
+    MessageList.prototype.settle = function(element, content) {
+        const item = this.items.get(element);
+        if (!item) return;
+        item.content = content;
+        item.html = null;
+        item.live = false;
+    };
+
+    return {
+        MessageList: MessageList
+    };
+})();
@@ -9,7 +9,7 @@ $(document).ready(function() {
     // Set up AJAX defaults with token
     $.ajaxSetup({
         beforeSend: function(xhr) {
-            xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+            xhr.setRequestHeader('Authorization', `Bearer ${sessionStorage.getItem('token')}`);
         }
     });
 
@@ -26,9 +26,12 @@ $(document).ready(function() {
     // Initialize by loading user info and models
     async function initialize() {
         try {
+            // Renew the access token first if it expired while the page was closed
+            await authUtils.ensureFreshToken();
+
             const response = await fetch('/api/auth/me', {
                 headers: {
-                    'Authorization': `Bearer ${token}`
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`
                 }
             });
 
@@ -49,7 +52,7 @@ $(document).ready(function() {
         } catch (error) {
             console.error('Initialization error:', error);
             if (error.message === 'Authentication expired') {
-                sessionStorage.removeItem('token');
+                authUtils.clearTokens();
                 window.location.href = '/login';
             } else {
                 showNotification('Error initializing settings', 'error');
@@ -60,7 +63,12 @@ $(document).ready(function() {
     // Load available models
     async function loadModels() {
         try {
-            const response = await fetch('/api/settings/models');
+            // The browser revalidates its copy with the ETag, so this is usually a 304
+            const response = await fetch('/api/settings/models', {
+                headers: {
+                    'Authorization': `Bearer ${sessionStorage.getItem('token')}`
+                }
+            });
             if (!response.ok) {
                 throw new Error('Failed to fetch models');
             }
@@ -70,8 +78,9 @@ $(document).ready(function() {
             modelSelector.empty();
             
             models.forEach(model => {
+                const details = model.context_length ? ` (${model.context_length.toLocaleString()} tokens)` : '';
                 modelSelector.append(
-                    `<option value="${model.id}">${model.name}</option>`
+                    $('<option>').val(model.id).text(model.name + details)
                 );
             });
             
@@ -132,7 +141,7 @@ $(document).ready(function() {
     // Logout handler
     $('#logout-button').on('click', function() {
         if (confirm('Are you sure you want to logout?')) {
-            sessionStorage.removeItem('token');
+            authUtils.logout();
             showNotification('Logged out successfully', 'success');
             setTimeout(() => {
                 window.location.href = '/login';
@@ -145,7 +154,7 @@ $(document).ready(function() {
         console.error('Error:', error);
         if (error.status === 401) {
             showNotification('Session expired. Please login again.', 'error');
-            sessionStorage.removeItem('token');
+            authUtils.clearTokens();
             setTimeout(() => {
                 window.location.href = '/login';
             }, 1000);
@@ -0,0 +1,210 @@
+// app/static/js/sse_client.js
+
+// Server-sent events over fetch, so streams can be POSTed and carry the
+// Authorization header (EventSource can do neither). Network chunks don't
+// line up with events: the decoder keeps multi-byte characters that are cut
+// in half, and the parser carries an unfinished line over to the next chunk.
+window.sseClient = (function() {
+    const LF = 10;
+    const CR = 13;
+    const COLON = 58;
+    const SPACE = 32;
+
+    // Parses the event stream format; `onEvent({type, data, id})` runs for
+    // each complete event and may return false to stop the stream
+    function SSEParser(onEvent) {
+        this.onEvent = onEvent;
+        this.buffer = '';
+        this.eventType = '';
+        this.data = [];
+        this.lastEventId = '';
+        this.retry = null;
+        this.stopped = false;
+    }
+
+    // Feed decoded text; returns false once the handler asked to stop
+    SSEParser.prototype.feed = function(text) {
+        const buffer = this.buffer ? this.buffer + text : text;
+        const length = buffer.length;
+        let start = 0;
+        let lf = buffer.indexOf('\n');
+        let cr = buffer.indexOf('\r');
+
+        while (!this.stopped) {
+            if (lf !== -1 && lf < start) lf = buffer.indexOf('\n', start);
+            if (cr !== -1 && cr < start) cr = buffer.indexOf('\r', start);
+            const end = cr === -1 ? lf : (lf === -1 ? cr : Math.min(lf, cr));
+            if (end === -1) break;
+
+            let next = end + 1;
+            if (buffer.charCodeAt(end) === CR) {
+                // A CR at the end of the chunk may be the first half of CRLF
+                if (next === length) break;
+                if (buffer.charCodeAt(next) === LF) next++;
+            }
+            this.processLine(buffer, start, end);
+            start = next;
+        }
+
+        this.buffer = start < length ? buffer.slice(start) : '';
+        return !this.stopped;
+    };
+
+    SSEParser.prototype.processLine = function(buffer, start, end) {
+        if (start === end) {
+            this.dispatch();
+            return;
+        }
+        if (buffer.charCodeAt(start) === COLON) return;  // comment, e.g. a keep-alive
+
+        const colon = buffer.indexOf(':', start);
+        let field;
+        let value = '';
+        if (colon === -1 || colon > end) {
+            field = buffer.slice(start, end);
+        } else {
+            field = buffer.slice(start, colon);
+            let valueStart = colon + 1;
+            if (buffer.charCodeAt(valueStart) === SPACE) valueStart++;
+            value = buffer.slice(valueStart, end);
+        }
+
+        switch (field) {
+            case 'data':
+                this.data.push(value);
+                break;
+            case 'event':
+                this.eventType = value;
+                break;
+            case 'id':
+                if (value.indexOf('\0') === -1) this.lastEventId = value;
+                break;
+            case 'retry':
+                if (/^\d+$/.test(value)) this.retry = parseInt(value, 10);
+                break;
+        }
+    };
+
+    SSEParser.prototype.dispatch = function() {
+        if (!this.data.length) {
+            this.eventType = '';
+            return;
+        }
+        const event = {
+            type: this.eventType || 'message',
+            data: this.data.join('\n'),
+            id: this.lastEventId
+        };
+        this.eventType = '';
+        this.data = [];
+        if (this.onEvent(event) === false) {
+            this.stopped = true;
+        }
+    };
+
+    // An event still missing its blank line when the stream ends is dropped
+    SSEParser.prototype.reset = function() {
+        this.buffer = '';
+        this.eventType = '';
+        this.data = [];
+        this.stopped = false;
+    };
+
+    function SSEError(message, response) {
+        this.name = 'SSEError';
+        this.message = message;
+        this.response = response || null;
+        this.status = response ? response.status : 0;
+    }
+    SSEError.prototype = Object.create(Error.prototype);
+
+    function sleep(ms, signal) {
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(resolve, ms);
+            if (signal) {
+                signal.addEventListener('abort', () => {
+                    clearTimeout(timer);
+                    reject(new DOMException('Aborted', 'AbortError'));
+                }, { once: true });
+            }
+        });
+    }
+
+    // Read one response body into the parser until it ends or the handler stops it
+    async function readBody(response, parser) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        try {
+            while (true) {
+                const {value, done} = await reader.read();
+                if (done) {
+                    parser.feed(decoder.decode());
+                    return;
+                }
+                if (!parser.feed(decoder.decode(value, { stream: true }))) {
+                    await reader.cancel();
+                    return;
+                }
+            }
+        } finally {
+            reader.releaseLock();
+        }
+    }
+
+    /*
+     * Stream events from `url`. Options:
+     *   method, headers, body, signal - passed to fetch
+     *   onOpen(response) - called before reading; return false to skip the body
+     *   onEvent({type, data, id}) - called per event; return false to stop
+     *   reconnect - retry after a dropped connection, sending Last-Event-ID
+     *   maxRetries, retryDelay - reconnect limits; the server's retry field wins
+     * Non-2xx responses reject with an SSEError unless onOpen handles them.
+     * Resolves when the stream ends or is stopped; aborts reject as usual.
+     */
+    async function stream(url, options) {
+        const parser = new SSEParser(options.onEvent);
+        const maxRetries = options.reconnect ? (options.maxRetries ?? 3) : 0;
+        let attempt = 0;
+
+        while (true) {
+            const headers = Object.assign({ 'Accept': 'text/event-stream' }, options.headers || {});
+            if (parser.lastEventId) {
+                headers['Last-Event-ID'] = parser.lastEventId;
+            }
+
+            let response;
+            try {
+                response = await fetch(url, {
+                    method: options.method || 'GET',
+                    headers: headers,
+                    body: options.body,
+                    signal: options.signal
+                });
+                if (options.onOpen && options.onOpen(response) === false) return;
+                if (!response.ok) {
+                    throw new SSEError(`Stream request failed with status ${response.status}`, response);
+                }
+                attempt = 0;
+                // The server closing the stream ends it; only drops are retried
+                await readBody(response, parser);
+                return;
+            } catch (error) {
+                // Aborts and HTTP errors are final; dropped connections may be retried
+                if (error.name === 'AbortError' || error instanceof SSEError || attempt >= maxRetries) {
+                    throw error;
+                }
+                console.warn('Event stream interrupted, reconnecting:', error);
+            }
+
+            attempt++;
+            parser.reset();
+            await sleep(parser.retry ?? (options.retryDelay ?? 1000) * attempt, options.signal);
+        }
+    }
+
+    return {
+        SSEParser: SSEParser,
+        SSEError: SSEError,
+        stream: stream
+    };
+})();
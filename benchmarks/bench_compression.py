@@ -0,0 +1,168 @@
+# benchmarks/bench_compression.py
+"""
+Benchmark compression of message bodies at rest.
+
+Writes the same synthetic corpus of chat messages into a throwaway SQLite
+database once per compression setting, then reports the database size after
+VACUUM, the time to load conversation histories the way the chat API does,
+and the time to decompress a single answer.
+The full-text search tables are left out so only the message storage is compared.
+
+Usage:
+    python benchmarks/bench_compression.py --messages 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import User, Conversation, ChatMessage
+from app.services.compression import TextCompressor, set_compressor, train_dictionary, zstandard
+from bench_search import sentence
+
+LANGUAGES = ["python", "javascript", "sql", "bash"]
+CODE_LINES = [
+    "def handle_request(request, session):",
+    "    result = session.query(Model).filter(Model.id == request.id).first()",
+    "    if result is None:",
+    "        raise HTTPException(status_code=404, detail=\"Not found\")",
+    "    return {\"id\": result.id, \"name\": result.name}",
+    "const response = await fetch(`/api/items/${id}`, { headers });",
+    "SELECT id, name, created_at FROM items WHERE owner_id = ? ORDER BY created_at DESC;",
+    "for file in *.log; do gzip \"$file\"; done",
+]
+
+def answer(rng: random.Random) -> str:
+    """A long assistant answer: markdown prose, a list and usually a code block."""
+    parts = [f"## {sentence(rng, 4).title()}", "", sentence(rng, rng.randint(30, 80)) + ".", ""]
+    parts += [f"- **{sentence(rng, 2)}**: {sentence(rng, rng.randint(6, 16))}" for _ in range(rng.randint(2, 6))]
+    if rng.random() < 0.7:
+        parts += ["", f"```{rng.choice(LANGUAGES)}"]
+        parts += rng.choices(CODE_LINES, k=rng.randint(4, 20))
+        parts += ["```"]
+    parts += ["", sentence(rng, rng.randint(20, 60)) + "."]
+    return "\n".join(parts)
+
+def build_corpus(messages: int, per_conversation: int, seed: int) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for n in range(messages):
+        rows.append({
+            "conversation": n // per_conversation,
+            "content": sentence(rng, rng.randint(5, 40)),
+            "response": answer(rng)
+        })
+    return rows
+
+def run(label: str, compressor: TextCompressor, corpus: list, conversations: int, repeat: int, seed: int) -> dict:
+    set_compressor(compressor)
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_compression.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+
+    user_id = str(uuid.uuid4())
+    conversation_ids = [str(uuid.uuid4()) for _ in range(conversations)]
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{
+            "id": user_id, "username": "bench", "email": "bench@example.com",
+            "full_name": "Bench", "hashed_password": "x", "is_active": True
+        }])
+        conn.execute(Conversation.__table__.insert(), [
+            {"id": cid, "title": "Bench", "user_id": user_id, "version": 1} for cid in conversation_ids
+        ])
+        # Goes through CompressedText, exactly like rows written by the API
+        conn.execute(ChatMessage.__table__.insert(), [
+            {"content": row["content"], "response": row["response"],
+             "conversation_id": conversation_ids[row["conversation"]]}
+            for row in corpus
+        ])
+    write_seconds = time.perf_counter() - started
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    size = os.path.getsize(db_path)
+
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    rng = random.Random(seed)
+    timings = []
+    try:
+        for _ in range(repeat):
+            conversation_id = rng.choice(conversation_ids)
+            start = time.perf_counter()
+            db.query(ChatMessage.id, ChatMessage.content, ChatMessage.response).filter(
+                ChatMessage.conversation_id == conversation_id
+            ).order_by(ChatMessage.timestamp).all()
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(db_path)
+        set_compressor(None)
+
+    # Decompression cost on its own, since history loads also include the table scan
+    stored = [compressor.compress(row["response"]) for row in corpus[:2000]]
+    start = time.perf_counter()
+    for value in stored:
+        compressor.decompress(value)
+    decode_us = (time.perf_counter() - start) / len(stored) * 1e6
+
+    return {
+        "label": label, "size": size, "write": write_seconds,
+        "read": statistics.median(timings), "decode": decode_us
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Message compression benchmark")
+    parser.add_argument("--messages", type=int, default=50_000, help="Messages to generate")
+    parser.add_argument("--per-conversation", type=int, default=40, help="Messages per conversation")
+    parser.add_argument("--threshold", type=int, default=1024, help="Compression threshold in bytes")
+    parser.add_argument("--repeat", type=int, default=500, help="Conversation histories to load")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.per_conversation, args.seed)
+    conversations = (args.messages + args.per_conversation - 1) // args.per_conversation
+    samples = [row["response"].encode("utf-8") for row in corpus[:2000]]
+
+    settings = [("none", TextCompressor())]
+    settings.append(("zlib", TextCompressor(codec="zlib", threshold=args.threshold)))
+    settings.append(("zlib + dictionary", TextCompressor(
+        codec="zlib", threshold=args.threshold, dictionary=train_dictionary(samples, codec="zlib")
+    )))
+    if zstandard is not None:
+        settings.append(("zstd", TextCompressor(codec="zstd", threshold=args.threshold, level=3)))
+        settings.append(("zstd + dictionary", TextCompressor(
+            codec="zstd", threshold=args.threshold, level=3,
+            dictionary=train_dictionary(samples, codec="zstd")
+        )))
+
+    results = [
+        run(label, compressor, corpus, conversations, args.repeat, args.seed)
+        for label, compressor in settings
+    ]
+
+    baseline = results[0]
+    print(f"{args.messages:,} messages, {args.per_conversation} per conversation, "
+          f"threshold {args.threshold} bytes")
+    print(f"{'setting':<20} {'size MB':>8} {'saved':>7} {'write s':>8} {'history ms':>11} "
+          f"{'overhead':>9} {'decode us':>10}")
+    for result in results:
+        saved = 1 - result["size"] / baseline["size"]
+        overhead = result["read"] - baseline["read"]
+        print(f"{result['label']:<20} {result['size'] / 1e6:>8.1f} {saved:>7.1%} "
+              f"{result['write']:>8.1f} {result['read']:>11.2f} {overhead:>+9.2f} {result['decode']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
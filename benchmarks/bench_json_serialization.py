@@ -0,0 +1,126 @@
+# benchmarks/bench_json_serialization.py
+"""
+Benchmark serializing a conversation the way GET /api/conversations/{id}
+returns it.
+
+Compares the path responses used to take (``.isoformat()`` per row,
+FastAPI's ``jsonable_encoder``, then ``json.dumps``) with FastJSONResponse
+on orjson and on its stdlib fallback, plus the per-token SSE frame.
+
+Usage:
+    python benchmarks/bench_json_serialization.py --messages 1000
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.services import fast_json
+from app.services.fast_json import FastJSONResponse, dumps_str
+from bench_compression import answer
+from bench_search import sentence
+
+def build_conversation(messages: int, seed: int) -> dict:
+    """Content as the handler builds it now: datetimes left to the encoder"""
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    return {
+        "conversation": {
+            "id": "bench-conversation",
+            "title": sentence(rng, 5),
+            "created_at": started,
+            "updated_at": started + timedelta(minutes=messages)
+        },
+        "messages": [
+            {
+                "id": n + 1,
+                "content": sentence(rng, rng.randint(5, 40)),
+                "response": answer(rng),
+                "timestamp": started + timedelta(minutes=n, microseconds=rng.randint(0, 999999))
+            }
+            for n in range(messages)
+        ],
+        "has_more": False
+    }
+
+def legacy_render(content: dict) -> bytes:
+    """What the route did before: isoformat by hand, jsonable_encoder, json.dumps"""
+    conversation = content["conversation"]
+    data = {
+        "conversation": {
+            **conversation,
+            "created_at": conversation["created_at"].isoformat(),
+            "updated_at": conversation["updated_at"].isoformat()
+        },
+        "messages": [
+            {**message, "timestamp": message["timestamp"].isoformat()}
+            for message in content["messages"]
+        ],
+        "has_more": content["has_more"]
+    }
+    return JSONResponse(jsonable_encoder(data)).body
+
+def time_ms(render, content, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render(content)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages in the conversation")
+    parser.add_argument("--repeat", type=int, default=50, help="Renders per variant")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    content = build_conversation(args.messages, args.seed)
+    orjson = fast_json.orjson
+    variants = [("isoformat + jsonable_encoder + json", legacy_render)]
+    if orjson is not None:
+        variants.append(("FastJSONResponse (orjson)", lambda value: FastJSONResponse(value).body))
+    variants.append(("FastJSONResponse (stdlib)", None))
+
+    results = []
+    for label, render in variants:
+        if render is None:
+            # The fallback used when orjson isn't installed
+            fast_json.orjson = None
+            try:
+                results.append((label, time_ms(lambda value: FastJSONResponse(value).body, content, args.repeat),
+                                len(FastJSONResponse(content).body)))
+            finally:
+                fast_json.orjson = orjson
+        else:
+            results.append((label, time_ms(render, content, args.repeat), len(render(content))))
+
+    token = {"token": "word ", "conversationId": "bench-conversation"}
+    frames = 100_000
+    start = time.perf_counter()
+    for _ in range(frames):
+        f"data: {json.dumps(token)}\n\n"
+    json_frame_us = (time.perf_counter() - start) / frames * 1e6
+    start = time.perf_counter()
+    for _ in range(frames):
+        f"data: {dumps_str(token)}\n\n"
+    fast_frame_us = (time.perf_counter() - start) / frames * 1e6
+
+    baseline = results[0][1]
+    print(f"{args.messages:,}-message conversation, median of {args.repeat} renders")
+    print(f"{'serializer':<38} {'ms':>8} {'speedup':>8} {'KB':>8}")
+    for label, ms, size in results:
+        print(f"{label:<38} {ms:>8.2f} {baseline / ms:>7.1f}x {size / 1024:>8.0f}")
+    print(f"SSE token frame: json.dumps {json_frame_us:.2f} us, dumps_str {fast_frame_us:.2f} us")
+
+if __name__ == "__main__":
+    main()
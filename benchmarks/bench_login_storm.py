@@ -0,0 +1,170 @@
+# benchmarks/bench_login_storm.py
+"""
+Benchmark token stream latency while a burst of logins hits the same worker.
+
+Starts the application with uvicorn in a subprocess against a throwaway
+SQLite database, with the LLM replaced by a fake that emits one token every
+``--token-interval`` ms. One client streams a chat response while many
+others log in at the same time; the gaps between received tokens show how
+long the event loop was blocked. The run is repeated with bcrypt on the
+event loop (PASSWORD_HASH_WORKERS=0, the old behaviour) and in the hashing
+pool.
+
+Usage:
+    python benchmarks/bench_login_storm.py --logins 40
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# Add the project root directory to Python path
+sys.path.append(str(PROJECT_ROOT))
+
+PASSWORD = "storm-password"
+
+def serve(port: int, token_interval: float, tokens: int):
+    """Run the app with a fake LLM (called in the server subprocess)."""
+    import uvicorn
+    from app.services.llm_service import LLMService
+
+    async def fake_stream(self, prompt, conversation_history=None, params=None):
+        for i in range(tokens):
+            await asyncio.sleep(token_interval)
+            yield f"t{i} "
+
+    LLMService.generate_stream = fake_stream
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+def create_database(db_path: str, users: int):
+    from sqlalchemy import create_engine
+    from app.database import Base
+    from app.models import User
+    from app.auth.utils import get_password_hash
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    hashed = get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": str(uuid.uuid4()), "username": f"storm{i}", "email": f"storm{i}@example.com",
+             "full_name": f"Storm {i}", "hashed_password": hashed, "is_active": True}
+            for i in range(users)
+        ])
+    engine.dispose()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_for_server(client, base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(f"{base_url}/login")
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+async def login(client, base_url: str, username: str) -> float:
+    start = time.perf_counter()
+    response = await client.post(f"{base_url}/api/auth/token", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+async def run_storm(base_url: str, logins: int, users: int) -> dict:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        await wait_for_server(client, base_url)
+        response = await client.post(f"{base_url}/api/auth/token", json={"username": "storm0", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        gaps = []
+        storm = None
+        body = {"message": "Hello", "conversation_id": str(uuid.uuid4())}
+        async with client.stream("POST", f"{base_url}/api/chat", json=body, headers=headers) as stream:
+            last = None
+            async for line in stream.aiter_lines():
+                if not line.startswith("data:") or '"token"' not in line:
+                    continue
+                now = time.perf_counter()
+                if last is None:
+                    # Start the login burst once tokens are flowing
+                    storm = asyncio.gather(*(
+                        login(client, base_url, f"storm{i % users}") for i in range(logins)
+                    ))
+                else:
+                    gaps.append((now - last) * 1000)
+                last = now
+        login_times = await storm
+    gaps.sort()
+    return {
+        "gap_p50": statistics.median(gaps),
+        "gap_p95": gaps[max(int(len(gaps) * 0.95) - 1, 0)],
+        "gap_max": gaps[-1],
+        "login_p50": statistics.median(login_times) * 1000,
+        "login_max": max(login_times) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream latency during a login storm")
+    parser.add_argument("--logins", type=int, default=40, help="Concurrent logins fired during the stream")
+    parser.add_argument("--users", type=int, default=20, help="Distinct accounts used by the storm")
+    parser.add_argument("--token-interval", type=float, default=20, help="Milliseconds between fake tokens")
+    parser.add_argument("--tokens", type=int, default=300, help="Tokens in the streamed response")
+    parser.add_argument("--workers", type=int, default=2, help="Hashing pool size for the pooled run")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.token_interval / 1000, args.tokens)
+        return
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+    create_database(db_path, args.users)
+
+    print(f"{args.logins} logins during a stream of {args.tokens} tokens every {args.token_interval:.0f} ms")
+    print(f"{'bcrypt':<16} {'gap p50':>8} {'gap p95':>8} {'gap max':>8} {'login p50':>10} {'login max':>10}")
+    try:
+        for label, workers in (("on event loop", 0), (f"pool ({args.workers})", args.workers)):
+            port = free_port()
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{db_path}",
+                PASSWORD_HASH_WORKERS=str(workers),
+                PASSWORD_HASH_QUEUE=str(args.logins),
+                LOGIN_ATTEMPTS_PER_USERNAME="0",
+                LOGIN_ATTEMPTS_PER_IP="0"
+            )
+            server = subprocess.Popen(
+                [sys.executable, __file__, "--serve", str(port),
+                 "--token-interval", str(args.token_interval), "--tokens", str(args.tokens)],
+                cwd=PROJECT_ROOT,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            try:
+                result = asyncio.run(run_storm(f"http://127.0.0.1:{port}", args.logins, args.users))
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{label:<16} {result['gap_p50']:>8.1f} {result['gap_p95']:>8.1f} {result['gap_max']:>8.1f} "
+                  f"{result['login_p50']:>10.0f} {result['login_max']:>10.0f}")
+    finally:
+        os.remove(db_path)
+
+if __name__ == "__main__":
+    main()
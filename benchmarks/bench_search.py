@@ -0,0 +1,148 @@
+# benchmarks/bench_search.py
+"""
+Benchmark full-text conversation search over a synthetic corpus.
+
+Builds a throwaway SQLite database with the application schema, fills it with
+generated users, conversations and messages, then times search queries for a
+single user the same way the /api/conversations/search endpoint runs them.
+
+Usage:
+    python benchmarks/bench_search.py --messages 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from itertools import accumulate
+from pathlib import Path
+
+# Add the project root directory to Python path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import User, Conversation, ChatMessage
+from app.services.search import ensure_search_index, search_conversations
+
+SYLLABLES = "ka lo mi ne su ta ri vo pe da zu fi ro be ga ly ho ce tu wa".split()
+
+def make_vocabulary(size: int) -> list:
+    """Generate distinct pseudo-words; index 0 is the most frequent."""
+    words = []
+    n = 0
+    while len(words) < size:
+        word, k = "", n
+        while True:
+            word += SYLLABLES[k % len(SYLLABLES)]
+            k //= len(SYLLABLES)
+            if k == 0:
+                break
+        if len(word) >= 4:
+            words.append(word)
+        n += 1
+    return words
+
+VOCABULARY = make_vocabulary(20000)
+# Zipf distribution, roughly the shape of word frequencies in English text
+CUMULATIVE_WEIGHTS = list(accumulate(1 / (rank + 1) ** 1.07 for rank in range(len(VOCABULARY))))
+
+# Queries across frequency bands: (label, text)
+QUERIES = [
+    ("rank 20 word", VOCABULARY[20]),
+    ("rank 200 word", VOCABULARY[200]),
+    ("rank 2000 word", VOCABULARY[2000]),
+    ("rank 15000 word", VOCABULARY[15000]),
+    ("two words", f"{VOCABULARY[50]} {VOCABULARY[400]}"),
+    ("prefix (3 chars)", VOCABULARY[300][:3] + "*"),
+    ("prefix (4 chars)", VOCABULARY[300][:4] + "*"),
+    ("prefix (6 chars)", VOCABULARY[3000][:6] + "*"),
+    ("no match", "zzzznomatch"),
+]
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=length))
+
+def build_corpus(engine, messages: int, users: int, per_conversation: int, seed: int) -> list:
+    rng = random.Random(seed)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": uid, "username": f"user{i}", "email": f"user{i}@example.com",
+             "full_name": f"User {i}", "hashed_password": "x", "is_active": True}
+            for i, uid in enumerate(user_ids)
+        ])
+
+    batch = []
+    conversation_rows = []
+    conversation_id = None
+    for n in range(messages):
+        if n % per_conversation == 0:
+            conversation_id = str(uuid.uuid4())
+            conversation_rows.append({
+                "id": conversation_id,
+                "title": sentence(rng, 4),
+                "user_id": user_ids[rng.randrange(users)],
+                "version": 1
+            })
+        batch.append({
+            "content": sentence(rng, rng.randint(5, 30)),
+            "response": sentence(rng, rng.randint(20, 120)),
+            "conversation_id": conversation_id
+        })
+        if len(batch) >= 20000:
+            with engine.begin() as conn:
+                conn.execute(Conversation.__table__.insert(), conversation_rows)
+                conn.execute(ChatMessage.__table__.insert(), batch)
+            batch, conversation_rows = [], []
+    if batch:
+        with engine.begin() as conn:
+            if conversation_rows:
+                conn.execute(Conversation.__table__.insert(), conversation_rows)
+            conn.execute(ChatMessage.__table__.insert(), batch)
+    return user_ids
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search benchmark")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Messages to generate")
+    parser.add_argument("--users", type=int, default=50, help="Users to spread conversations across")
+    parser.add_argument("--per-conversation", type=int, default=40, help="Messages per conversation")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
+
+    started = time.perf_counter()
+    user_ids = build_corpus(engine, args.messages, args.users, args.per_conversation, args.seed)
+    print(f"Indexed {args.messages:,} messages in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(db_path) / 1e6:.0f} MB)")
+
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        print(f"{'query':<20} {'hits':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for label, query in QUERIES:
+            timings = []
+            for run in range(args.repeat):
+                user_id = user_ids[run % len(user_ids)]
+                start = time.perf_counter()
+                hits = search_conversations(db, user_id, query, page=1, page_size=20)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+            print(f"{label:<20} {len(hits):>5} {statistics.median(timings):>8.1f} "
+                  f"{p95:>8.1f} {timings[-1]:>8.1f}")
+    finally:
+        db.close()
+        os.remove(db_path)
+
+if __name__ == "__main__":
+    main()
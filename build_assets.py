@@ -0,0 +1,32 @@
+# build_assets.py
+import sys
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from app.services.static_assets import STATIC_DIR, BUILD_DIR, build_assets, brotli
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Write fingerprinted, precompressed copies of the static files for immutable caching'
+    )
+    parser.add_argument('--static-dir', default=STATIC_DIR,
+                        help=f'Static files directory (default: {STATIC_DIR})')
+    parser.add_argument('--clean', action='store_true',
+                        help='Remove copies from earlier builds that the new manifest no longer lists')
+    args = parser.parse_args()
+
+    if brotli is None:
+        logger.warning("brotli is not installed; only gzip copies are built")
+    manifest = build_assets(args.static_dir, clean=args.clean)
+    logger.info(
+        f"{len(manifest)} files in {args.static_dir}/{BUILD_DIR}; "
+        "restart the server to serve them"
+    )
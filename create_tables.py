@@ -7,9 +7,14 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.append(str(project_root))
 
-from app.database import Base, engine, SessionLocal
+from app.database import Base, engine, SessionLocal, add_missing_columns, add_missing_indexes
 from app.models import User, Role, Task
 from app.auth.utils import get_password_hash
+from app.services.search import ensure_search_index
+from app.services.retention import enable_incremental_vacuum, run_retention
+from app.services.compression import (
+    sample_messages, train_dictionary, compress_existing_messages, dictionary_id
+)
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +22,12 @@ logger = logging.getLogger(__name__)
 
 def create_tables():
     """Create database tables"""
+    enable_incremental_vacuum(engine)
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
+    if not ensure_search_index(engine):
+        logger.warning("Full-text search index not created for this database")
     logger.info("Database tables created successfully!")
 
 def init_data():
@@ -89,16 +99,69 @@ def init_data():
     finally:
         db.close()
 
+def train_compression_dictionary(path: str, codec: str, size: int):
+    """Train a compression dictionary on recent messages and write it to ``path``"""
+    samples = sample_messages(engine)
+    if not samples:
+        raise Exception("No messages long enough to train a dictionary on")
+    dictionary = train_dictionary(samples, codec=codec, size=size)
+    with open(path, "wb") as f:
+        f.write(dictionary)
+    logger.info(
+        f"Wrote {len(dictionary)} byte {codec} dictionary {dictionary_id(dictionary):08x} "
+        f"trained on {len(samples)} messages to {path}. "
+        f"Set MESSAGE_COMPRESSION_DICTIONARY={path} to use it for new messages."
+    )
+
+def compress_messages(batch_size: int):
+    """Compress existing long messages and report the space saved"""
+    stats = compress_existing_messages(engine, batch_size=batch_size)
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    ratio = (saved / stats["bytes_before"] * 100) if stats["bytes_before"] else 0.0
+    logger.info(
+        f"Scanned {stats['rows_scanned']} messages, compressed {stats['values_compressed']} values: "
+        f"{stats['bytes_before']} -> {stats['bytes_after']} bytes ({ratio:.1f}% saved), "
+        f"{stats['decompress_us_per_value']:.1f} us to decompress a value"
+    )
+    if stats["values_compressed"] and engine.dialect.name == "sqlite":
+        logger.info("Run VACUUM to return the freed pages to the file system")
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Database management script')
     parser.add_argument('--init-data', action='store_true', help='Initialize database with default data')
+    parser.add_argument('--train-compression-dictionary', metavar='PATH',
+                        help='Train a message compression dictionary and write it to PATH')
+    parser.add_argument('--codec', choices=['zlib', 'zstd'], default='zlib',
+                        help='Codec the dictionary is trained for (default: zlib)')
+    parser.add_argument('--dictionary-size', type=int, default=16 * 1024,
+                        help='Dictionary size in bytes (default: 16384)')
+    parser.add_argument('--compress-existing', action='store_true',
+                        help='Compress stored messages using the MESSAGE_COMPRESSION settings')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Messages rewritten per transaction by --compress-existing')
+    parser.add_argument('--apply-retention', action='store_true',
+                        help='Archive and purge old conversations according to the retention policies')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Rebuild an existing SQLite database so freed space can be reclaimed incrementally')
     args = parser.parse_args()
 
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(engine, convert_existing=True)
+
     logger.info("Creating database tables...")
     create_tables()
 
     if args.init_data:
         logger.info("Initializing default data...")
         init_data()
-        logger.info("Database initialization completed.")
\ No newline at end of file
+        logger.info("Database initialization completed.")
+
+    if args.train_compression_dictionary:
+        train_compression_dictionary(args.train_compression_dictionary, args.codec, args.dictionary_size)
+
+    if args.compress_existing:
+        compress_messages(args.batch_size)
+
+    if args.apply_retention:
+        run_retention()
\ No newline at end of file
@@ -0,0 +1,60 @@
+# signing_keys.py
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from app.config import settings
+from app.auth.keys import create_key_file, read_key_file, rotate_key_file
+from app.auth.utils import ACCESS_TOKEN_EXPIRE_MINUTES
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def list_keys(path: str):
+    """Print the keys in a key file (never the secrets)"""
+    data = read_key_file(path)
+    now = datetime.now(timezone.utc)
+    for entry in data.get("keys", []):
+        state = "current" if entry["kid"] == data.get("current") else "verify only"
+        expires_at = entry.get("expires_at")
+        if expires_at:
+            expired = datetime.fromisoformat(expires_at) <= now
+            state += f", {'expired' if expired else 'expires'} {expires_at}"
+        print(f"{entry['kid']:<32} {state}")
+
+def rotate(path: str, grace_minutes: int):
+    """Make a new key current; previous keys keep verifying for the grace period"""
+    if create_key_file(path):
+        logger.info(f"Created {path}")
+        return
+    key = rotate_key_file(path, timedelta(minutes=grace_minutes))
+    logger.info(
+        f"New current key {key['kid']}; previous keys retire in {grace_minutes} minutes. "
+        f"Running workers pick it up within {settings.JWT_KEYS_RELOAD_SECONDS:.0f} seconds."
+    )
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Manage the access token signing key file')
+    parser.add_argument('--file', default=settings.JWT_KEYS_FILE,
+                        help=f'Key file (default: JWT_KEYS_FILE, {settings.JWT_KEYS_FILE})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='Show key IDs and their state')
+    rotate_parser = subparsers.add_parser('rotate', help='Add a new current key (creates the file if missing)')
+    rotate_parser.add_argument('--grace-minutes', type=int, default=2 * ACCESS_TOKEN_EXPIRE_MINUTES,
+                               help='How long old keys keep verifying tokens '
+                                    f'(default: {2 * ACCESS_TOKEN_EXPIRE_MINUTES}, at least the token lifetime)')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        list_keys(args.file)
+    else:
+        if args.grace_minutes < ACCESS_TOKEN_EXPIRE_MINUTES:
+            logger.warning("Grace period is shorter than the access token lifetime; some users will be logged out")
+        rotate(args.file, args.grace_minutes)
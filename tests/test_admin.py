@@ -1,6 +1,16 @@
 # tests/test_admin.py
+import asyncio
 import pytest
+from datetime import datetime, timezone
 from fastapi import status
+from app.auth.hashing import PasswordHasher
+from app.auth.utils import verify_password
+from app.config import settings
+from app.models.chat import ChatMessage, Conversation
+from app.models.retention import ArchivedConversation
+from app.models.user import User, Role, Task
+from app.services.user_directory import list_users, user_count
+from app.services.user_import import validate_rows, write_plans
 
 def test_list_users(client, admin_token, test_user):
     """Test listing users as admin."""
@@ -52,6 +62,24 @@ def test_delete_user(client, admin_token, test_user):
     )
     assert response.status_code == status.HTTP_200_OK
 
+def test_delete_user_with_conversations(client, test_conversation, admin_token, db_session):
+    """Test deleting a user removes their conversations, messages and archive."""
+    user_id = test_conversation.user_id
+    db_session.add(ArchivedConversation(
+        id="archived-conv", user_id=user_id, title="Old", version=1,
+        created_at=datetime.now(timezone.utc), updated_at=datetime.now(timezone.utc),
+        message_count=0, messages=b""
+    ))
+    db_session.commit()
+
+    response = client.delete(f"/api/admin/users/{user_id}", headers=admin_token)
+    assert response.status_code == status.HTTP_200_OK
+    db_session.expire_all()
+    assert db_session.query(User).filter(User.id == user_id).count() == 0
+    assert db_session.query(Conversation).count() == 0
+    assert db_session.query(ChatMessage).count() == 0
+    assert db_session.query(ArchivedConversation).count() == 0
+
 def test_non_admin_access(client, user_token):
     """Test accessing admin endpoints as non-admin."""
     response = client.get("/api/admin/users", headers=user_token)
@@ -141,4 +169,126 @@ def test_invalid_role_assignment(client, admin_token, test_user):
             "roles": ["invalid_role"]
         }
     )
-    assert response.status_code == status.HTTP_400_BAD_REQUEST
\ No newline at end of file
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def _create_directory_users(db_session, count):
+    for i in range(count):
+        db_session.add(User(
+            username=f"member{i:02d}",
+            email=f"member{i:02d}@example.com",
+            full_name=f"Member Number{i:02d}",
+            hashed_password="x",
+            is_active=True
+        ))
+    db_session.commit()
+
+def test_user_keyset_pagination(db_session):
+    """Cursors walk the list forwards and back without gaps or repeats."""
+    _create_directory_users(db_session, 12)
+
+    first = list_users(db_session, search="member", page_size=5)
+    assert [u.username for u in first["users"]] == [f"member{i:02d}" for i in range(5)]
+    assert first["prev_cursor"] is None
+
+    second = list_users(db_session, search="member", cursor=first["next_cursor"], page_size=5)
+    third = list_users(db_session, search="member", cursor=second["next_cursor"], page_size=5)
+    assert [u.username for u in second["users"]] == [f"member{i:02d}" for i in range(5, 10)]
+    assert [u.username for u in third["users"]] == ["member10", "member11"]
+    assert third["next_cursor"] is None
+
+    back = list_users(db_session, search="member", cursor=third["prev_cursor"], page_size=5)
+    assert [u.username for u in back["users"]] == [u.username for u in second["users"]]
+    assert back["next_cursor"] and back["prev_cursor"]
+
+    with pytest.raises(ValueError):
+        list_users(db_session, cursor="not-a-cursor")
+
+def test_user_search_matches_word_prefixes(db_session):
+    """Search matches the start of any word in username, email or full name."""
+    _create_directory_users(db_session, 3)
+
+    result = list_users(db_session, search="Numb")
+    assert result["total"] == 3 and result["total_exact"]
+    result = list_users(db_session, search="member01@exam")
+    assert [u.username for u in result["users"]] == ["member01"]
+
+def test_user_count_cache(db_session):
+    """The unfiltered total is cached until invalidated."""
+    user_count.invalidate()
+    before = list_users(db_session)["total"]
+    _create_directory_users(db_session, 2)
+    assert list_users(db_session)["total"] == before
+    user_count.invalidate()
+    assert list_users(db_session)["total"] == before + 2
+
+def test_bulk_users_csv(client, admin_token, db_session):
+    """A CSV upload creates, updates and deactivates users and reports every row."""
+    db_session.add_all([Role(name="user"), Task(name="general"), Task(name="music")])
+    _create_directory_users(db_session, 1)
+
+    body = (
+        "action,username,email,full_name,password,roles,tasks\n"
+        "create,alice,alice@example.com,Alice A,alicepass1,user;admin,general\n"
+        "create,bob,bob@example.com,Bob B,bobpass12,,\n"
+        "create,alice,alice2@example.com,Alice Again,alicepass2,,\n"
+        "create,carol,member00@example.com,Carol C,carolpass,,\n"
+        "update,member00,,Renamed Member,,,music\n"
+        "deactivate,nobody,,,,,\n"
+    )
+    response = client.post(
+        "/api/admin/users/bulk",
+        headers={**admin_token, "Content-Type": "text/csv"},
+        content=body
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert (data["created"], data["updated"], data["deactivated"], data["failed"]) == (2, 1, 0, 3)
+    assert [r["status"] for r in data["results"]] == [
+        "created", "created", "error", "error", "updated", "error"
+    ]
+    assert "more than once" in data["results"][2]["error"]
+    assert data["results"][3]["error"] == "Email already registered"
+
+    db_session.expire_all()
+    alice = db_session.query(User).filter(User.username == "alice").first()
+    assert verify_password("alicepass1", alice.hashed_password)
+    assert sorted(role.name for role in alice.roles) == ["admin", "user"]
+    member = db_session.query(User).filter(User.username == "member00").first()
+    assert member.full_name == "Renamed Member"
+    assert [task.name for task in member.tasks] == ["music"]
+
+def test_bulk_users_row_cap(client, admin_token, monkeypatch):
+    """Uploads over BULK_USER_MAX_ROWS are refused with 413 before any hashing."""
+    monkeypatch.setattr(settings, "BULK_USER_MAX_ROWS", 2)
+    rows = [{"action": "deactivate", "username": f"user{i}"} for i in range(3)]
+    response = client.post("/api/admin/users/bulk", headers=admin_token, json=rows)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert "At most 2 rows" in response.json()["detail"]
+
+    response = client.post("/api/admin/users/bulk", headers=admin_token, json=rows[:2])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["failed"] == 2
+
+    hasher = PasswordHasher(bulk_max_batch=2)
+    with pytest.raises(ValueError):
+        asyncio.run(hasher.hash_many(["a", "b", "c"]))
+
+def test_bulk_users_chunk_falls_back_to_rows(db_session, test_user):
+    """A conflict that appears after validation only fails its own row."""
+    rows = [
+        {"username": f"bulk{i}", "email": f"bulk{i}@example.com", "full_name": "Bulk", "password": "x"}
+        for i in range(3)
+    ] + [{"action": "deactivate", "username": "testuser"}]
+    plans, errors = validate_rows(db_session, rows, current_user_id="someone-else")
+    assert errors == []
+    for plan in plans:
+        plan["hashed_password"] = "hashed"
+
+    db_session.add(User(username="bulk1", email="other@example.com", full_name="Taken", hashed_password="x"))
+    db_session.commit()
+
+    results = write_plans(db_session, plans, chunk_size=10)
+    assert [r["status"] for r in results] == ["created", "error", "created", "deactivated"]
+    db_session.refresh(test_user)
+    assert test_user.is_active is False
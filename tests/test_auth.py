@@ -1,7 +1,18 @@
 # tests/test_auth.py
 import pytest
 from fastapi import status
+import asyncio
+from datetime import datetime, timedelta, timezone
 from app.auth.utils import verify_password, get_password_hash
+from app.auth.refresh import (
+    issue_refresh_token, rotate_refresh_token, revoke_user_tokens, RefreshTokenError
+)
+from app.models.token import RefreshToken
+from app.auth.keys import KeyRing, rotate_key_file
+from jose import JWTError, jwt
+from app.auth.hashing import PasswordHasher, PasswordHasherBusy
+from app.auth.throttle import LoginThrottle, client_ip, parse_networks
+from starlette.requests import Request
 
 def test_login_success(client, test_user):
     """Test successful login."""
@@ -68,4 +79,179 @@ def test_password_hashing():
     password = "testpass123"
     hashed = get_password_hash(password)
     assert verify_password(password, hashed)
-    assert not verify_password("wrongpass", hashed)
\ No newline at end of file
+    assert not verify_password("wrongpass", hashed)
+
+def test_password_hasher_pool():
+    """Test that the hashing pool produces hashes the sync helper accepts."""
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+
+    async def run():
+        hashed = await hasher.hash("testpass123")
+        return hashed, await hasher.verify("testpass123", hashed)
+
+    try:
+        hashed, verified = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert verified
+    assert verify_password("testpass123", hashed)
+    assert hasher.stats()["completed"] == 2
+
+def test_password_hasher_rejects_when_queue_full():
+    """Test that operations beyond workers + queue are rejected instead of queued."""
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    hashed = get_password_hash("testpass123")
+
+    async def run():
+        return await asyncio.gather(
+            *(hasher.verify("testpass123", hashed) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert results[:2] == [True, True]
+    assert isinstance(results[2], PasswordHasherBusy)
+    assert hasher.stats()["rejected"] == 1
+
+def test_login_throttle(monkeypatch):
+    """Test that attempts beyond the limit are refused until the window moves on."""
+    now = [1000.0]
+    monkeypatch.setattr("app.auth.throttle.time.monotonic", lambda: now[0])
+    throttle = LoginThrottle(max_attempts=2, window_seconds=60)
+
+    assert throttle.hit("alice") == 0
+    now[0] += 10
+    assert throttle.hit("alice") == 0
+    assert throttle.hit("alice") == pytest.approx(50)
+    assert throttle.hit("bob") == 0
+
+    now[0] += 51
+    assert throttle.hit("alice") == 0
+    throttle.reset("alice")
+    assert throttle.hit("alice") == 0
+    assert throttle.throttled == 1
+
+def test_client_ip_behind_trusted_proxies():
+    """Test that forwarding headers are only believed when a trusted proxy sent them."""
+    def request(peer, *headers):
+        return Request({
+            "type": "http",
+            "client": (peer, 5000),
+            "headers": [(name.encode(), value.encode()) for name, value in headers],
+        })
+
+    proxies = parse_networks("10.0.0.0/8, 192.0.2.1, not-an-ip")
+    assert len(proxies) == 2
+    spoofed = ("x-forwarded-for", "6.6.6.6, 203.0.113.7")
+
+    # No trusted proxies configured, or a peer that isn't one: the peer is the client
+    assert client_ip(request("10.0.0.5", spoofed), []) == "10.0.0.5"
+    assert client_ip(request("198.51.100.2", spoofed), proxies) == "198.51.100.2"
+    # The nearest untrusted hop wins; what the client sent before it is ignored
+    assert client_ip(request("10.0.0.5", spoofed), proxies) == "203.0.113.7"
+    assert client_ip(request("10.0.0.5", ("x-forwarded-for", "203.0.113.7, 192.0.2.1")), proxies) == "203.0.113.7"
+    assert client_ip(request("10.0.0.5", ("forwarded", 'for="[2001:db8::1]:4711";proto=https')), proxies) == "2001:db8::1"
+    assert client_ip(request("10.0.0.5", ("forwarded", "for=203.0.113.7:80")), proxies) == "203.0.113.7"
+    # A proxy that forwarded nothing is itself the client
+    assert client_ip(request("10.0.0.5"), proxies) == "10.0.0.5"
+
+def test_refresh_token_flow(client, test_user, db_session):
+    """Test that login returns a refresh token that can be swapped for new tokens."""
+    response = client.post("/api/auth/token", json={"username": "testuser", "password": "testpass123"})
+    refresh_token = response.json()["refresh_token"]
+    assert response.json()["expires_in"] == 30 * 60
+
+    response = client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["refresh_token"] != refresh_token
+    response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {data['access_token']}"})
+    assert response.json()["username"] == "testuser"
+
+    # Only hashes are stored
+    stored = db_session.query(RefreshToken).all()
+    assert len(stored) == 2
+    assert refresh_token not in [t.token_hash for t in stored]
+
+def test_refresh_token_reuse_revokes_session(db_session, test_user):
+    """Test that a rotated token works within the grace period and revokes the session after it."""
+    now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    token = issue_refresh_token(db_session, test_user.id, now=now)
+    db_session.commit()
+
+    _, rotated = rotate_refresh_token(db_session, token, now=now)
+    # A second tab refreshing with the same token at the same moment
+    _, parallel = rotate_refresh_token(db_session, token, now=now + timedelta(seconds=5))
+
+    with pytest.raises(RefreshTokenError):
+        rotate_refresh_token(db_session, token, now=now + timedelta(minutes=10))
+    for survivor in (rotated, parallel):
+        with pytest.raises(RefreshTokenError):
+            rotate_refresh_token(db_session, survivor, now=now + timedelta(minutes=11))
+
+def test_refresh_token_expiry_and_revocation(db_session, test_user):
+    """Test that sessions end at the sliding expiry, the session cap, or on revocation."""
+    now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    token = issue_refresh_token(db_session, test_user.id, now=now)
+    db_session.commit()
+    with pytest.raises(RefreshTokenError):
+        rotate_refresh_token(db_session, token, now=now + timedelta(days=15))
+
+    # Refreshing every 10 days keeps the session alive until the 90 day cap
+    token = issue_refresh_token(db_session, test_user.id, now=now)
+    db_session.commit()
+    for day in range(10, 90, 10):
+        _, token = rotate_refresh_token(db_session, token, now=now + timedelta(days=day))
+    stored = db_session.query(RefreshToken).order_by(RefreshToken.expires_at.desc()).first()
+    assert stored.expires_at.replace(tzinfo=timezone.utc) == now + timedelta(days=90)
+
+    revoke_user_tokens(db_session, test_user.id)
+    db_session.commit()
+    with pytest.raises(RefreshTokenError):
+        rotate_refresh_token(db_session, token, now=now + timedelta(days=85))
+
+def test_key_ring_tokens_carry_kid():
+    """Test that tokens name their key and other workers with the same keys accept them."""
+    worker_a = KeyRing(inline_keys="new:secret-2,old:secret-1")
+    worker_b = KeyRing(inline_keys="new:secret-2,old:secret-1")
+    token = worker_a.encode({"sub": "testuser"})
+    assert jwt.get_unverified_header(token)["kid"] == "new"
+    assert worker_b.decode(token)["sub"] == "testuser"
+
+    # Tokens signed with a key kept for verification only still work
+    old_token = jwt.encode({"sub": "testuser"}, "secret-1", algorithm="HS256", headers={"kid": "old"})
+    assert worker_b.decode(old_token)["sub"] == "testuser"
+    with pytest.raises(JWTError):
+        worker_b.decode(jwt.encode({"sub": "x"}, "secret-1", algorithm="HS256", headers={"kid": "gone"}))
+
+def test_key_file_rotation(tmp_path):
+    """Test that a rotated key file is picked up and old tokens verify until the grace period ends."""
+    key_file = str(tmp_path / "jwt_keys.json")
+    worker_a = KeyRing(key_file=key_file, reload_seconds=3600)
+    worker_b = KeyRing(key_file=key_file, reload_seconds=3600)
+    old_token = worker_a.encode({"sub": "testuser"})
+    assert worker_b.decode(old_token)["sub"] == "testuser"
+
+    rotate_key_file(key_file, grace=timedelta(hours=1))
+    worker_a._refresh(force=True)
+    new_token = worker_a.encode({"sub": "testuser"})
+    assert jwt.get_unverified_header(new_token)["kid"] != jwt.get_unverified_header(old_token)["kid"]
+    # Worker B has not reloaded yet; the unknown kid makes it re-read the file
+    assert worker_b.decode(new_token)["sub"] == "testuser"
+    assert worker_b.decode(old_token)["sub"] == "testuser"
+
+    rotate_key_file(key_file, grace=timedelta(0))
+    worker_b._refresh(force=True)
+    with pytest.raises(JWTError):
+        worker_b.decode(old_token)
+
+def test_legacy_secret_key():
+    """Test that a plain SECRET_KEY gives the same kid everywhere and accepts tokens without one."""
+    worker_a = KeyRing(legacy_secret="shared-secret")
+    worker_b = KeyRing(legacy_secret="shared-secret")
+    assert worker_b.decode(worker_a.encode({"sub": "testuser"}))["sub"] == "testuser"
+    legacy_token = jwt.encode({"sub": "testuser"}, "shared-secret", algorithm="HS256")
+    assert worker_b.decode(legacy_token)["sub"] == "testuser"
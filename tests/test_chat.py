@@ -2,6 +2,14 @@
 import pytest
 from fastapi import status
 import json
+from sqlalchemy import create_engine, event, text
+from app.api.chat import conversation_list, message_page
+from app.database import Base
+from app.services import search as search_service
+from app.services.search import ensure_search_index
+from app.models.chat import ChatMessage, Conversation
+from app.services.sync import changes_since, record_changes
+from app.services.transfer import LineDecoder, ImportFormatError
 
 def test_create_conversation(client, user_token):
     """Test creating a new conversation."""
@@ -21,6 +29,38 @@ def test_list_conversations(client, user_token, test_conversation):
     assert conversations[0]["id"] == test_conversation.id
     assert conversations[0]["title"] == test_conversation.title
 
+def test_conversation_list_last_messages(db_session, test_user, test_conversation):
+    """Test that the list shows each conversation's newest message, read in one query."""
+    db_session.add_all([
+        Conversation(id="empty-conv", title="Empty", user_id=test_user.id),
+        Conversation(id="other-conv", title="Other", user_id=test_user.id),
+    ])
+    db_session.flush()
+    db_session.add_all([
+        ChatMessage(content="First", response="One", conversation_id="other-conv"),
+        ChatMessage(content="Second", response="", conversation_id="other-conv"),
+    ])
+    db_session.commit()
+    user_id = test_user.id
+    db_session.expire_all()
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", record)
+    try:
+        conversations = {c["id"]: c for c in conversation_list(db_session, user_id)}
+    finally:
+        event.remove(bind, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    assert (conversations["test-conv-id"]["last_message"], conversations["test-conv-id"]["last_response"]) == (
+        "How are you?", "I'm doing well, thank you!"
+    )
+    assert (conversations["other-conv"]["last_message"], conversations["other-conv"]["last_response"]) == ("Second", None)
+    assert (conversations["empty-conv"]["last_message"], conversations["empty-conv"]["last_response"]) == (None, None)
+
 def test_get_conversation(client, user_token, test_conversation):
     """Test getting a specific conversation."""
     response = client.get(
@@ -32,6 +72,94 @@ def test_get_conversation(client, user_token, test_conversation):
     assert data["conversation"]["id"] == test_conversation.id
     assert len(data["messages"]) == 2
 
+def test_get_conversation_pages(client, user_token, test_conversation, db_session):
+    """Test loading a conversation newest page first, then older pages."""
+    db_session.add_all([
+        ChatMessage(content=f"Question {i}", response=f"Answer {i}", conversation_id=test_conversation.id)
+        for i in range(3)
+    ])
+    db_session.commit()
+
+    url = f"/api/conversations/{test_conversation.id}"
+    page = client.get(url, params={"limit": 2}, headers=user_token).json()
+    assert [msg["content"] for msg in page["messages"]] == ["Question 1", "Question 2"]
+    assert page["has_more"] is True
+
+    page = client.get(url, params={"limit": 2, "before": page["messages"][0]["id"]}, headers=user_token).json()
+    assert [msg["content"] for msg in page["messages"]] == ["How are you?", "Question 0"]
+    assert page["has_more"] is True
+
+    page = client.get(url, params={"limit": 2, "before": page["messages"][0]["id"]}, headers=user_token).json()
+    assert [msg["content"] for msg in page["messages"]] == ["Hello"]
+    assert page["has_more"] is False
+
+    with pytest.raises(ValueError):
+        message_page(db_session, test_conversation.id, 2, before=999999)
+
+def test_conversation_etags(client, user_token, test_conversation):
+    """Test that unchanged conversations revalidate with a 304 and changes get a new ETag."""
+    url = f"/api/conversations/{test_conversation.id}"
+    for path in ("/api/conversations", url):
+        response = client.get(path, headers=user_token)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["cache-control"] == "private, no-cache"
+        assert "last-modified" in response.headers
+        etag = response.headers["etag"]
+
+        response = client.get(path, headers={**user_token, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+
+    list_etag = client.get("/api/conversations", headers=user_token).headers["etag"]
+    page_etag = client.get(url, params={"limit": 1}, headers=user_token).headers["etag"]
+    assert page_etag != client.get(url, headers=user_token).headers["etag"]
+
+    client.put(url, headers=user_token, json={"title": "Renamed"})
+    response = client.get("/api/conversations", headers={**user_token, "If-None-Match": list_etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["title"] == "Renamed"
+    response = client.get(url, params={"limit": 1}, headers={**user_token, "If-None-Match": page_etag})
+    assert response.status_code == status.HTTP_200_OK
+
+def test_sync_changes(client, user_token, test_user, test_conversation, db_session):
+    """Test that the change feed returns current state, tombstones and resets."""
+    response = client.get("/api/sync", headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["reset"] is True
+    cursor = data["cursor"]
+    conversation_id = test_conversation.id
+    message_id = test_conversation.messages[0].id
+
+    created = client.post("/api/conversations", headers=user_token).json()["id"]
+    client.put(f"/api/conversations/{conversation_id}", headers=user_token, json={"title": "Renamed"})
+    client.put(f"/api/conversations/{conversation_id}", headers=user_token, json={"title": "Renamed again"})
+
+    data = client.get("/api/sync", params={"since": cursor}, headers=user_token).json()
+    assert data["reset"] is False
+    assert data["has_more"] is False
+    assert [conv["id"] for conv in data["conversations"]] == [created, conversation_id]
+    assert data["conversations"][1]["title"] == "Renamed again"
+    assert data["conversations"][1]["last_message"] == "How are you?"
+    assert int(data["cursor"]) > int(cursor)
+    cursor = data["cursor"]
+
+    # Nothing new since the last cursor
+    data = client.get("/api/sync", params={"since": cursor}, headers=user_token).json()
+    assert data["conversations"] == [] and data["cursor"] == cursor
+
+    record_changes(db_session, test_user.id, message_ids=[message_id])
+    db_session.commit()
+    client.delete(f"/api/conversations/{conversation_id}", headers=user_token)
+    data = client.get("/api/sync", params={"since": cursor}, headers=user_token).json()
+    assert data["conversations"] == []
+    assert data["deleted"] == {"conversations": [conversation_id], "messages": [message_id]}
+
+    # Paging, and a cursor older than the retained feed
+    page = changes_since(db_session, test_user.id, 0, 1)
+    assert page["has_more"] is True and len(page["conversations"]) == 1
+    assert changes_since(db_session, test_user.id, int(data["cursor"]) + 5, 100)["reset"] is True
+
 def test_delete_conversation(client, user_token, test_conversation):
     """Test deleting a conversation."""
     response = client.delete(
@@ -83,6 +211,19 @@ async def test_chat_message_streaming(client, user_token, test_conversation, moc
     
     assert "test response" in full_response
 
+def test_chat_stores_streamed_response(client, user_token, test_conversation, mock_llm_service, db_session):
+    """Test that the streamed response is saved through the request's database."""
+    response = client.post(
+        "/api/chat",
+        headers=user_token,
+        json={"message": "Store me", "conversation_id": test_conversation.id}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text.endswith("data: [DONE]\n\n")
+
+    message = db_session.query(ChatMessage).filter(ChatMessage.content == "Store me").one()
+    assert message.response == "This is a test response from the mocked LLM service."
+
 def test_chat_unauthorized(client, test_conversation):
     """Test chat without authentication."""
     response = client.post(
@@ -130,4 +271,117 @@ async def test_chat_llm_error(client, user_token, test_conversation, mock_llm_se
                     error_found = True
                     break
     
-    assert error_found
\ No newline at end of file
+    assert error_found
+
+def test_search_conversations(client, user_token, test_conversation):
+    """Test full-text search over messages and titles."""
+    response = client.get(
+        "/api/conversations/search?q=doing",
+        headers=user_token
+    )
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["results"]
+    assert len(results) == 1
+    assert results[0]["conversation_id"] == test_conversation.id
+    assert "<mark>doing</mark>" in results[0]["snippet"]
+
+    # Title matches are returned without a message id
+    response = client.get("/api/conversations/search?q=Test Conv*", headers=user_token)
+    results = response.json()["results"]
+    assert any(r["message_id"] is None for r in results)
+
+def test_search_conversations_is_scoped_to_user(client, test_conversation, admin_token):
+    """Test that search never returns another user's messages."""
+    response = client.get(
+        "/api/conversations/search?q=doing",
+        headers=admin_token
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["results"] == []
+
+def test_search_conversations_escapes_operators(client, user_token, test_conversation):
+    """Test that FTS syntax in the query is treated as plain text."""
+    response = client.get(
+        '/api/conversations/search?q="unbalanced AND OR (',
+        headers=user_token
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+def test_search_index_rebuilt_only_when_changed(tmp_path, monkeypatch):
+    """Test that startup leaves current search tables and triggers alone and updates stale ones."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(bind=engine)
+    assert ensure_search_index(engine)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    assert ensure_search_index(engine)
+    assert not [s for s in statements if s.lstrip().upper().startswith(("DROP", "CREATE TRIGGER", "CREATE VIEW"))]
+
+    monkeypatch.setattr(search_service, "SQLITE_SEARCH_VERSION", "changed")
+    assert ensure_search_index(engine)
+    assert any(s.lstrip().upper().startswith("DROP TRIGGER") for s in statements)
+    assert not [s for s in statements if s.lstrip().upper().startswith("DROP TABLE")]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM search_schema WHERE name = 'sqlite'")).scalar() == "changed"
+        triggers = conn.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'")).scalar()
+    assert triggers == 9
+
+    # A changed table definition recreates that table and indexes existing rows
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email, full_name, hashed_password, is_active) "
+                          "VALUES ('u1', 'u1', 'u1@example.com', 'U', 'x', 1)"))
+        conn.execute(text("INSERT INTO conversations (id, title, user_id, version) VALUES ('c1', 'Holiday plans', 'u1', 1)"))
+        conn.execute(text("DROP TRIGGER conversations_fts_insert"))
+        conn.execute(text("INSERT INTO conversations (id, title, user_id, version) VALUES ('c2', 'Holiday photos', 'u1', 1)"))
+    statements.clear()
+    monkeypatch.setitem(search_service.SQLITE_TABLE_VERSIONS, "conversations_fts", "changed")
+    assert ensure_search_index(engine)
+    dropped = [s.strip() for s in statements if s.lstrip().upper().startswith("DROP TABLE")]
+    assert dropped == ["DROP TABLE IF EXISTS conversations_fts"]
+    with engine.connect() as conn:
+        matches = conn.execute(text("SELECT count(*) FROM conversations_fts WHERE conversations_fts MATCH 'holi*'")).scalar()
+        triggers = conn.execute(text("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'")).scalar()
+    assert (matches, triggers) == (2, 9)
+    engine.dispose()
+
+def test_export_and_import_conversations(client, user_token, test_conversation, db_session):
+    """Test that an NDJSON export can be imported back as new conversations."""
+    response = client.get("/api/conversations/export", headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["type"] for r in records] == ["export", "conversation", "message", "message"]
+    assert records[2]["content"] == "Hello"
+
+    response = client.post(
+        "/api/conversations/import",
+        content=response.content + b"not json\n",
+        headers=user_token
+    )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["conversations"] == 1
+    assert result["messages"] == 2
+    assert result["skipped"] == 1
+    assert result["errors"][0].startswith("Line 5")
+
+    conversations = client.get("/api/conversations", headers=user_token).json()
+    assert len(conversations) == 2
+    imported = next(c for c in conversations if c["id"] != test_conversation.id)
+    assert imported["title"] == test_conversation.title
+    assert imported["last_response"] == "I'm doing well, thank you!"
+
+def test_export_and_import_gzip(client, user_token, test_conversation):
+    """Test the gzipped export and that imports detect gzip input."""
+    response = client.get("/api/conversations/export?gzip=true", headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content[:2] == b"\x1f\x8b"
+    assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+
+    response = client.post("/api/conversations/import", content=response.content, headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["messages"] == 2
+
+    with pytest.raises(ImportFormatError):
+        list(LineDecoder().feed(b"\x1f\x8bnot really gzip"))
@@ -0,0 +1,115 @@
+# tests/test_chat_socket.py
+import asyncio
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from app.config import settings
+from app.database import get_session_factory
+from app.main import app
+from app.services.llm_service import LLMService
+
+def connect(client, user_token):
+    websocket = client.websocket_connect("/api/chat/ws")
+    socket = websocket.__enter__()
+    socket.send_json({"type": "auth", "token": user_token["Authorization"].split(" ", 1)[1]})
+    assert socket.receive_json() == {"type": "ready"}
+    return websocket, socket
+
+def receive_until_done(socket, stream_ids):
+    """Frames per stream id until every stream has ended"""
+    frames = {stream_id: [] for stream_id in stream_ids}
+    open_streams = set(stream_ids)
+    while open_streams:
+        frame = socket.receive_json()
+        if frame.get("type") == "ping":
+            continue
+        frames[frame["id"]].append(frame)
+        if frame.get("done") or frame.get("error"):
+            open_streams.discard(frame["id"])
+    return frames
+
+def test_chat_socket_requires_auth(client):
+    """Test that the first frame must carry a valid access token."""
+    with client.websocket_connect("/api/chat/ws") as socket:
+        socket.send_json({"type": "auth", "token": "not-a-token"})
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            socket.receive_json()
+        assert exc_info.value.code == 1008
+
+def test_chat_socket_multiplexes_streams(client, user_token, test_conversation, mock_llm_service):
+    """Test that two streams share one socket and each ends with done."""
+    websocket, socket = connect(client, user_token)
+    try:
+        socket.send_json({"type": "chat", "id": "a", "message": "Hello", "conversation_id": test_conversation.id})
+        socket.send_json({"type": "chat", "id": "b", "message": "Hi", "conversation_id": "socket-conv"})
+        socket.send_json({"type": "chat", "id": "c", "conversation_id": "socket-conv"})
+        frames = receive_until_done(socket, ["a", "b", "c"])
+    finally:
+        websocket.__exit__(None, None, None)
+
+    for stream_id in ("a", "b"):
+        tokens = "".join(frame.get("token", "") for frame in frames[stream_id])
+        assert tokens == "This is a test response from the mocked LLM service."
+        assert any("messageId" in frame for frame in frames[stream_id])
+        assert frames[stream_id][-1] == {"id": stream_id, "done": True}
+    assert frames["c"] == [{"id": "c", "error": "Message is required", "status": 400}]
+
+def test_chat_socket_cancel(client, user_token, test_conversation, monkeypatch):
+    """Test that a cancel frame stops one stream and keeps the connection."""
+    async def slow_generate_stream(*args, **kwargs):
+        for i in range(200):
+            await asyncio.sleep(0.01)
+            yield f"token {i} "
+
+    monkeypatch.setattr(LLMService, "generate_stream", slow_generate_stream)
+    websocket, socket = connect(client, user_token)
+    try:
+        socket.send_json({"type": "chat", "id": "slow", "message": "Hello", "conversation_id": test_conversation.id})
+        while "token" not in socket.receive_json():
+            pass
+        socket.send_json({"type": "cancel", "id": "slow"})
+        frames = receive_until_done(socket, ["slow"])["slow"]
+        assert frames[-1] == {"id": "slow", "done": True}
+        assert sum(1 for frame in frames if "token" in frame) < 100
+    finally:
+        websocket.__exit__(None, None, None)
+
+def test_chat_socket_releases_sessions(client, user_token, test_conversation, mock_llm_service):
+    """Test that no database session stays open between turns."""
+    # The test session factory the client fixture installed
+    session_factory = app.dependency_overrides[get_session_factory]()
+    sessions = []
+
+    def tracked_session():
+        session = session_factory()
+        sessions.append(session)
+        return session
+
+    app.dependency_overrides[get_session_factory] = lambda: tracked_session
+    websocket, socket = connect(client, user_token)
+    try:
+        socket.send_json({"type": "chat", "id": "a", "message": "Hello", "conversation_id": test_conversation.id})
+        receive_until_done(socket, ["a"])
+        # Authentication, the turn and saving the response
+        assert len(sessions) == 3
+        assert not any(session.in_transaction() for session in sessions)
+    finally:
+        websocket.__exit__(None, None, None)
+
+def test_chat_socket_streaming_client_stays_connected(client, user_token, test_conversation, monkeypatch):
+    """Test that a client busy reading a stream isn't dropped for missing pings."""
+    async def slow_generate_stream(*args, **kwargs):
+        for i in range(40):
+            await asyncio.sleep(0.01)
+            yield f"token {i} "
+
+    monkeypatch.setattr(LLMService, "generate_stream", slow_generate_stream)
+    monkeypatch.setattr(settings, "CHAT_SOCKET_HEARTBEAT_SECONDS", 0.05)
+    websocket, socket = connect(client, user_token)
+    try:
+        # Pings are never answered here
+        socket.send_json({"type": "chat", "id": "long", "message": "Hello", "conversation_id": test_conversation.id})
+        frames = receive_until_done(socket, ["long"])["long"]
+        assert frames[-1] == {"id": "long", "done": True}
+        assert sum(1 for frame in frames if "token" in frame) == 40
+    finally:
+        websocket.__exit__(None, None, None)
@@ -0,0 +1,123 @@
+# tests/test_compression.py
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from app.models.chat import ChatMessage
+from app.services.compression import (
+    TextCompressor, CompressionError, set_compressor, train_dictionary,
+    compress_existing_messages
+)
+from app.services.search import search_conversations
+
+LONG_TEXT = "The quick brown fox jumps over the lazy dog while the band plays jazz. " * 40
+
+@pytest.fixture
+def zlib_compressor():
+    """Compress message bodies with zlib for the duration of a test."""
+    compressor = TextCompressor(codec="zlib", threshold=256)
+    set_compressor(compressor)
+    yield compressor
+    set_compressor(None)
+
+def test_compress_round_trip():
+    """Test that long values are compressed and short values left alone."""
+    compressor = TextCompressor(codec="zlib", threshold=256)
+
+    stored = compressor.compress(LONG_TEXT)
+    assert isinstance(stored, bytes)
+    assert len(stored) < len(LONG_TEXT)
+    assert compressor.decompress(stored) == LONG_TEXT
+
+    assert compressor.compress("short") == "short"
+    assert compressor.decompress("short") == "short"
+    assert compressor.decompress(None) is None
+
+def test_decompress_without_compression_enabled():
+    """Test that compressed values stay readable after compression is switched off."""
+    stored = TextCompressor(codec="zlib", threshold=256).compress(LONG_TEXT)
+    disabled = TextCompressor()
+
+    assert disabled.compress(LONG_TEXT) == LONG_TEXT
+    assert disabled.decompress(stored) == LONG_TEXT
+
+def test_dictionary_compression():
+    """Test that a trained dictionary is used and required for reading."""
+    samples = [(LONG_TEXT + f" message {i}").encode("utf-8") for i in range(20)]
+    dictionary = train_dictionary(samples, codec="zlib", size=4096)
+    assert 0 < len(dictionary) <= 4096
+
+    compressor = TextCompressor(codec="zlib", threshold=256, dictionary=dictionary)
+    plain = TextCompressor(codec="zlib", threshold=256)
+    stored = compressor.compress(LONG_TEXT)
+    assert len(stored) < len(plain.compress(LONG_TEXT))
+    assert compressor.decompress(stored) == LONG_TEXT
+
+    with pytest.raises(CompressionError):
+        plain.decompress(stored)
+
+def test_zstd_round_trip():
+    """Test the zstd codec when the optional package is installed."""
+    pytest.importorskip("zstandard")
+    compressor = TextCompressor(codec="zstd", threshold=256)
+
+    stored = compressor.compress(LONG_TEXT)
+    assert isinstance(stored, bytes)
+    assert TextCompressor().decompress(stored) == LONG_TEXT
+
+def test_zstd_from_many_threads():
+    """Test that one compressor can be used from the route thread pool at once."""
+    pytest.importorskip("zstandard")
+    compressor = TextCompressor(codec="zstd", threshold=256)
+    texts = [LONG_TEXT + f" message {i} " * (i % 50) for i in range(400)]
+
+    def round_trip(value):
+        return compressor.decompress(compressor.compress(value)) == value
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert all(pool.map(round_trip, texts))
+
+def test_compressed_column_and_search(db_session, test_conversation, zlib_compressor):
+    """Test that long messages are stored compressed and remain searchable."""
+    message = ChatMessage(
+        content=LONG_TEXT + " saxophone",
+        response="Short answer",
+        conversation_id=test_conversation.id
+    )
+    db_session.add(message)
+    db_session.commit()
+
+    stored_type = db_session.execute(
+        text("SELECT typeof(content), typeof(response) FROM chat_messages WHERE id = :id"),
+        {"id": message.id}
+    ).one()
+    assert tuple(stored_type) == ("blob", "text")
+
+    db_session.expire_all()
+    assert db_session.get(ChatMessage, message.id).content.endswith("saxophone")
+
+    results = search_conversations(db_session, test_conversation.user_id, "saxophone")
+    assert [r["message_id"] for r in results] == [message.id]
+
+def test_compress_existing_messages(db_session, test_conversation):
+    """Test that the backfill compresses long rows written before it was enabled."""
+    message = ChatMessage(
+        content=LONG_TEXT,
+        response=LONG_TEXT,
+        conversation_id=test_conversation.id
+    )
+    db_session.add(message)
+    db_session.commit()
+
+    stats = compress_existing_messages(
+        db_session.get_bind(),
+        batch_size=1,
+        compressor=TextCompressor(codec="zlib", threshold=256)
+    )
+    assert stats["rows_scanned"] == 3
+    assert stats["values_compressed"] == 2
+    assert stats["bytes_after"] < stats["bytes_before"]
+
+    db_session.expire_all()
+    assert db_session.get(ChatMessage, message.id).response == LONG_TEXT
+    results = search_conversations(db_session, test_conversation.user_id, "jazz")
+    assert [r["message_id"] for r in results] == [message.id]
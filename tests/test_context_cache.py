@@ -0,0 +1,72 @@
+# tests/test_context_cache.py
+import pytest
+from fastapi import status
+from app.services.context_cache import ConversationContextCache, context_cache
+
+def test_cache_hit_and_version_miss():
+    """Test that lookups only hit when the version matches."""
+    cache = ConversationContextCache(max_entries=4)
+    cache.put("conv", 1, [{"id": 1, "content": "Hello", "response": "Hi there!"}])
+
+    assert cache.get("conv", 1) is not None
+    assert cache.get("conv", 2) is None
+    # A stale entry is dropped on a version mismatch
+    assert cache.get("conv", 1) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+def test_cache_lru_eviction():
+    """Test that the least recently used conversation is evicted."""
+    cache = ConversationContextCache(max_entries=2)
+    cache.put("a", 1, [])
+    cache.put("b", 1, [])
+    cache.get("a", 1)
+    cache.put("c", 1, [])
+
+    assert cache.get("a", 1) is not None
+    assert cache.get("b", 1) is None
+    assert cache.stats()["entries"] == 2
+
+def test_cache_append_and_update_response():
+    """Test appending a new exchange and filling in its response."""
+    cache = ConversationContextCache()
+    cache.put("conv", 1, [{"id": 1, "content": "Hello", "response": "Hi"}])
+
+    cache.append_message("conv", {"id": 2, "content": "More", "response": ""}, 1, 2)
+    cache.update_response("conv", 2, "Sure thing", 2, 3)
+
+    context = cache.get("conv", 3)
+    assert [msg["content"] for msg in context.messages] == ["Hello", "More"]
+    assert context.messages[-1]["response"] == "Sure thing"
+    assert context.char_count == len("HelloHiMoreSure thing")
+    assert context.estimated_tokens == context.char_count // 4
+
+def test_cache_append_with_unexpected_version_invalidates():
+    """Test that a concurrent change from another worker drops the entry."""
+    cache = ConversationContextCache()
+    cache.put("conv", 1, [])
+
+    cache.append_message("conv", {"id": 1, "content": "Hello", "response": ""}, 5, 6)
+
+    assert cache.stats()["entries"] == 0
+
+def test_title_update_invalidates_cache(client, user_token, test_conversation):
+    """Test that renaming a conversation drops its cached context."""
+    context_cache.put(test_conversation.id, test_conversation.version, [])
+
+    response = client.put(
+        f"/api/conversations/{test_conversation.id}",
+        headers=user_token,
+        json={"title": "Renamed"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert context_cache.get(test_conversation.id, test_conversation.version) is None
+
+def test_cache_stats_endpoint(client, admin_token):
+    """Test that admins can read the context cache hit rate."""
+    response = client.get("/api/admin/cache-stats", headers=admin_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert "hit_rate" in response.json()["context_cache"]
@@ -0,0 +1,24 @@
+# tests/test_database.py
+from app.database import sync_database_url, async_database_url, engine_options
+
+def test_sqlite_urls():
+    """Test that SQLite keeps its URL and gets the aiosqlite driver for async."""
+    assert sync_database_url("sqlite:///./chat.db") == "sqlite:///./chat.db"
+    assert async_database_url("sqlite:///./chat.db") == "sqlite+aiosqlite:///./chat.db"
+    assert engine_options("sqlite:///./chat.db") == {}
+
+def test_postgres_urls():
+    """Test that PostgreSQL URLs map to psycopg2 and asyncpg."""
+    assert sync_database_url("postgres://u:p@db/chat") == "postgresql://u:p@db/chat"
+    assert sync_database_url("postgresql+asyncpg://u:p@db/chat") == "postgresql://u:p@db/chat"
+    assert async_database_url("postgresql://u:p@db/chat") == "postgresql+asyncpg://u:p@db/chat"
+    assert async_database_url("postgres://u:p@db/chat") == "postgresql+asyncpg://u:p@db/chat"
+
+def test_postgres_pool_options():
+    """Test that server databases get pool and statement timeout settings."""
+    options = engine_options("postgresql://u:p@db/chat")
+    assert options["pool_pre_ping"] is True
+    assert "statement_timeout" in options["connect_args"]["options"]
+
+    async_options = engine_options("postgresql+asyncpg://u:p@db/chat", is_async=True)
+    assert "statement_timeout" in async_options["connect_args"]["server_settings"]
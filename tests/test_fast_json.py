@@ -0,0 +1,43 @@
+# tests/test_fast_json.py
+import json
+import uuid
+from datetime import datetime, timezone
+import pytest
+from app.services import fast_json
+from app.services.fast_json import FastJSONResponse, dumps
+
+VALUE = {
+    "id": 7,
+    "title": "Ünïcode ✓",
+    "created_at": datetime(2024, 5, 1, 12, 30, 15, 250000),
+    "updated_at": datetime(2024, 5, 1, 12, 30, 15, tzinfo=timezone.utc),
+    "owner": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "tags": ("a", "b"),
+    "missing": None
+}
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_matches_isoformat(monkeypatch, use_orjson):
+    """Test that both encoders write datetimes exactly as .isoformat() does."""
+    if use_orjson and fast_json.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+
+    decoded = json.loads(dumps(VALUE))
+    assert decoded == {
+        "id": 7,
+        "title": "Ünïcode ✓",
+        "created_at": VALUE["created_at"].isoformat(),
+        "updated_at": VALUE["updated_at"].isoformat(),
+        "owner": str(VALUE["owner"]),
+        "tags": ["a", "b"],
+        "missing": None
+    }
+    assert b" " not in dumps({"a": [1, 2]})
+
+def test_fast_json_response():
+    """Test that the response renders compact UTF-8 JSON."""
+    response = FastJSONResponse({"created_at": datetime(2024, 1, 2, 3, 4, 5)})
+    assert response.body == b'{"created_at":"2024-01-02T03:04:05"}'
+    assert response.headers["content-type"] == "application/json"
@@ -0,0 +1,86 @@
+# tests/test_model_catalog.py
+import asyncio
+import pytest
+from app.services.model_catalog import ModelCatalog, ModelCatalogUnavailable, normalize_models, model_catalog
+from app.services.llm_service import LLMService, ModelNotAvailable, DEFAULT_MODEL
+
+def make_loader(calls, fail=None):
+    async def loader():
+        calls.append(1)
+        if fail and fail[0]:
+            raise ConnectionError("LM Studio is down")
+        return [{"id": f"model-{len(calls)}", "name": f"model-{len(calls)}", "context_length": 8192}]
+    return loader
+
+def test_normalize_models_adds_metadata():
+    """Test that capability metadata is attached where the backend reports it."""
+    listing = {"data": [{"id": "b", "owned_by": "me"}, {"id": "a"}]}
+    models = normalize_models(listing, {"a": {"max_context_length": 32768, "state": "loaded", "type": "llm"}})
+    assert [m["id"] for m in models] == ["a", "b"]
+    assert (models[0]["context_length"], models[0]["loaded"], models[0]["type"]) == (32768, True, "llm")
+    assert (models[1]["context_length"], models[1]["loaded"]) == (None, None)
+
+def test_catalog_ttl_and_stale_while_revalidate():
+    """Test that fresh lists are cached and stale ones are served while refreshing."""
+    calls = []
+
+    async def run():
+        catalog = ModelCatalog("http://lm", "key", ttl_seconds=60, stale_seconds=600, loader=make_loader(calls))
+        first, etag = await catalog.get()
+        again, same_etag = await catalog.get()
+        assert len(calls) == 1 and again is first and same_etag == etag
+
+        catalog.ttl_seconds = 0
+        stale, stale_etag = await catalog.get()
+        assert stale is first and stale_etag == etag
+        await asyncio.sleep(0)  # let the background refresh run
+        fresh, fresh_etag = await catalog.get()
+        return first, fresh, etag, fresh_etag
+
+    first, fresh, etag, fresh_etag = asyncio.run(run())
+    assert first[0]["id"] == "model-1"
+    assert fresh[0]["id"] == "model-2"
+    assert fresh_etag != etag
+
+def test_catalog_serves_cached_list_on_error():
+    """Test stale-if-error, and a clean error when nothing is cached."""
+    calls, fail = [], [False]
+
+    async def run():
+        catalog = ModelCatalog("http://lm", "key", ttl_seconds=0, stale_seconds=0, loader=make_loader(calls, fail))
+        models, _ = await catalog.get()
+        fail[0] = True
+        assert (await catalog.get())[0] is models
+        catalog.clear()
+        with pytest.raises(ModelCatalogUnavailable):
+            await catalog.get()
+
+    asyncio.run(run())
+    assert len(calls) == 3
+
+def test_concurrent_misses_share_one_fetch():
+    """Test that simultaneous requests on an empty cache trigger one fetch."""
+    calls = []
+
+    async def run():
+        catalog = ModelCatalog("http://lm", "key", loader=make_loader(calls))
+        results = await asyncio.gather(*[catalog.get() for _ in range(5)])
+        return {etag for _, etag in results}
+
+    assert len(asyncio.run(run())) == 1
+    assert len(calls) == 1
+
+def test_llm_service_validates_models_from_catalog(monkeypatch):
+    """Test that LLMService checks models against the cache without a request."""
+    # Nothing cached yet: any model is passed on to LM Studio
+    assert LLMService(model="anything").model == "anything"
+
+    monkeypatch.setattr(model_catalog, "loader", make_loader([]))
+    asyncio.run(model_catalog.get())
+    try:
+        assert LLMService(model="model-1").model == "model-1"
+        assert LLMService().model == DEFAULT_MODEL
+        with pytest.raises(ModelNotAvailable):
+            LLMService(model="missing")
+    finally:
+        model_catalog.clear()
@@ -0,0 +1,86 @@
+# tests/test_page_shells.py
+import json
+import re
+import app.api.auth as auth_api
+from app.auth.refresh import issue_refresh_token
+from app.auth.utils import create_access_token, PAGE_TOKEN_COOKIE
+from app.services.page_shells import embed_json
+
+def bootstrap_of(html: str):
+    match = re.search(r'<script id="bootstrap-data" type="application/json">(.*?)</script>', html, re.S)
+    return json.loads(match.group(1)) if match else None
+
+def test_page_shell_etag(client):
+    """Test that pages are served with an ETag and revalidate to a 304."""
+    response = client.get("/login")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.headers["cache-control"] == "no-cache"
+    etag = response.headers["etag"]
+
+    response = client.get("/login", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Without a page cookie the chat page is the plain shell
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "etag" in response.headers
+    assert bootstrap_of(response.text) is None
+
+def test_embed_json_escapes_markup():
+    """Test that embedded data can't close the script element."""
+    element = embed_json({"title": "</script><script>alert(1)</script> & \u2028"}).decode()
+    payload = element[element.index(">") + 1:-len("</script>")]
+    assert "<" not in payload and ">" not in payload and "\u2028" not in payload
+    assert json.loads(payload) == {"title": "</script><script>alert(1)</script> & \u2028"}
+
+def test_chat_page_bootstrap(client, test_user, test_conversation):
+    """Test that a valid page cookie embeds the user's data in the chat page."""
+    client.cookies.set(PAGE_TOKEN_COOKIE, create_access_token(data={"sub": test_user.username}))
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert response.headers["cache-control"] == "private, no-store"
+
+    bootstrap = bootstrap_of(response.text)
+    assert bootstrap["user"]["username"] == "testuser"
+    assert bootstrap["user"]["tasks"] == ["general"]
+    assert [c["id"] for c in bootstrap["conversations"]] == ["test-conv-id"]
+    assert bootstrap["conversation"]["conversation"]["id"] == "test-conv-id"
+    assert [m["content"] for m in bootstrap["conversation"]["messages"]] == ["Hello", "How are you?"]
+    assert bootstrap["conversation"]["has_more"] is False
+    assert bootstrap["sync_cursor"].isdigit()
+
+    # An invalid cookie falls back to the plain shell
+    client.cookies.set(PAGE_TOKEN_COOKIE, "not-a-token")
+    response = client.get("/")
+    assert response.status_code == 200
+    assert bootstrap_of(response.text) is None
+
+def test_refresh_sets_page_cookie(client, test_user, db_session):
+    """Test that token refresh renews the page cookie and logout removes it."""
+    refresh_token = issue_refresh_token(db_session, test_user.id)
+    db_session.commit()
+
+    response = client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{PAGE_TOKEN_COOKIE}={response.json()['access_token']}")
+    assert "HttpOnly" in cookie and "SameSite=strict" in cookie
+
+    response = client.post("/api/auth/logout", json={"refresh_token": response.json()["refresh_token"]})
+    assert response.status_code == 200
+    assert 'Max-Age=0' in response.headers["set-cookie"] or '=""' in response.headers["set-cookie"]
+
+def test_failed_logout_clears_page_cookie(client, monkeypatch):
+    """Test that the page cookie is removed even when revoking the session fails."""
+    def fail(db, token):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(auth_api, "revoke_refresh_token", fail)
+
+    response = client.post("/api/auth/logout", json={"refresh_token": "some-token"})
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Error during logout"}
+    assert response.headers["set-cookie"].startswith(f"{PAGE_TOKEN_COOKIE}=")
+    assert 'Max-Age=0' in response.headers["set-cookie"] or '=""' in response.headers["set-cookie"]
@@ -0,0 +1,81 @@
+# tests/test_principal_cache.py
+import pytest
+from fastapi import status
+from sqlalchemy import event
+from app.auth.principal import Principal, PrincipalCache, principal_cache
+
+def make_principal(username: str = "someone") -> Principal:
+    return Principal(id=f"{username}-id", username=username, is_active=True, is_superuser=False, roles=("user",))
+
+def test_cache_hit_and_ttl_expiry(monkeypatch):
+    """Test that entries are served until their TTL runs out."""
+    now = [1000.0]
+    monkeypatch.setattr("app.auth.principal.time.monotonic", lambda: now[0])
+    cache = PrincipalCache(max_entries=4, ttl_seconds=30)
+    cache.put("someone", make_principal())
+
+    assert cache.get("someone").username == "someone"
+    now[0] += 31
+    assert cache.get("someone") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 0
+
+def test_cache_lru_eviction_and_invalidate():
+    """Test that the least recently used principal is evicted and invalidate drops an entry."""
+    cache = PrincipalCache(max_entries=2, ttl_seconds=30)
+    cache.put("a", make_principal("a"))
+    cache.put("b", make_principal("b"))
+    cache.get("a")
+    cache.put("c", make_principal("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+def test_zero_ttl_disables_cache():
+    """Test that a TTL of zero turns caching off."""
+    cache = PrincipalCache(max_entries=2, ttl_seconds=0)
+    cache.put("a", make_principal("a"))
+    assert cache.get("a") is None
+
+def test_principal_is_admin():
+    """Test that both superusers and admin role members count as admins."""
+    assert not make_principal().is_admin
+    assert Principal(id="1", username="root", is_active=True, is_superuser=True).is_admin
+    assert Principal(id="2", username="ops", is_active=True, is_superuser=False, roles=("admin",)).is_admin
+
+def test_cached_request_skips_user_query(client, db_session, user_token):
+    """Test that a repeated request authenticates without loading the user again."""
+    response = client.get("/api/conversations", headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/conversations", headers=user_token)
+    finally:
+        event.remove(bind, "before_cursor_execute", record)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not any("FROM users" in statement for statement in statements)
+    assert principal_cache.stats()["hits"] >= 1
+
+def test_admin_update_invalidates_principal(client, test_user, user_token, admin_token):
+    """Test that an admin change to a user is visible on that user's next request."""
+    client.get("/api/auth/me", headers=user_token)
+    assert principal_cache.get(test_user.username) is not None
+
+    response = client.put(
+        f"/api/admin/users/{test_user.id}",
+        json={"full_name": "Renamed User"},
+        headers=admin_token
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert principal_cache.get(test_user.username) is None
@@ -0,0 +1,105 @@
+# tests/test_quota.py
+import pytest
+import app.api.chat as chat_api
+from app.config import settings
+from app.models.quota import QuotaPolicy
+from app.models.user import Role
+from app.services.quota import (
+    QuotaManager, QuotaLimits, QuotaExceeded, MemoryBucketStore, SQLiteBucketStore,
+    resolve_limits, default_limits
+)
+
+NOW = 1_700_000_000.0
+
+def test_requests_per_minute():
+    """Test that the request bucket refills continuously."""
+    manager = QuotaManager(MemoryBucketStore())
+    limits = QuotaLimits(requests_per_minute=2)
+    manager.acquire("u", limits, now=NOW)
+    manager.acquire("u", limits, now=NOW)
+    with pytest.raises(QuotaExceeded) as excinfo:
+        manager.acquire("u", limits, now=NOW + 1)
+    assert excinfo.value.limit == "requests"
+    assert excinfo.value.retry_after == pytest.approx(29.0)
+    manager.acquire("u", limits, now=NOW + 30)
+    # Other users have their own buckets
+    manager.acquire("v", limits, now=NOW + 30)
+
+def test_token_buckets_cap_and_debit():
+    """Test that max_tokens follows the token buckets and long answers go into debt."""
+    manager = QuotaManager(MemoryBucketStore())
+    limits = QuotaLimits(tokens_per_hour=1000, max_tokens=2000)
+    assert manager.acquire("u", limits, now=NOW) == 1000
+    manager.consume("u", limits, 900, now=NOW)
+    assert manager.acquire("u", limits, now=NOW) == 100
+
+    manager.consume("u", limits, 500, now=NOW)
+    with pytest.raises(QuotaExceeded) as excinfo:
+        manager.acquire("u", limits, now=NOW)
+    assert excinfo.value.limit == "tokens_hour"
+    assert excinfo.value.retry_after == pytest.approx(401 * 3.6)
+    assert manager.acquire("u", limits, now=NOW + 3600) == 600
+
+    assert manager.acquire("u", QuotaLimits(max_tokens=300), now=NOW) == 300
+    assert manager.acquire("u", QuotaLimits(), now=NOW) is None
+
+def test_sqlite_store_is_shared(tmp_path):
+    """Test that managers on the same state file share buckets."""
+    path = str(tmp_path / "quota.db")
+    limits = QuotaLimits(requests_per_minute=1)
+    QuotaManager(SQLiteBucketStore(path)).acquire("u", limits, now=NOW)
+    # A second worker, or the same one after a restart
+    with pytest.raises(QuotaExceeded):
+        QuotaManager(SQLiteBucketStore(path)).acquire("u", limits, now=NOW + 1)
+
+def test_resolve_limits(db_session, test_user):
+    """Test that user policies win and several roles take the most generous limit."""
+    assert resolve_limits(db_session, test_user.id).as_dict() == default_limits().as_dict()
+
+    user_role = db_session.query(Role).filter_by(name="user").first()
+    admin_role = db_session.query(Role).filter_by(name="admin").first()
+    test_user.roles.append(admin_role)
+    db_session.add_all([
+        QuotaPolicy(role_id=user_role.id, requests_per_minute=5, tokens_per_day=10000),
+        QuotaPolicy(role_id=admin_role.id, requests_per_minute=20, tokens_per_day=None),
+    ])
+    db_session.commit()
+    limits = resolve_limits(db_session, test_user.id)
+    assert (limits.requests_per_minute, limits.tokens_per_day) == (20, None)
+
+    db_session.add(QuotaPolicy(user_id=test_user.id, requests_per_minute=1))
+    db_session.commit()
+    manager = QuotaManager(MemoryBucketStore())
+    assert manager.limits_for(db_session, test_user.id).requests_per_minute == 1
+
+    db_session.query(QuotaPolicy).filter_by(user_id=test_user.id).delete()
+    db_session.commit()
+    assert manager.limits_for(db_session, test_user.id).requests_per_minute == 1
+    manager.invalidate(test_user.id)
+    assert manager.limits_for(db_session, test_user.id).requests_per_minute == 20
+
+def test_chat_returns_429_with_retry_after(
+    client, user_token, admin_token, test_conversation, mock_llm_service, monkeypatch, tmp_path
+):
+    """Test that /api/chat answers 429 with Retry-After and spends no token on refused requests."""
+    monkeypatch.setattr(settings, "QUOTA_REQUESTS_PER_MINUTE", 1)
+    manager = QuotaManager(SQLiteBucketStore(str(tmp_path / "quota.db")))
+    monkeypatch.setattr(chat_api, "quota_manager", manager)
+
+    # Another user's conversation is refused before the quota is checked
+    response = client.post(
+        "/api/chat", headers=admin_token, json={"message": "Hello", "conversation_id": test_conversation.id}
+    )
+    assert response.status_code == 404
+    response = client.post(
+        "/api/chat", headers=admin_token, json={"message": "Hello", "conversation_id": "admin-conv-id"}
+    )
+    assert response.status_code == 200
+
+    body = {"message": "Hello", "conversation_id": test_conversation.id}
+    response = client.post("/api/chat", headers=user_token, json=body)
+    assert response.status_code == 200
+    response = client.post("/api/chat", headers=user_token, json=body)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["retry-after"]) <= 60
+    assert manager.rejected == 1
@@ -0,0 +1,136 @@
+# tests/test_response_compression.py
+import asyncio
+import gzip
+import json
+import time
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.main import app
+from app.services.llm_service import LLMService
+from app.services.response_compression import CompressionMiddleware
+
+ROWS = [{"id": i, "content": f"message {i}"} for i in range(200)]
+
+async def large_json(request):
+    return JSONResponse(ROWS, headers={"ETag": '"rows"'})
+
+async def small_json(request):
+    return JSONResponse({"ok": True})
+
+async def encoded(request):
+    return Response(gzip.compress(b"x" * 4096), headers={"Content-Encoding": "gzip"}, media_type="text/plain")
+
+async def streamed_json(request):
+    async def rows():
+        for row in ROWS:
+            yield json.dumps(row) + "\n"
+    return StreamingResponse(rows(), media_type="application/json")
+
+async def events(request):
+    async def frames():
+        for i in range(3):
+            yield f"data: {i}\n\n"
+    return StreamingResponse(frames(), media_type="text/event-stream")
+
+def make_client():
+    test_app = Starlette(routes=[
+        Route("/large", large_json),
+        Route("/small", small_json),
+        Route("/encoded", encoded),
+        Route("/streamed", streamed_json),
+        Route("/events", events)
+    ])
+    test_app.add_middleware(CompressionMiddleware, minimum_size=500, content_types=["application/json", "text/plain"])
+    return TestClient(test_app)
+
+def test_compresses_large_json():
+    """Test that large JSON is gzipped with a weak ETag and small JSON is not."""
+    client = make_client()
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"rows"'
+    assert int(response.headers["content-length"]) < len(json.dumps(ROWS))
+    assert response.json() == ROWS
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+def test_streamed_and_encoded_bodies():
+    """Test streamed JSON compression and that encoded bodies are left alone."""
+    client = make_client()
+    response = client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert [json.loads(line) for line in response.text.splitlines()] == ROWS
+
+    response = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert response.content == b"x" * 4096
+
+def test_event_stream_passes_through():
+    """Test that event streams are never compressed."""
+    response = make_client().get("/events", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+
+async def time_to_first_token(headers, body):
+    """Seconds until the first token frame of /api/chat leaves the app, and the response headers"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/chat",
+        "raw_path": b"/api/chat",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80)
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+
+    started = time.perf_counter()
+    result = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+        elif b'"token"' in message.get("body", b"") and "ttft" not in result:
+            result["ttft"] = time.perf_counter() - started
+            result["frame"] = message["body"]
+
+    await app(scope, receive, send)
+    return result
+
+@pytest.mark.asyncio
+async def test_chat_stream_time_to_first_token(client, user_token, test_conversation, monkeypatch):
+    """Test that accepting gzip doesn't delay the first streamed token."""
+    async def slow_generate_stream(*args, **kwargs):
+        yield "first "
+        await asyncio.sleep(0.5)
+        yield "second"
+
+    monkeypatch.setattr(LLMService, "generate_stream", slow_generate_stream)
+    body = json.dumps({"message": "Hello", "conversation_id": test_conversation.id}).encode()
+    headers = {**user_token, "Content-Type": "application/json"}
+
+    plain = await time_to_first_token({**headers, "Accept-Encoding": "identity"}, body)
+    compressed = await time_to_first_token({**headers, "Accept-Encoding": "gzip, br"}, body)
+
+    assert "content-encoding" not in compressed["headers"]
+    assert compressed["frame"].startswith(b"data: ")
+    # The first token goes out before the model sleeps, with or without compression
+    assert plain["ttft"] < 0.4
+    assert compressed["ttft"] < 0.4
@@ -0,0 +1,199 @@
+# tests/test_retention.py
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import status
+from sqlalchemy import create_engine, text
+from app.models.chat import Conversation, ChatMessage
+from app.models.retention import RetentionPolicy, ArchivedConversation
+from app.models.user import Role
+from app.services import retention
+from app.services.retention import (
+    apply_retention, resolve_policies, restore_conversation, delete_conversations,
+    enable_incremental_vacuum, incremental_vacuum, run_retention
+)
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+def add_conversation(db_session, user, conversation_id, days_idle, messages=2):
+    """Create a conversation last active ``days_idle`` days before NOW."""
+    updated_at = NOW - timedelta(days=days_idle)
+    db_session.add(Conversation(id=conversation_id, title=conversation_id, user_id=user.id, updated_at=updated_at))
+    db_session.add_all([
+        ChatMessage(
+            content=f"Question {i}",
+            response=f"Answer {i}",
+            conversation_id=conversation_id,
+            timestamp=updated_at
+        )
+        for i in range(messages)
+    ])
+    db_session.commit()
+
+def test_resolve_policies(db_session, test_user, test_admin):
+    """Test that user policies win and several roles take the most generous limit."""
+    add_conversation(db_session, test_user, "user-conv", 1)
+    add_conversation(db_session, test_admin, "admin-conv", 1)
+    user_role = db_session.query(Role).filter_by(name="user").first()
+    admin_role = db_session.query(Role).filter_by(name="admin").first()
+    test_user.roles.append(admin_role)
+    db_session.add_all([
+        RetentionPolicy(role_id=user_role.id, archive_after_days=30, purge_after_days=None),
+        RetentionPolicy(role_id=admin_role.id, archive_after_days=90, purge_after_days=365),
+        RetentionPolicy(user_id=test_admin.id, archive_after_days=7, purge_after_days=14)
+    ])
+    db_session.commit()
+
+    groups = resolve_policies(db_session)
+    assert groups[(90, None)] == [test_user.id]
+    assert groups[(7, 14)] == [test_admin.id]
+
+def test_archive_purge_and_restore(db_session, test_user):
+    """Test that retention archives and purges by age and archived conversations can be restored."""
+    add_conversation(db_session, test_user, "fresh", 5)
+    add_conversation(db_session, test_user, "cold", 45)
+    add_conversation(db_session, test_user, "ancient", 400)
+    db_session.add(RetentionPolicy(user_id=test_user.id, archive_after_days=30, purge_after_days=365))
+    db_session.commit()
+
+    stats = apply_retention(db_session, now=NOW)
+    assert stats["archived"] == 1
+    assert stats["purged"] == 1
+
+    assert [c.id for c in db_session.query(Conversation).all()] == ["fresh"]
+    assert db_session.query(ChatMessage).count() == 2
+    archived = db_session.query(ArchivedConversation).one()
+    assert archived.id == "cold"
+    assert archived.message_count == 2
+
+    conversation = restore_conversation(db_session, archived)
+    assert conversation.version == 2
+    messages = db_session.query(ChatMessage)\
+        .filter(ChatMessage.conversation_id == "cold")\
+        .order_by(ChatMessage.id)\
+        .all()
+    assert [m.content for m in messages] == ["Question 0", "Question 1"]
+    assert db_session.query(ArchivedConversation).count() == 0
+
+def test_list_archived_conversations(client, user_token, db_session, test_user):
+    """Test that the archived list is served as JSON with ISO timestamps."""
+    add_conversation(db_session, test_user, "cold", 45)
+    db_session.add(RetentionPolicy(user_id=test_user.id, archive_after_days=30, purge_after_days=None))
+    db_session.commit()
+    apply_retention(db_session, now=NOW)
+
+    response = client.get("/api/conversations/archived", headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/json"
+    [archived] = response.json()
+    assert (archived["id"], archived["message_count"]) == ("cold", 2)
+    assert datetime.fromisoformat(archived["updated_at"]).date() == (NOW - timedelta(days=45)).date()
+
+def test_chat_refuses_archived_conversation(client, user_token, db_session, test_user, mock_llm_service):
+    """Test that a stale client can't recreate an archived conversation by posting to it."""
+    add_conversation(db_session, test_user, "cold", 45)
+    db_session.add(RetentionPolicy(user_id=test_user.id, archive_after_days=30))
+    db_session.commit()
+    apply_retention(db_session, now=NOW)
+
+    response = client.post("/api/chat", headers=user_token, json={"message": "Hi", "conversation_id": "cold"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert db_session.query(Conversation).filter(Conversation.id == "cold").count() == 0
+
+def test_archive_merges_recreated_conversation(db_session, test_user):
+    """Test that a live conversation with an archived id is merged into the archive instead of failing the run."""
+    add_conversation(db_session, test_user, "cold", 45)
+    db_session.add(RetentionPolicy(user_id=test_user.id, archive_after_days=30))
+    db_session.commit()
+    assert apply_retention(db_session, now=NOW)["archived"] == 1
+
+    # As left behind by clients before archived ids were refused
+    add_conversation(db_session, test_user, "cold", 40, messages=1)
+    add_conversation(db_session, test_user, "older", 50)
+    for run in range(2):
+        stats = apply_retention(db_session, now=NOW)
+        assert stats["archived"] == (2 if run == 0 else 0)
+
+    assert db_session.query(Conversation).count() == 0
+    db_session.expire_all()
+    cold = db_session.query(ArchivedConversation).filter(ArchivedConversation.id == "cold").one()
+    assert cold.message_count == 3
+    assert db_session.query(ArchivedConversation).count() == 2
+
+def test_failing_chunk_does_not_block_retention(db_session, test_user, monkeypatch):
+    """Test that a conversation that can't be archived is skipped and the rest still are."""
+    for conversation_id, days in (("bad", 90), ("old", 80), ("cold", 45)):
+        add_conversation(db_session, test_user, conversation_id, days)
+    db_session.add(RetentionPolicy(user_id=test_user.id, archive_after_days=30))
+    db_session.commit()
+
+    archive_chunk = retention._archive_chunk
+    def failing_archive_chunk(db, ids, cutoff):
+        if "bad" in ids:
+            raise RuntimeError("cannot archive")
+        return archive_chunk(db, ids, cutoff)
+    monkeypatch.setattr(retention, "_archive_chunk", failing_archive_chunk)
+    monkeypatch.setattr(retention.settings, "RETENTION_CHUNK_SIZE", 2)
+
+    assert apply_retention(db_session, now=NOW)["archived"] == 2
+    assert [c.id for c in db_session.query(Conversation).all()] == ["bad"]
+
+def test_delete_rechecks_cutoff(db_session, test_user):
+    """Test that retention deletes leave conversations active since the cutoff alone."""
+    add_conversation(db_session, test_user, "fresh", 5)
+    assert delete_conversations(db_session, ["fresh"], updated_before=NOW - timedelta(days=30)) == 0
+    db_session.commit()
+    assert db_session.query(ChatMessage).filter(ChatMessage.conversation_id == "fresh").count() == 2
+
+def test_run_retention_skips_recent_runs(db_session, monkeypatch):
+    """Test that a worker skips its scheduled run when another one just ran."""
+    monkeypatch.setattr(retention, "SessionLocal", lambda: db_session)
+    monkeypatch.setattr(db_session, "close", lambda: None)
+    assert run_retention(min_interval_seconds=600) is not None
+    assert run_retention(min_interval_seconds=600) is None
+    assert run_retention() is not None
+
+def test_archived_conversations_are_purged(db_session, test_user):
+    """Test that the purge limit also removes conversations already in the archive."""
+    add_conversation(db_session, test_user, "cold", 100)
+    policy = RetentionPolicy(user_id=test_user.id, archive_after_days=30)
+    db_session.add(policy)
+    db_session.commit()
+    assert apply_retention(db_session, now=NOW)["archived"] == 1
+
+    policy.purge_after_days = 60
+    db_session.commit()
+    stats = apply_retention(db_session, now=NOW)
+    assert stats["purged_archived"] == 1
+    assert db_session.query(ArchivedConversation).count() == 0
+
+def test_retention_policy_endpoints(client, test_user, admin_token):
+    """Test creating, replacing and listing retention policies."""
+    policy = {"user_id": test_user.id, "archive_after_days": 30}
+    response = client.put("/api/admin/retention/policies", json=policy, headers=admin_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == test_user.username
+
+    policy["purge_after_days"] = 90
+    response = client.put("/api/admin/retention/policies", json=policy, headers=admin_token)
+    assert response.json()["purge_after_days"] == 90
+
+    response = client.get("/api/admin/retention/policies", headers=admin_token)
+    assert len(response.json()) == 1
+
+    response = client.post("/api/admin/retention/run", headers=admin_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["archived"] == 0
+
+def test_incremental_vacuum(tmp_path):
+    """Test that a new SQLite database uses incremental vacuum and gives space back."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'vacuum.db'}")
+    assert enable_incremental_vacuum(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE blobs (data BLOB)"))
+        conn.execute(text("INSERT INTO blobs VALUES (randomblob(100000))"))
+        conn.execute(text("DELETE FROM blobs"))
+
+    assert incremental_vacuum(engine, pages=5) > 0
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA freelist_count")).scalar() == 0
+    engine.dispose()
@@ -1,6 +1,7 @@
 # tests/test_settings.py
 import pytest
 from fastapi import status
+from app.services.model_catalog import model_catalog
 
 def test_list_models(client, user_token):
     """Test listing available LM Studio models."""
@@ -29,4 +30,24 @@ def test_list_models_server_error(client, user_token, monkeypatch):
     monkeypatch.setattr("aiohttp.ClientSession.get", mock_error_request)
     
     response = client.get("/api/settings/models", headers=user_token)
-    assert response.status_code == status.HTTP_502_BAD_GATEWAY
\ No newline at end of file
+    assert response.status_code == status.HTTP_502_BAD_GATEWAY
+
+
+def test_list_models_etag(client, user_token, monkeypatch):
+    """Test that the cached model list can be revalidated with its ETag."""
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return [{"id": "llama", "name": "llama", "context_length": 4096}]
+
+    monkeypatch.setattr(model_catalog, "loader", loader)
+    model_catalog.clear()
+    response = client.get("/api/settings/models", headers=user_token)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["context_length"] == 4096
+    etag = response.headers["etag"]
+
+    response = client.get("/api/settings/models", headers={**user_token, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert len(calls) == 1
@@ -0,0 +1,76 @@
+# tests/test_static_assets.py
+import gzip
+import json
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from app.services.http_cache import accepted_encodings
+from app.services.static_assets import (
+    AssetFiles, AssetManifest, build_assets, IMMUTABLE_CACHE_CONTROL
+)
+
+SCRIPT = ("console.log('family chat');\n" * 40).encode()
+
+def make_static_dir(tmp_path):
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "chat.js").write_bytes(SCRIPT)
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "tiny.css").write_bytes(b"body{}")
+    return tmp_path
+
+def test_accepted_encodings():
+    """Test Accept-Encoding negotiation with q-values and wildcards."""
+    assert accepted_encodings("gzip, deflate, br", ["br", "gzip"]) == ["br", "gzip"]
+    assert accepted_encodings("gzip;q=1.0, br;q=0.5", ["br", "gzip"]) == ["gzip", "br"]
+    assert accepted_encodings("br;q=0, *", ["br", "gzip"]) == ["gzip"]
+    assert accepted_encodings("identity", ["br", "gzip"]) == []
+    assert accepted_encodings(None, ["br", "gzip"]) == []
+
+def test_build_assets(tmp_path):
+    """Test that the build writes fingerprinted and compressed copies plus a manifest."""
+    static_dir = make_static_dir(tmp_path)
+    manifest = build_assets(str(static_dir))
+
+    target = manifest["js/chat.js"]
+    assert target.startswith("js/chat.") and target.endswith(".js") and target != "js/chat.js"
+    build_dir = static_dir / "build"
+    assert (build_dir / target).read_bytes() == SCRIPT
+    assert gzip.decompress((build_dir / (target + ".gz")).read_bytes()) == SCRIPT
+    # Too small to be worth compressing
+    assert not (build_dir / (manifest["css/tiny.css"] + ".gz")).exists()
+    assert json.loads((build_dir / "manifest.json").read_text()) == manifest
+
+    # A changed file gets a new name; --clean drops the old copy
+    (static_dir / "js" / "chat.js").write_bytes(SCRIPT + b"// changed\n")
+    rebuilt = build_assets(str(static_dir), clean=True)
+    assert rebuilt["js/chat.js"] != target
+    assert not (build_dir / target).exists()
+    assert (build_dir / rebuilt["js/chat.js"]).exists()
+
+    manifest_urls = AssetManifest(str(static_dir))
+    assert manifest_urls.url("js/chat.js") == f"/static/build/{rebuilt['js/chat.js']}"
+    assert manifest_urls.url("/js/new.js") == "/static/js/new.js"
+
+def test_asset_files_serve_precompressed(tmp_path):
+    """Test that fingerprinted copies are immutable and served in the best encoding."""
+    static_dir = make_static_dir(tmp_path)
+    target = build_assets(str(static_dir))["js/chat.js"]
+    client = TestClient(Starlette(routes=[Mount("/static", AssetFiles(directory=str(static_dir)))]))
+
+    response = client.get(f"/static/build/{target}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-type"].startswith("text/javascript")
+    assert response.content == SCRIPT
+
+    response = client.get(f"/static/build/{target}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.content == SCRIPT
+
+    # Plain files keep revalidation instead of immutable caching
+    response = client.get("/static/js/chat.js")
+    assert response.status_code == 200
+    assert "cache-control" not in response.headers
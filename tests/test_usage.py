@@ -0,0 +1,139 @@
+# tests/test_usage.py
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import status
+from sqlalchemy.orm import sessionmaker
+from app.models.usage import UsageEvent, UsageRollup
+from app.models.user import Task
+from app.services.usage import (
+    UsageRecorder, write_events, rollup_usage, purge_usage_events,
+    top_users, latency_percentiles, usage_by_task, histogram_percentile, settled_events,
+    empty_histogram, add_to_histogram
+)
+
+NOW = datetime(2024, 6, 1, 12, 30, tzinfo=timezone.utc)
+
+def event(user_id, minutes_ago, completion_tokens=100, ttft_ms=200, duration_ms=2000, status="ok"):
+    return {
+        "user_id": user_id,
+        "conversation_id": None,
+        "model": "local-model",
+        "status": status,
+        "prompt_tokens": 50,
+        "completion_tokens": completion_tokens,
+        "ttft_ms": ttft_ms,
+        "duration_ms": duration_ms,
+        "created_at": NOW - timedelta(minutes=minutes_ago)
+    }
+
+def test_recorder_buffers_until_flush(db_session):
+    """Test that recording only buffers and flush writes one batch."""
+    recorder = UsageRecorder(session_factory=sessionmaker(bind=db_session.get_bind()), max_buffer=3)
+    for i in range(4):
+        recorder.record(user_id=f"user-{i}", model="local-model", status="ok", completion_tokens=i)
+    assert db_session.query(UsageEvent).count() == 0
+    assert recorder.stats()["dropped"] == 1
+
+    assert recorder.flush() == 3
+    assert [e.user_id for e in db_session.query(UsageEvent).order_by(UsageEvent.id)] == ["user-1", "user-2", "user-3"]
+    assert recorder.flush() == 0
+
+def test_rollup_is_incremental(db_session):
+    """Test hourly and daily rollups, including events written after a run."""
+    write_events(db_session, [event("a", 5), event("a", 50), event("b", 10, completion_tokens=10)])
+    assert rollup_usage(db_session) == 3
+
+    hourly = db_session.query(UsageRollup).filter_by(period="hour", user_id="a").order_by(UsageRollup.bucket_start).all()
+    assert [r.requests for r in hourly] == [1, 1]
+    daily = db_session.query(UsageRollup).filter_by(period="day", user_id="a").one()
+    assert (daily.requests, daily.completion_tokens) == (2, 200)
+
+    # A late event for an hour that was already rolled up is added to it
+    write_events(db_session, [event("a", 6, status="error")])
+    assert rollup_usage(db_session) == 1
+    assert rollup_usage(db_session) == 0
+    db_session.refresh(daily)
+    assert (daily.requests, daily.errors, daily.completion_tokens) == (3, 1, 300)
+
+    assert purge_usage_events(db_session, 1, now=NOW + timedelta(days=2)) == 4
+    assert db_session.query(UsageRollup).filter_by(period="day", user_id="a").one().requests == 3
+
+def test_rollup_merges_histograms_across_runs(db_session):
+    """Test that a second run adds to the stored latency histograms."""
+    write_events(db_session, [event("a", 5, ttft_ms=100), event("a", 6, ttft_ms=100)])
+    rollup_usage(db_session)
+    write_events(db_session, [event("a", 7, ttft_ms=5000)])
+    rollup_usage(db_session)
+
+    latency = latency_percentiles(db_session, period="day", periods=1, user_id="a", now=NOW)
+    assert latency["requests"] == 3
+    assert latency["ttft_ms"]["p50"] == 100
+    assert latency["ttft_ms"]["p99"] == 5000
+
+def test_settled_events_stop_at_recent_writes():
+    """Test that events written inside the settle window hold back the rest."""
+    written = [NOW - timedelta(seconds=30), None, NOW - timedelta(seconds=2), NOW - timedelta(seconds=40)]
+    events = [UsageEvent(id=i + 1, written_at=at) for i, at in enumerate(written)]
+
+    settled, held_back = settled_events(events, 10, now=NOW)
+    assert [e.id for e in settled] == [1, 2]
+    assert held_back
+    assert settled_events(events, 0, now=NOW) == (events, False)
+
+def test_usage_reports_read_rollups(db_session, test_user):
+    """Test top users, percentiles and per-task usage."""
+    write_events(db_session, [event(test_user.id, i, ttft_ms=100 * (i + 1)) for i in range(10)])
+    write_events(db_session, [event("other", 1, completion_tokens=5)])
+    rollup_usage(db_session)
+    db_session.query(UsageEvent).delete()
+    db_session.commit()
+
+    top = top_users(db_session, period="hour", periods=2, now=NOW)
+    assert [row["username"] for row in top] == ["testuser", None]
+    assert top[0]["completion_tokens"] == 1000
+
+    latency = latency_percentiles(db_session, period="day", periods=1, user_id=test_user.id, now=NOW)
+    assert latency["requests"] == 10
+    assert latency["ttft_ms"]["p50"] == 500
+    assert latency["duration_ms"]["p99"] == 2000
+
+    tasks = usage_by_task(db_session, period="day", periods=1, now=NOW)
+    assert tasks == [{
+        "task_id": db_session.query(Task).filter_by(name="general").one().id,
+        "task": "general",
+        "users": 1,
+        "requests": 10,
+        "prompt_tokens": 500,
+        "completion_tokens": 1000
+    }]
+    assert top_users(db_session, period="day", periods=1, now=NOW + timedelta(days=2)) == []
+
+def test_histogram_percentile():
+    """Test percentiles from latency buckets."""
+    histogram = empty_histogram()
+    assert histogram_percentile(histogram, 50) is None
+    for value in (40, 90, 90, 400, 999999):
+        add_to_histogram(histogram, value)
+    assert histogram_percentile(histogram, 50) == 100
+    assert histogram_percentile(histogram, 100) == 120000
+
+def test_chat_records_usage(client, user_token, test_conversation, mock_llm_service, monkeypatch):
+    """Test that a generation is recorded without touching the database."""
+    import app.api.chat as chat_api
+    recorder = UsageRecorder()
+    monkeypatch.setattr(chat_api, "usage_recorder", recorder)
+
+    response = client.post(
+        "/api/chat",
+        headers=user_token,
+        json={"message": "Hello", "conversation_id": test_conversation.id}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert "[DONE]" in response.text
+
+    recorded = list(recorder._buffer)
+    assert len(recorded) == 1
+    assert recorded[0]["user_id"] == test_conversation.user_id
+    assert recorded[0]["status"] == "ok"
+    assert recorded[0]["completion_tokens"] == 3
+    assert recorded[0]["ttft_ms"] is not None
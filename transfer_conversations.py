@@ -0,0 +1,89 @@
+# transfer_conversations.py
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+
+# Add the project root directory to Python path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from app.database import SessionLocal
+from app.models import User
+from app.services.transfer import (
+    export_ndjson, gzip_chunks, LineDecoder, ConversationImporter, ImportFormatError
+)
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes read from the import file at a time
+READ_SIZE = 1024 * 1024
+
+def get_user(db, username: str) -> User:
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise SystemExit(f"User {username} not found")
+    return user
+
+def export_conversations(username: str, output: str):
+    """Write a user's conversations to an NDJSON file (gzipped if it ends in .gz)"""
+    db = SessionLocal()
+    try:
+        user = get_user(db, username)
+        chunks = export_ndjson(db, user.id, user.username)
+        if output.endswith(".gz"):
+            chunks = gzip_chunks(chunks)
+        written = 0
+        with (nullcontext(sys.stdout.buffer) if output == "-" else open(output, "wb")) as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        logger.info(f"Exported conversations of {username} ({written} bytes)")
+    finally:
+        db.close()
+
+def import_conversations(username: str, path: str, batch_size: int):
+    """Import an NDJSON export (plain or gzipped) into a user's account"""
+    db = SessionLocal()
+    try:
+        user = get_user(db, username)
+        importer = ConversationImporter(db, user.id, batch_size=batch_size)
+        decoder = LineDecoder()
+        with (nullcontext(sys.stdin.buffer) if path == "-" else open(path, "rb")) as f:
+            while chunk := f.read(READ_SIZE):
+                for line in decoder.feed(chunk):
+                    importer.add_line(line)
+                    if importer.needs_flush:
+                        importer.flush()
+        for line in decoder.close():
+            importer.add_line(line)
+        stats = importer.finish()
+        for error in stats["errors"]:
+            logger.warning(error)
+    except ImportFormatError as e:
+        logger.error(f"Import stopped: {str(e)}")
+        raise SystemExit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Export or import conversations as NDJSON')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export all conversations of a user')
+    export_parser.add_argument('username')
+    export_parser.add_argument('output', help='Output file; .gz is gzipped, - writes to stdout')
+
+    import_parser = subparsers.add_parser('import', help='Import an export file into a user account')
+    import_parser.add_argument('username')
+    import_parser.add_argument('input', help='NDJSON or gzipped NDJSON file; - reads stdin')
+    import_parser.add_argument('--batch-size', type=int, default=5000,
+                               help='Rows inserted per transaction (default: 5000)')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_conversations(args.username, args.output)
+    else:
+        import_conversations(args.username, args.input, args.batch_size)